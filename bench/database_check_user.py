@@ -0,0 +1,79 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+"""
+BotDatabase.get_nickname 在不同用户数下的延迟。每个用户数在独立的临时目录和子进程中运行，BotDatabase是单例，需要全新的进程。
+Latency of BotDatabase.get_nickname at different user counts. Each user count runs in its own temporary directory and subprocess, since BotDatabase is a singleton.
+
+用法 Usage (在仓库根目录运行 run from the repository root):
+    python bench/database_check_user.py
+    python bench/database_check_user.py --users 1000 10000 --lookups 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(users: int):  # 在当前目录创建有users个用户的userdata.db
+    with open("main_config.yml", "w", encoding="utf-8") as f:
+        f.write("{}\n")  # 全部使用默认设置
+
+    conn = sqlite3.connect("userdata.db")
+    conn.execute(
+        """CREATE TABLE USERDATA (WXID TEXT PRIMARY KEY, NICKNAME TEXT, POINTS INT, SIGNINSTAT INT, WHITELIST INT, PRIVATE_GPT_DATA TEXT, SIGNIN_EPOCH INT)"""
+    )
+    conn.executemany("INSERT INTO USERDATA VALUES (?, ?, 0, 0, 0, '{}', 0)",
+                     ((f"wxid_{i}", f"user_{i}") for i in range(users)))
+    conn.commit()
+    conn.close()
+
+
+def run(users: int, lookups: int) -> float:  # 在子进程中运行，返回每次查询的秒数
+    seed(users)
+
+    sys.path.insert(0, ROOT)
+    from utils.database import BotDatabase
+
+    db = BotDatabase()
+    wxids = [f"wxid_{random.randrange(users)}" for _ in range(lookups)]  # 只查询已有用户
+
+    db.get_nickname(wxids[0])  # 预热连接池
+    start = time.perf_counter()
+    for wxid in wxids:
+        db.get_nickname(wxid)
+    return (time.perf_counter() - start) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(run(args.users[0], args.lookups))
+        return
+
+    print(f"{'users':>10}  {'us/op':>10}")
+    for users in args.users:
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", "--users", str(users),
+                 "--lookups", str(args.lookups)],
+                cwd=directory, check=True, capture_output=True, text=True,
+            ).stdout
+        print(f"{users:>10}  {float(output.strip().splitlines()[-1]) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ GPT_VISION_VERSION="gpt-4o"
 GPT_VISION_VERSION_LIST=["gpt-4o"]
 MAX_TOKENS=1300
 MAX_DIALOGUE_TOKENS=1200
+MAX_TOOL_ITERATIONS=3
 TEMPERATURE=1.1
 DIALOGUE_COUNT=5
 BOT_WECHATID="xxx"
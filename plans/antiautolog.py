@@ -6,6 +6,7 @@ import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plans_interface import PlansInterface
 
 
@@ -19,7 +20,7 @@ class antiautolog(PlansInterface):
     async def job(self, bot: client.Wcf):
         out_message = f"防微信自动退出登录[{random.randint(1, 9999)}]"  # 组建信息
         logger.info(f'[发送信息]{out_message}| [发送到] {"filehelper"}')  # 直接发到文件传输助手，这样就不用单独键个群辣
-        bot.send_text("filehelper", out_message)  # 发送
+        await message_sender.send_text(bot, out_message, "filehelper")  # 发送
 
     def job_async(self, bot: client.Wcf):
         loop = asyncio.get_running_loop()
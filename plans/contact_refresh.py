@@ -0,0 +1,24 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+
+import schedule
+from wcferry import client
+
+from utils.contact_directory import contact_directory
+from utils.plans_interface import PlansInterface
+
+
+class contact_refresh(PlansInterface):
+    async def job(self, bot: client.Wcf):
+        await contact_directory.refresh(bot)  # 只更新有变化的联系人
+
+    def job_async(self, bot: client.Wcf):
+        loop = asyncio.get_running_loop()
+        loop.create_task(self.job(bot))
+
+    def run(self, bot: client.Wcf):
+        self.job_async(bot)  # 启动时先获取一次
+        schedule.every(contact_directory.refresh_interval).minutes.do(self.job_async, bot)
@@ -12,6 +12,8 @@ import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.contact_directory import contact_directory
+from utils.message_sender import message_sender
 from utils.plans_interface import PlansInterface
 
 
@@ -34,12 +36,11 @@ class daily_greeting(PlansInterface):
 
         message = f"早上好！☀️今天是{date_str} {week_name}。😆\n\n{daily_sentence}"
 
-        contact_list = bot.get_contacts()
-        for contact in contact_list:
-            # if str(contact.get("wxid")).endswith("@chatroom"):  # 是一个群聊
-            if str(contact.get("wxid")) in self.greeting_list:
-                bot.send_text(message, contact.get("wxid"))
-                logger.info(f"[发送@信息]{message}| [发送到] {contact.get('wxid')}")
+        await contact_directory.ensure_loaded(bot)
+        for wxid in self.greeting_list:
+            if contact_directory.get(wxid) is not None:  # 只发给通讯录里存在的好友和群
+                await message_sender.send_text(bot, message, wxid)
+                logger.info(f"[发送@信息]{message}| [发送到] {wxid}")
 
     @staticmethod
     def get_daily_sentence_formatted() -> str:
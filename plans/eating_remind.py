@@ -10,6 +10,8 @@ from pathlib import Path
 from typing import Any, Dict, List, Union
 import asyncio
 import schedule
+from utils.database import AsyncBotDatabase
+from utils.message_sender import message_sender
 from utils.plans_interface import PlansInterface
 try:
     import ujson as json
@@ -28,11 +30,6 @@ class SearchLoc(Enum):
     IN_GROUP = "In group"
     IN_GLOBAL = "In global"
 
-def save_json(_file: Path, _data: Any) -> None:
-    with open(_file, 'w', encoding='utf-8') as f:
-        json.dump(_data, f, ensure_ascii=False, indent=4)
-
-
 def load_json(_file: Path) -> Any:
     with open(_file, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -42,12 +39,9 @@ class eating_remind(PlansInterface):
         main_config_path = "main_config.yml"
         with open(main_config_path, "r", encoding="utf-8") as f:  # 读取设置
             main_config = yaml.safe_load(f.read())
-        self._eating: Dict[str, Union[List[str], Dict[str,
-                                                      Union[Dict[str, List[int]], List[str]]]]] = {}
         self.timezone = main_config["timezone"]  # 时区
         self._greetings: Dict[str, Union[List[str], Dict[str, bool]]] = {}
         self._greetings_json =  "resources/eat_what/greetings.json"
-        self._eating_json =  "resources/eat_what/eating.json"
 
     async def do_greeting(self, bot: client.Wcf, meal: Meals) -> None:
         self._greetings = load_json(self._greetings_json)
@@ -56,7 +50,7 @@ class eating_remind(PlansInterface):
         if bool(self._greetings["groups_id"]) > 0:
             for gid in self._greetings["groups_id"]:
                 try:
-                    bot.send_text(msg, gid)
+                    await message_sender.send_text(bot, msg, gid)
                     logger.info(f"已群发{meal.value[1]}提醒")
                 except Exception as e:
                     logger.warning(f"发送群 {gid} 失败：{e}")
@@ -71,19 +65,21 @@ class eating_remind(PlansInterface):
                 return random.choice(greetings)
 
         return None
-    def reset_count(self):
+    async def reset_count(self):
         '''
             Reset eating times in every eating time
         '''
-        self._eating = load_json(self._eating_json)
-
-        for gid in self._eating["count"]:
-            for uid in self._eating["count"][gid]:
-                self._eating["count"][gid][uid] = 0
+        db = AsyncBotDatabase()
+        for key in await db.kv_items("eat_what"):  # 次数保存在eat_what插件的键值存储中
+            if key.startswith("count:"):
+                await db.kv_delete("eat_what", key)
 
-        save_json(self._eating_json, self._eating)
         logger.info("今天吃什么次数已刷新")
 
+    def reset_count_async(self):
+        loop = asyncio.get_running_loop()
+        loop.create_task(self.reset_count())
+
     def job_async(self, bot: client.Wcf, meal: Meals):
         loop = asyncio.get_running_loop()
         loop.create_task(self.do_greeting(bot,meal))
@@ -96,4 +92,4 @@ class eating_remind(PlansInterface):
             # schedule.every().day.at("08:00", tz=self.timezone).do(self.job_async, bot,Meals.BREAKFAST)
             # schedule.every().day.at("12:00", tz=self.timezone).do(self.job_async, bot,Meals.LUNCH)
             # schedule.every().day.at("18:00", tz=self.timezone).do(self.job_async, bot,Meals.DINNER)
-        schedule.every().day.at("03:00", tz=self.timezone).do(self.reset_count)
\ No newline at end of file
+        schedule.every().day.at("03:00", tz=self.timezone).do(self.reset_count_async)
\ No newline at end of file
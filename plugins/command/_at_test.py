@@ -3,12 +3,12 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 
-import re
 
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -18,12 +18,10 @@ class at_test(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         out_message = f"@{self.db.get_nickname(recv.sender)} At test!!!"
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid, recv.sender)
+        await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)
 
-        out_message = str(recv.content)
+        out_message = str(recv.command.tokens)
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid)
+        await message_sender.send_text(bot, out_message, recv.roomid)
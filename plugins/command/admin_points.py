@@ -2,13 +2,12 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -29,79 +28,86 @@ class admin_points(PluginInterface):
         self.db = BotDatabase()  # 实例化数据库类
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" ", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         admin_wxid = recv.sender  # 获取发送者wxid
 
         error = ''
         if admin_wxid not in self.admin_list:
             error = "-----XYBot-----\n❌你配用这个指令吗？"
-        elif len(recv.content) < 3:
+        elif len(args) < 2:
             error = f"-----XYBot-----\n⚠️指令格式错误！\n\n{self.command_format_menu}"
-        elif recv.content[1] not in ["加", "减"] and not recv.content[1].isnumeric():
+        elif args[0] not in ["加", "减"] and not args[0].isnumeric():
             error = f"-----XYBot-----\n⚠️指令格式错误！\n\n{self.command_format_menu}"
 
         if not error:
 
-            if recv.content[1].isnumeric():  # 直接改变，不加/减
-                if recv.content[2].startswith('@') and recv.ats:  # 判断是@还是wxid
+            if args[0].isnumeric():  # 直接改变，不加/减
+                if args[1] in recv.command.mentions and recv.ats:  # 判断是@还是wxid
                     change_wxid = recv.ats[-1]
                 else:
-                    change_wxid = recv.content[2]
+                    change_wxid = args[1]
 
-                self.db.set_points(change_wxid, int(recv.content[1]))
+                self.db.set_points(change_wxid, int(args[0]), reason=f"管理员 {admin_wxid} 设置",
+                                   plugin="admin_points")
 
                 nickname = self.db.get_nickname(change_wxid)  # 尝试获取昵称
 
-                out_message = f'-----XYBot-----\n😊成功将 {change_wxid} {nickname if nickname else ""} 的积分设置为 {recv.content[1]}！'
+                out_message = f'-----XYBot-----\n😊成功将 {change_wxid} {nickname if nickname else ""} 的积分设置为 {args[0]}！'
                 await self.send_friend_or_group(bot, recv, out_message)
 
 
-            elif recv.content[1] == "加":  # 操作是加分
-                if recv.content[3].startswith('@') and recv.ats:  # 判断是@还是wxid
+            elif args[0] == "加":  # 操作是加分
+                if args[2] in recv.command.mentions and recv.ats:  # 判断是@还是wxid
                     change_wxid = recv.ats[-1]
                 else:
-                    change_wxid = recv.content[3]
+                    change_wxid = args[2]
 
-                self.db.add_points(change_wxid, int(recv.content[2]))  # 修改积分
+                self.db.add_points(change_wxid, int(args[1]), reason=f"管理员 {admin_wxid} 加分",
+                                   plugin="admin_points")  # 修改积分
 
                 nickname = self.db.get_nickname(change_wxid)  # 尝试获取昵称
                 new_point = self.db.get_points(change_wxid)  # 获取修改后积分
 
-                out_message = f'-----XYBot-----\n😊成功给 {change_wxid} {nickname if nickname else ""} 加了 {recv.content[2]} 点积分，他现在有 {new_point} 点积分！'
+                out_message = f'-----XYBot-----\n😊成功给 {change_wxid} {nickname if nickname else ""} 加了 {args[1]} 点积分，他现在有 {new_point} 点积分！'
                 await self.send_friend_or_group(bot, recv, out_message)
 
-            elif recv.content[1] == "减":  # 操作是减分
-                if recv.content[3].startswith('@'):  # 判断是@还是wxid
+            elif args[0] == "减":  # 操作是减分
+                if args[2] in recv.command.mentions:  # 判断是@还是wxid
                     change_wxid = recv.ats[-1]
                 else:
-                    change_wxid = recv.content[3]
+                    change_wxid = args[2]
 
-                self.db.add_points(change_wxid, int(recv.content[2]) * -1)  # 修改积分
+                success = self.db.add_points(change_wxid, int(args[1]) * -1,
+                                             reason=f"管理员 {admin_wxid} 减分", plugin="admin_points")  # 修改积分
 
                 nickname = self.db.get_nickname(change_wxid)  # 尝试获取昵称
                 new_point = self.db.get_points(change_wxid)  # 获取修改后积分
 
-                out_message = f'-----XYBot-----\n😊成功给 {change_wxid} {nickname if nickname else ""} 减了 {recv.content[2]} 点积分，他现在有 {new_point} 点积分！'
+                if not success:  # 积分不能减成负数
+                    out_message = f'-----XYBot-----\n❌{change_wxid} {nickname if nickname else ""} 只有 {new_point} 点积分，不够减 {args[1]} 点！'
+                    await self.send_friend_or_group(bot, recv, out_message)
+                    return
+
+                out_message = f'-----XYBot-----\n😊成功给 {change_wxid} {nickname if nickname else ""} 减了 {args[1]} 点积分，他现在有 {new_point} 点积分！'
                 await self.send_friend_or_group(bot, recv, out_message)
 
             else:
                 error = f"-----XYBot-----\n\n⚠️指令格式错误！\n{self.command_format_menu}"
                 logger.info(f'[发送信息]{error}| [发送到] {recv.roomid}')
-                bot.send_text(error, recv.roomid)
+                await message_sender.send_text(bot, error, recv.roomid)
 
 
         else:  # 发送错误信息
             out_message = error
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
     async def send_friend_or_group(self, bot: client.Wcf, recv: XYBotWxMsg, out_message="null"):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
 
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
@@ -2,13 +2,12 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -30,24 +29,24 @@ class admin_whitelist(PluginInterface):
         self.db = BotDatabase()  # 实例化数据库类
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" ", recv.content)  # 拆分消息
-        logger.debug(recv.content)
+        args = recv.command.args  # 关键词后的参数
+        logger.debug(recv.command.tokens)
 
         admin_wxid = recv.sender  # 获取发送者wxid
 
         error = ""
         if admin_wxid not in self.admin_list:  # 判断是否为管理员
             error = "-----XYBot-----\n❌你配用这个指令吗？"
-        elif len(recv.content) < 3:  # 判断命令格式是否正确
+        elif len(args) < 2:  # 判断命令格式是否正确
             error = f"-----XYBot-----\n命令格式错误❌\n\n{self.command_format_menu}"
 
         if not error:
-            if recv.content[2].startswith("@") and recv.ats:
+            if args[1] in recv.command.mentions and recv.ats:
                 wxid = recv.ats[-1]
             else:
-                wxid = recv.content[2]
+                wxid = args[1]
 
-            if recv.content[1] == "加入":
+            if args[0] == "加入":
                 self.db.set_whitelist(wxid, 1)
 
                 nickname = self.db.get_nickname(wxid) # 尝试获取昵称
@@ -55,7 +54,7 @@ class admin_whitelist(PluginInterface):
                 out_message = f"-----XYBot-----\n成功添加 {wxid} {nickname if nickname else ""} 到白名单！😊"
                 await self.send_friend_or_group(bot, recv, out_message)
 
-            elif recv.content[1] == "移除":
+            elif args[0] == "移除":
                 self.db.set_whitelist(wxid, 0)
 
                 nickname = self.db.get_nickname(wxid)  # 尝试获取昵称
@@ -75,8 +74,8 @@ class admin_whitelist(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
 
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
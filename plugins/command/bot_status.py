@@ -8,6 +8,9 @@ import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_dispatcher import MessageDispatcher
+from utils.message_receiver import MessageReceiver
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -95,6 +98,10 @@ class bot_status(PluginInterface):
         ], ""  # 嘿嘿
         for i in b:
             a += chr(i)
-        out_message = f"-----XYBot-----\n{self.status_message}\nBot version: {self.bot_version}\n{base64.b64decode(a).decode('utf-8')}"
+        stats = MessageReceiver().get_stats()  # 消息队列状态
+        queue_message = f"消息队列: {stats['queue_depth']}/{stats['queue_maxsize']} 已接收: {stats['received']} 已丢弃: {stats['dropped']} {'已连接' if stats['connected'] else '未连接'} 待处理: {MessageDispatcher().get_stats()['queue_depth']}"
+        send_stats = message_sender.get_stats()  # 发送队列状态
+        send_message = f"发送队列: {send_stats['pending']}/{send_stats['queue_maxsize']} 已发送: {send_stats['sent']} 发送失败: {send_stats['failed']}"
+        out_message = f"-----XYBot-----\n{self.status_message}\nBot version: {self.bot_version}\n{queue_message}\n{send_message}\n{base64.b64decode(a).decode('utf-8')}"
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid)  # 发送
+        await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
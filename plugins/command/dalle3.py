@@ -6,15 +6,15 @@
 
 import base64
 import os
-import re
 import time
 
 import yaml
 from loguru import logger
-from openai import AsyncOpenAI
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.llm_clients import llm_clients
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -49,13 +49,12 @@ class dalle3(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         user_wxid = recv.sender  # 获取发送者wxid
-        user_request_prompt = " ".join(recv.content)
+        user_request_prompt = " ".join(recv.command.tokens)
 
         error = ""
-        if len(recv.content) < 2:  # 指令格式正确
+        if not args:  # 指令格式正确
             error = "-----XYBot-----\n参数错误！🙅正确格式为：AI绘图 描述"
         # 检查积分是否足够，管理员与白名单不需要检查
         elif user_wxid not in self.admins and self.db.get_whitelist(user_wxid) == 0 and self.db.get_points(
@@ -79,14 +78,14 @@ class dalle3(PluginInterface):
             return
 
         if user_wxid not in self.admins and self.db.get_whitelist(user_wxid) == 0:  # 如果用户不是管理员或者白名单，扣积分
-            self.db.add_points(user_wxid, -self.price)
+            self.db.add_points(user_wxid, -self.price, reason="DALL·E 3 生成图片", plugin="dalle3")
             await self.send_friend_or_group(bot, recv, f"-----XYBot-----\n🎉图片生成完毕，已扣除 {self.price} 点积分！🙏")
 
-        bot.send_image(image_path, recv.roomid)
+        await message_sender.send_image(bot, image_path, recv.roomid)
         logger.info(f'[发送图片]{image_path}| [发送到] {recv.roomid}')
 
     async def dalle3(self, prompt):  # 返回生成的图片的绝对路径，报错的话返回错误
-        client = AsyncOpenAI(api_key=self.openai_api_key, base_url=self.openai_api_base)
+        client = llm_clients.get_client("openai", self.openai_api_key, self.openai_api_base)  # 复用连接池
         try:
             image_generation = await client.images.generate(
                 prompt=prompt,
@@ -109,10 +108,10 @@ class dalle3(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送信息
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送信息
 
     def senstitive_word_check(self, message):  # 检查敏感词
         for word in self.sensitive_words:
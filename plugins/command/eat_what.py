@@ -2,23 +2,25 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
 import random
 import yaml
 from loguru import logger
 from wcferry import client
 from enum import Enum
 from pathlib import Path
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
-from utils.database import BotDatabase
+from utils.database import AsyncBotDatabase, BotDatabase
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 try:
     import ujson as json
 except ModuleNotFoundError:
     import json
-    
+
+KV_NAMESPACE = "eat_what"  # 数据库键值存储的命名空间
+
 class Meals(Enum):
     BREAKFAST = ["breakfast", "早餐", "早饭"]
     LUNCH = ["lunch", "午餐", "午饭", "中餐"]
@@ -56,11 +58,6 @@ DrinkingEnough_List: List[str] = [
 ]
 
 
-def save_json(_file: Path, _data: Any) -> None:
-    with open(_file, 'w', encoding='utf-8') as f:
-        json.dump(_data, f, ensure_ascii=False, indent=4)
-
-
 def load_json(_file: Path) -> Any:
     with open(_file, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -70,67 +67,65 @@ class eat_what(PluginInterface):
         config_path = "plugins/command/eat_what.yml"
         with open(config_path, "r", encoding="utf-8") as f:  # 读取设置
             config = yaml.safe_load(f.read())
-        self._eating: Dict[str, Union[List[str], Dict[str,
-                                                      Union[Dict[str, List[int]], List[str]]]]] = {}
-        self._greetings: Dict[str, Union[List[str], Dict[str, bool]]] = {}
         self._eating_json =  "resources/eat_what/eating.json"
-        self._greetings_json =  "resources/eat_what/greetings.json"
-        self._drinks_json =  "resources/eat_what/drinks.json"
         self.eating_limit = config["eating_limit"]
-    def _init_data(self, gid: str,uid: str = None):
+
+        # 基础菜单只读，群菜单和次数在数据库的键值存储中: group_food:群号 -> [菜品]，count:群号 -> {wxid: 次数}
+        self._basic_food: List[str] = load_json(self._eating_json)["basic_food"]
+        self.db = AsyncBotDatabase()
+        self._migrate_json()
+
+    def _migrate_json(self):
         '''
-            初始化用户信息
+            把旧版eating.json中的群菜单和次数迁移到数据库
         '''
-        if gid not in self._eating["group_food"]:
-            self._eating["group_food"][gid] = []
-        if gid not in self._eating["count"]:
-            self._eating["count"][gid] = {}
-        if isinstance(uid, str):
-            if uid not in self._eating["count"][gid]:
-                self._eating["count"][gid][uid] = 0
+        db = BotDatabase()
+        if db.kv_get(KV_NAMESPACE, "migrated"):
+            return
 
-    def get_eat(self,gid: str,uid: Optional[str] = None) -> str:
-        food_list: List[str] = []
+        eating = load_json(self._eating_json)
+        for gid, foods in eating.get("group_food", {}).items():
+            db.kv_set(KV_NAMESPACE, f"group_food:{gid}", foods)
+        for gid, counts in eating.get("count", {}).items():
+            db.kv_set(KV_NAMESPACE, f"count:{gid}", counts)
+        db.kv_set(KV_NAMESPACE, "migrated", True)
+        db.kv_flush()
 
-        self._eating = load_json(self._eating_json)
-        self._init_data(gid,uid)
+    async def get_eat(self,gid: str,uid: Optional[str] = None) -> str:
+        counts: Dict[str, int] = await self.db.kv_get(KV_NAMESPACE, f"count:{gid}", {})
 
         # Check whether is full of stomach
-        if self._eating["count"][gid][uid] >= self.eating_limit:
-            save_json(self._eating_json, self._eating)
-            # return bot.send_text(random.choice(EatingEnough_List), recv.roomid)  # 发送
+        if counts.get(uid, 0) >= self.eating_limit:
             return random.choice(EatingEnough_List)  # 发送
         else:
+            group_food: List[str] = await self.db.kv_get(KV_NAMESPACE, f"group_food:{gid}", [])
+
             # basic_food and group_food both are EMPTY
-            if len(self._eating["basic_food"]) == 0 and len(self._eating["group_food"][gid]) == 0:
+            if len(self._basic_food) == 0 and len(group_food) == 0:
                 return "没东西吃，饿着吧"  # 发送
 
-            food_list = self._eating["basic_food"].copy()
-
             # 取并集
-            if len(self._eating["group_food"][gid]) > 0:
-                food_list = list(set(food_list).union(
-                    set(self._eating["group_food"][gid])))
+            food_list = list(set(self._basic_food).union(set(group_food)))
 
             msg = f"建议{random.choice(food_list)}"
-            self._eating["count"][gid][uid] += 1
-            save_json(self._eating_json, self._eating)
+            await self.db.kv_update(KV_NAMESPACE, f"count:{gid}", lambda counts: {**counts, uid: counts.get(uid, 0) + 1}, {})
             return msg
-    def _is_food_exists(self, _food: str, _search: SearchLoc, gid: Optional[str] = None) -> Tuple[FoodLoc, str]:
+
+    def _is_food_exists(self, _food: str, _search: SearchLoc, group_food: Optional[List[str]] = None) -> Tuple[FoodLoc, str]:
         '''
             检查菜品是否存在于某个群组/全局，优先检测是否在群组，返回菜品所在区域及其全称；
-            - gid = None, 搜索群组
+            - group_food: 群菜单，为None时不搜索群组
             - _search: IN_BASIC, IN_GROUP or IN_GLOBAL（全局指本群与基础菜单）
 
-            群组添加菜品: gid=str, _search=IN_GLOBAL
+            群组添加菜品: group_food=list, _search=IN_GLOBAL
             优先检测群组是否匹配，返回：
             IN_BASIC, IN_GROUP, NOT_EXISTS
 
-            基础添加菜品: gid=None, _search=IN_BASIC
+            基础添加菜品: group_food=None, _search=IN_BASIC
             仅检测基础菜单是否存在，返回：
             IN_BASIC, NOT_EXISTS
 
-            群组移除菜品: gid=str, _search=IN_GLOBAL
+            群组移除菜品: group_food=list, _search=IN_GLOBAL
             全局检测，返回：IN_BASIC, IN_GROUP, NOT_EXISTS
 
             Notes:
@@ -138,32 +133,30 @@ class eat_what(PluginInterface):
             2. 移除时，移除文字匹配的第一个；若配图也被移除，同时移除配图相同的其余菜品（即使在基础菜单中）
         '''
         if _search == SearchLoc.IN_GROUP or _search == SearchLoc.IN_GLOBAL:
-            if isinstance(gid, str):
-                if gid in self._eating["group_food"]:
-                    for food in self._eating["group_food"][gid]:
-                        # food is the full name or _food matches the food name before CQ code
-                        if _food == food : # or _food == food.split("[CQ:image")[0]:
-                            return FoodLoc.IN_GROUP, food
+            if isinstance(group_food, list):
+                for food in group_food:
+                    # food is the full name or _food matches the food name before CQ code
+                    if _food == food : # or _food == food.split("[CQ:image")[0]:
+                        return FoodLoc.IN_GROUP, food
 
-                    if _search == SearchLoc.IN_GROUP:
-                        return FoodLoc.NOT_EXISTS, ""
+                if _search == SearchLoc.IN_GROUP:
+                    return FoodLoc.NOT_EXISTS, ""
 
         if _search == SearchLoc.IN_BASIC or _search == SearchLoc.IN_GLOBAL:
-            for food in self._eating["basic_food"]:
+            for food in self._basic_food:
                 if _food == food : # or _food == food.split("[CQ:image")[0]:
                     return FoodLoc.IN_BASIC, food
 
             return FoodLoc.NOT_EXISTS, ""
 
-    def add_group_food(self,uid: str, gid: str, new_food: str):
+    async def add_group_food(self,uid: str, gid: str, new_food: str):
         '''
             添加至群菜单
         '''
         msg = ""
-        self._eating = load_json(self._eating_json)
-        self._init_data(gid, uid)
+        group_food = await self.db.kv_get(KV_NAMESPACE, f"group_food:{gid}", [])
         status, _ = self._is_food_exists(
-            new_food, SearchLoc.IN_GLOBAL, gid)  # new food may include cq
+            new_food, SearchLoc.IN_GLOBAL, group_food)  # new food may include cq
 
         if status == FoodLoc.IN_BASIC:
             msg = f"已在基础菜单中~"
@@ -171,64 +164,63 @@ class eat_what(PluginInterface):
             msg = f"已在群特色菜单中~"
         else:
             # If image included, save it, return the path in string
-            self._eating["group_food"][gid].append(new_food)
+            await self.db.kv_update(KV_NAMESPACE, f"group_food:{gid}",
+                                    lambda foods: foods if new_food in foods else foods + [new_food], [])
             msg = f"已加入群特色菜单~"
 
-        save_json(self._eating_json, self._eating)
         return msg
 
-    def remove_group_food(self,uid: str, gid: str, new_food: str):
+    async def remove_group_food(self,uid: str, gid: str, new_food: str):
         '''
             从群菜单移除
         '''
         msg = ""
-        self._eating = load_json(self._eating_json)
-        self._init_data(gid, uid)
+        group_food = await self.db.kv_get(KV_NAMESPACE, f"group_food:{gid}", [])
         status, _ = self._is_food_exists(
-            new_food, SearchLoc.IN_GLOBAL, gid)  # new food may include cq
+            new_food, SearchLoc.IN_GLOBAL, group_food)  # new food may include cq
 
         if status == FoodLoc.IN_GROUP:
-            self._eating["group_food"][gid].remove(new_food)
+            await self.db.kv_update(KV_NAMESPACE, f"group_food:{gid}",
+                                    lambda foods: [food for food in foods if food != new_food], [])
             msg = f"已从群特色菜单中移除~"
         else:
             # If image included, save it, return the path in string
             # self._eating["group_food"][gid].append(new_food)
             msg = f"{new_food}不在群特色菜单~"
 
-        save_json(self._eating_json, self._eating)
         return msg
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
+        args = recv.command.args  # 关键词后的参数
         uid  = recv.sender
         gid = recv.roomid
-        command = " ".join(recv.content)
-        logger.debug(f"处理指令：{recv.content}")
+        command = " ".join(recv.command.tokens)
+        logger.debug(f"处理指令：{recv.command.tokens}")
         if recv.from_group():  # 判断是群还是私聊
-            if recv.content[0] == "添加群菜单":
-                if len(recv.content) < 2:
+            if recv.command.keyword == "添加群菜单":
+                if not args:
                     msg ="还没输入你要添加的菜品呢~"
                     logger.info("还没输入你要添加的菜品呢")
-                elif len(recv.content) > 2:
+                elif len(args) > 1:
                     msg ="添加菜品参数错误~"
                     logger.info(f"添加菜品参数错误，处理指令：{command}")
                 else:
-                    msg = self.add_group_food(uid,gid,recv.content[1])
+                    msg = await self.add_group_food(uid,gid,args[0])
                     logger.info("添加群菜单")
-            elif recv.content[0] == "删除群菜单":
-                if len(recv.content) < 2:
+            elif recv.command.keyword == "删除群菜单":
+                if not args:
                     msg ="还没输入你要删除的菜品呢~"
                     logger.info("还没输入你要删除的菜品呢")
-                elif len(recv.content) > 2:
+                elif len(args) > 1:
                     msg ="删除菜品参数错误~"
                     logger.info(f"删除菜品参数错误，处理指令：{command}")
                 else:
-                    msg = self.remove_group_food(uid,gid,recv.content[1])
+                    msg = await self.remove_group_food(uid,gid,args[0])
                     logger.info("删除群菜单")
             else :
-                msg = self.get_eat(gid,uid)
+                msg = await self.get_eat(gid,uid)
         else:
             logger.info(f'[发送信息]请在群聊中使用| [发送到] {recv.roomid}')
             msg = "请在群聊中使用"
 
-        bot.send_text(msg, recv.roomid)  # 发送
+        await message_sender.send_text(bot, msg, recv.roomid)  # 发送
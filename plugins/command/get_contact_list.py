@@ -3,7 +3,6 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import os.path
-import re
 import time
 
 import yaml
@@ -11,6 +10,8 @@ from loguru import logger
 from openpyxl import Workbook
 from wcferry import client
 
+from utils.contact_directory import contact_directory
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -30,8 +31,6 @@ class get_contact_list(PluginInterface):
         self.admin_list = main_config["admins"]  # 获取管理员列表
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         admin_wxid = recv.sender
 
         if admin_wxid in self.admin_list:  # 判断操作人是否在管理员列表内
@@ -41,7 +40,8 @@ class get_contact_list(PluginInterface):
             heading = ["wxid", "code", "remark", "name", "country", "province", "city", "gender"]
             xybot_contact_sheet.append(heading)
 
-            contact_list = bot.get_contacts()
+            await contact_directory.ensure_loaded(bot)
+            contact_list = contact_directory.get_all()  # 通讯录目录会定时刷新
 
             for record in contact_list:  # 在通讯录数据中for
                 wxid = record["wxid"]  # 获取wxid
@@ -61,9 +61,9 @@ class get_contact_list(PluginInterface):
             path = os.path.abspath(excel_path)
 
             logger.info(f'[发送文件]{path}| [发送到] {recv.roomid}')  # 发送
-            bot.send_file(path, recv.roomid)  # 发送文件
+            await message_sender.send_file(bot, path, recv.roomid)  # 发送文件
 
         else:  # 用户不是管理员
             out_message = "-----XYBot-----\n❌你配用这个指令吗？"
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(recv.roomid, out_message)
+            await message_sender.send_text(bot, out_message, recv.roomid)
@@ -4,7 +4,6 @@
 
 import asyncio
 import os
-import re
 from random import sample
 
 import yaml
@@ -13,6 +12,7 @@ from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -42,8 +42,8 @@ class gomoku(PluginInterface):
         self.gomoku_players = {}  # 这个字典维护着所有的五子棋玩家，用wxid查询是否已经在游戏中，以及对应的游戏id 游戏id为一个uuid
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-        sub_keyword = recv.content[1]
+        args = recv.command.args  # 关键词后的参数
+        sub_keyword = args[0]
 
         if sub_keyword in self.create_game_sub_keywords:
             await self.create_game(bot, recv)
@@ -56,10 +56,11 @@ class gomoku(PluginInterface):
             await self.send_friend_or_group(bot, recv, out_message)
 
     async def create_game(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         error = ''
         if not recv.from_group():  # 判断是否为群聊
             error = '-----XYBot-----\n❌请在群聊中游玩五子棋'
-        elif len(recv.content) < 3:  # 判断指令格式是否正确
+        elif len(args) < 2:  # 判断指令格式是否正确
             error = '-----XYBot-----\n❌指令格式错误'
 
         inviter_wxid = recv.sender
@@ -107,14 +108,15 @@ class gomoku(PluginInterface):
             await self.send_friend_or_group(bot, recv, error)
 
     async def accept_game(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         error = ''
         if not recv.from_group():  # 判断是否为群聊
             error = '-----XYBot-----\n❌请在群聊中游玩五子棋'
-        elif len(recv.content) < 3:  # 判断指令格式是否正确
+        elif len(args) < 2:  # 判断指令格式是否正确
             error = '-----XYBot-----\n❌指令格式错误'
 
         if not error:
-            game_id = recv.content[2]
+            game_id = args[1]
             invitee_wxid = recv.sender
 
             if game_id not in self.gomoku_games.keys():  # 判断游戏是否存在
@@ -148,7 +150,7 @@ class gomoku(PluginInterface):
             board_image_path = self.draw_game_board(game_id)
             # 把路径转成绝对路径
             board_image_path = os.path.abspath(board_image_path)
-            bot.send_image(board_image_path, self.gomoku_games[game_id]['chatroom'])
+            await message_sender.send_image(bot, board_image_path, self.gomoku_games[game_id]['chatroom'])
             logger.info(
                 f"[发送信息](五子棋棋盘图片){board_image_path}| [发送到] {self.gomoku_games[game_id]['chatroom']}")
 
@@ -161,10 +163,11 @@ class gomoku(PluginInterface):
             return
 
     async def play_game(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         error = ''
         if not recv.from_group():
             error = '-----XYBot-----\n❌请在群聊中游玩五子棋'
-        elif len(recv.content) != 3:
+        elif len(args) != 2:
             error = '-----XYBot-----\n❌指令格式错误'
 
         if not error:
@@ -182,7 +185,7 @@ class gomoku(PluginInterface):
                 error = '-----XYBot-----\n❌还没到您的回合！'
 
             # 这里都是与命令相关的错误
-            elif recv.content[2][0].upper() not in 'ABCDEFGHIJKLMNOPQ' or not recv.content[2][1:].isdigit():
+            elif args[1][0].upper() not in 'ABCDEFGHIJKLMNOPQ' or not args[1][1:].isdigit():
                 error = '-----XYBot-----\n❌无效的落子坐标！'
 
             if error:
@@ -193,7 +196,7 @@ class gomoku(PluginInterface):
             self.gomoku_games[game_id]['asyncio_task'].cancel()
 
             # 落子
-            cord = recv.content[2].upper()
+            cord = args[1].upper()
             x = ord(cord[0]) - 65
             y = 16 - int(cord[1:])
 
@@ -221,7 +224,7 @@ class gomoku(PluginInterface):
             board_image_path = self.draw_game_board(game_id, highlight=(x, y))
             # 把路径转成绝对路径
             board_image_path = os.path.abspath(board_image_path)
-            bot.send_image(board_image_path, self.gomoku_games[game_id]['chatroom'])
+            await message_sender.send_image(bot, board_image_path, self.gomoku_games[game_id]['chatroom'])
             logger.info(
                 f"[发送信息](五子棋棋盘图片){board_image_path}| [发送到] {self.gomoku_games[game_id]['chatroom']}")
 
@@ -380,11 +383,11 @@ class gomoku(PluginInterface):
             if at_to_wxid:
                 out_message = f"@{self.db.get_nickname(at_to_wxid)}\n{out_message}"
                 logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+                await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
             else:
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
 
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
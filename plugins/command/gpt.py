@@ -2,7 +2,6 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
 import asyncio
 import yaml
 from loguru import logger
@@ -33,8 +32,7 @@ class gpt(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         user_wxid = recv.sender  # 获取发送者wxid
 
         error_message = ""
@@ -43,16 +41,16 @@ class gpt(PluginInterface):
                 user_wxid) != 1 and user_wxid not in self.admins:  # 积分不足 不在白名单 不是管理员
             # error_message = f"积分不足,需要{self.gpt_point_price}点⚠️"
             pass
-        elif len(recv.content) < 2:  # 指令格式正确
+        elif not args:  # 指令格式正确
             error_message = "参数错误!❌"
 
-        gpt_request_message = " ".join(recv.content[1:])  # 用户问题
+        gpt_request_message = " ".join(args)  # 用户问题
         if not senstitive_word_check(gpt_request_message):  # 敏感词检查
             error_message = "内容包含敏感词!⚠️"
 
         if not error_message:
             if True: #self.db.get_whitelist(user_wxid) == 1 or user_wxid in self.admins:  # 如果用户在白名单内/是管理员
-                if recv.content[1] == "清除对话" :
+                if args[0] == "清除对话" :
                     if user_wxid in self.admins or not recv.from_group:  # 如果是清除对话记录的关键词，清除数据库对话记录
                         if recv.from_group():
                             clear_dialogue(recv.roomid)  # 保存清除了的数据到数据库
@@ -61,10 +59,10 @@ class gpt(PluginInterface):
                         out_message = "对话记录已清除！✅"
                         await send_friend_or_group(self.db, bot, recv, out_message)
                         return
-                if recv.content[1] == "修改模型" :
-                    if user_wxid in self.admins and recv.content[2] in CONFIG.OPENAI_PROVIDER_LIST and recv.content[3] in CONFIG.GPT_VERSION_LIST[recv.content[2]]:  # 管理员修改模型
+                if args[0] == "修改模型" :
+                    if user_wxid in self.admins and args[1] in CONFIG.OPENAI_PROVIDER_LIST and args[2] in CONFIG.GPT_VERSION_LIST[args[1]]:  # 管理员修改模型
                         try:
-                            update_config(recv.content[2],recv.content[3])
+                            update_config(args[1],args[2])
                             if recv.from_group():
                                 clear_dialogue(recv.roomid)  # 保存清除了的数据到数据库
                             else :
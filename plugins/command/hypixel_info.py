@@ -3,7 +3,6 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import asyncio
-import re
 
 import aiohttp
 import yaml
@@ -12,6 +11,7 @@ from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -27,23 +27,22 @@ class hypixel_info(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36 QIHU 360SE"
         }  # 设置user agent 绕cf
 
         # 指令格式错误判断
-        if len(recv.content) == 1 or len(recv.content) > 3:
+        if not args or len(args) > 2:
             out_message = "-----XYBot-----\n格式错误❌"
 
             await self.send_friend_or_group(bot, recv, out_message)
 
-        elif len(recv.content) == 2:  # Basic info
+        elif len(args) == 1:  # Basic info
             await asyncio.create_task(self.send_basic_info(bot, recv, headers))
 
-        elif len(recv.content) == 3:
-            if recv.content[1] in self.bedwar_keywords:  # bedwar
+        elif len(args) == 2:
+            if args[0] in self.bedwar_keywords:  # bedwar
                 await asyncio.create_task(self.send_bedwar_info(bot, recv, headers))
 
             else:
@@ -136,13 +135,14 @@ class hypixel_info(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
 
     async def send_basic_info(self, bot, recv, headers):
-        request_ign = recv.content[1]  # 请求的玩家ign (游戏内名字 in game name)
+        args = recv.command.args  # 关键词后的参数
+        request_ign = args[0]  # 请求的玩家ign (游戏内名字 in game name)
 
         await self.send_friend_or_group(bot, recv, f"-----XYBot-----\n查询玩家 {request_ign} 中，请稍候！🙂")
 
@@ -183,7 +183,8 @@ class hypixel_info(PluginInterface):
             await self.send_friend_or_group(bot, recv, out_message)
 
     async def send_bedwar_info(self, bot, recv, headers):  # 获取玩家bedwar信息
-        request_ign = recv.content[2]  # 请求的玩家ign (游戏内名字 in game name)
+        args = recv.command.args  # 关键词后的参数
+        request_ign = args[1]  # 请求的玩家ign (游戏内名字 in game name)
 
         await self.send_friend_or_group(bot, recv,
                                         f"-----XYBot-----\n查询玩家 {request_ign} 中，请稍候！🙂")  # 发送查询确认，让用户等待
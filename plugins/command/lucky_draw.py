@@ -3,13 +3,13 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import random
-import re
 
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -30,21 +30,19 @@ class lucky_draw(PluginInterface):
         self.db = BotDatabase()  # 实例化数据库类
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         global _draw_count, _draw_name  # 全局变量防止出错
 
         # -----初始化与消息格式监测-----
         target_wxid = recv.sender  # 获取发送者wxid
 
-        command = recv.content  # 指令
+        args = recv.command.args  # 抽奖名与抽奖次数
 
         target_points = self.db.get_points(target_wxid)  # 获取目标积分
 
         error = ""
 
-        if len(command) == 2:  # 判断指令格式
-            _draw_name = command[1]  # 抽奖名
+        if len(args) == 1:  # 判断指令格式
+            _draw_name = args[0]  # 抽奖名
             _draw_count = 1  # 抽奖次数，单抽设为1
 
             if (
@@ -57,9 +55,9 @@ class lucky_draw(PluginInterface):
             ):
                 error = "-----XYBot-----\n❌积分不足！"
 
-        elif len(command) == 3 and command[2].isdigit():
-            _draw_name = command[1]
-            _draw_count = int(command[2])
+        elif len(args) == 2 and args[1].isdigit():
+            _draw_name = args[0]
+            _draw_count = int(args[1])
 
             if (
                     _draw_name not in self.lucky_draw_probability.keys()
@@ -87,8 +85,6 @@ class lucky_draw(PluginInterface):
 
             wins = []  # 赢取列表
 
-            self.db.add_points(target_wxid, -1 * draw_cost)  # 扣取积分
-
             # 保底抽奖
             min_guaranteed = _draw_count // self.draw_per_guarantee  # 保底抽奖次数
             for _ in range(min_guaranteed):  # 先把保底抽了
@@ -128,7 +124,11 @@ class lucky_draw(PluginInterface):
             for win_name, win_points, win_symbol in wins:  # 统计赢取的积分
                 total_win_points += win_points
 
-            self.db.add_points(target_wxid, total_win_points)  # 把赢取的积分加入数据库
+            if not self.db.add_points_entries(target_wxid, [(-draw_cost, f"抽奖消耗 {_draw_name}x{_draw_count}"),
+                                                            (total_win_points, f"抽奖奖励 {_draw_name}x{_draw_count}")],
+                                              plugin="lucky_draw"):  # 消耗和奖励分别记录流水，在同一个事务中写入
+                await self.send_friend_or_group(bot, recv, "-----XYBot-----\n❌积分不足！")
+                return
             logger.info(
                 f"[抽奖] wxid: {target_wxid} | 抽奖名: {_draw_name} | 次数: {_draw_count} | 赢取积分: {total_win_points}"
             )
@@ -146,10 +146,10 @@ class lucky_draw(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
 
     @staticmethod
     def make_message(
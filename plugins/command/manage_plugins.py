@@ -2,12 +2,11 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from utils.plugin_manager import plugin_manager
 from wcferry_helper import XYBotWxMsg
@@ -31,12 +30,11 @@ class manage_plugins(PluginInterface):
         self.admin_list = main_config["admins"]  # 获取管理员列表
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         admin_wxid = recv.sender  # 获取发送者wxid
 
         if admin_wxid in self.admin_list:  # 判断是否为管理员
-            action = recv.content[1]  # 获取操作名
+            action = args[0]  # 获取操作名
 
             if action in self.load_sub_keywords:  # 如果操作为加载，则调用插件管理器加载插件
                 await self.load_plugin(bot, recv)
@@ -53,97 +51,102 @@ class manage_plugins(PluginInterface):
             else:  # 操作不存在，则响应错误
                 out_message = "-----XYBot-----\n⚠️该操作不存在！"
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
 
 
         else:  # 操作人不在白名单内
             out_message = "-----XYBot-----\n❌你配用这个指令吗？"
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
     async def load_plugin(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         try:
-            action_plugin = recv.content[2]  # 获取插件名
+            action_plugin = args[1]  # 获取插件名
 
             if action_plugin == 'manage_plugins':
                 out_message = "-----XYBot-----\n❌不能加载该插件！"
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
             elif action_plugin == '*':
                 if plugin_manager.load_plugins():
                     out_message = "-----XYBot-----\n加载所有插件成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
             else:
                 if plugin_manager.load_plugin(action_plugin):  # 判断是否成功并发送响应
                     out_message = f"-----XYBot-----\n加载插件{action_plugin}成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
 
                 else:
                     out_message = f"-----XYBot-----\n加载插件{action_plugin}失败！❌"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
         except Exception as error:
             out_message = f"-----XYBot-----\n加载插件失败！❌\n{error}"
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
     async def unload_plugin(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         try:
-            action_plugin = recv.content[2]  # 获取插件名
+            action_plugin = args[1]  # 获取插件名
 
             if action_plugin == 'manage_plugins':
                 out_message = "-----XYBot-----\n❌不能卸载该插件！"
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
             elif action_plugin == '*':
                 if plugin_manager.unload_plugins():
                     out_message = "-----XYBot-----\n卸载所有插件成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
             else:
                 if plugin_manager.unload_plugin(action_plugin):  # 判断是否成功并发送响应
                     out_message = f"-----XYBot-----\n卸载插件{action_plugin}成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
 
                 else:
                     out_message = f"-----XYBot-----\n卸载插件{action_plugin}失败！❌"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
         except Exception as error:
             out_message = f"-----XYBot-----\n卸载插件失败！❌\n{error}"
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
     async def reload_plugin(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         try:
-            action_plugin = recv.content[2]  # 获取插件名
+            action_plugin = args[1]  # 获取插件名
 
             if action_plugin == 'manage_plugins':
                 out_message = "-----XYBot-----\n❌不能重载该插件！"
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
             elif action_plugin == '*':
+                from utils.openai_plugin_manager import plugin_manager as openai_function_manager  # 用到时才导入，没有配置GPT时也能加载
+                openai_function_manager.reload()  # 同时重载GPT工具
                 if plugin_manager.reload_plugins():
                     out_message = "-----XYBot-----\n重载所有插件成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
             else:
                 if plugin_manager.reload_plugin(action_plugin):  # 判断是否成功并发送响应
                     out_message = f"-----XYBot-----\n重载插件{action_plugin}成功！✅"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
 
                 else:
                     out_message = f"-----XYBot-----\n重载插件{action_plugin}失败！❌"
                     logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                    bot.send_text(out_message, recv.roomid)
+                    await message_sender.send_text(bot, out_message, recv.roomid)
         except Exception as error:
             out_message = f"-----XYBot-----\n重载插件失败！❌\n{error}"
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
     async def list_plugins(self, bot: client.Wcf, recv: XYBotWxMsg):
         out_message = "-----XYBot-----\n已加载插件列表："
@@ -151,4 +154,4 @@ class manage_plugins(PluginInterface):
             for plugin in plugin_manager.plugins[type]:
                 out_message += f"\n{plugin}"
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid)
+        await message_sender.send_text(bot, out_message, recv.roomid)
@@ -2,12 +2,11 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -22,19 +21,18 @@ class menu(PluginInterface):
         self.menus = config["menus"]
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
-        if len(recv.content) == 1:  # 如果命令列表长度为1，那就代表请求主菜单
+        args = recv.command.args  # 关键词后的参数
+        if not args:  # 没有参数，请求主菜单
             out_message = self.main_menu
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
-        elif recv.content[1] in self.menus.keys():  # 长度不为1，发送以参数为键菜单内容为值的字典
-            out_message = self.menus[recv.content[1]]
+        elif args[0] in self.menus.keys():  # 有参数，发送以参数为键菜单内容为值的字典
+            out_message = self.menus[args[0]]
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
 
         else:
             out_message = "找不到此菜单!⚠️"  # 没找到对应菜单，发送未找到
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
@@ -2,14 +2,13 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import aiohttp
 import yaml
 from bs4 import BeautifulSoup as bs
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -23,8 +22,6 @@ class news(PluginInterface):
         self.important_news_count = config["important_news_count"]  # 要获取的要闻数量
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         try:
             url = "https://news.china.com/#"
             conn_ssl = aiohttp.TCPConnector(ssl=False)
@@ -46,12 +43,12 @@ class news(PluginInterface):
 
             compose_message = f"----📰XYBot新闻📰----\n‼️‼️最新要闻‼️‼️\n{focus_news_string}\n⭐️⭐️要闻⭐️⭐️\n{important_news_string}"
 
-            bot.send_text(compose_message, recv.roomid)
+            await message_sender.send_text(bot, compose_message, recv.roomid)
             logger.info(f'[发送信息]{compose_message}| [发送到] {recv.roomid}')
 
         except Exception as error:
             out_message = f'获取新闻失败!⚠️\n{error}'
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
             logger.error(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
 
     @staticmethod
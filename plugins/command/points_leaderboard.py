@@ -2,13 +2,12 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -26,23 +25,20 @@ class points_leaderboard(PluginInterface):
         self.db = BotDatabase()  # 实例化数据库类
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
-        data = self.db.get_highest_points(
+        data = self.db.get_leaderboard(
             self.leaderboard_top_number
-        )  # 从数据库获取前x名积分数
+        )  # 从数据库获取前x名的wxid，昵称和积分
         out_message = "-----XYBot积分排行榜-----"  # 创建积分
         rank = 1
-        for i in data:  # 从数据库获取的数据中for循环
-            nickname = self.db.get_nickname(i[0])  # 获取昵称
+        for wxid, nickname, points in data:  # 从数据库获取的数据中for循环
             if not nickname:
-                nickname = i[0]
+                nickname = wxid
 
-            out_message += f"\n{rank}. {nickname} {i[1]}分 👍"
+            out_message += f"\n{rank}. {nickname} {points}分 👍"
             rank += 1
             # 组建积分榜信息
 
         out_message += "\n\n现在无法直接获取到昵称，需要发过消息的用户才能获取到昵称\n如果没发过只能显示wxid了"
 
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid)  # 发送
+        await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
@@ -2,13 +2,12 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -25,14 +24,13 @@ class points_trade(PluginInterface):
         self.db = BotDatabase()  # 实例化机器人数据库类
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
-        if recv.from_group() and len(recv.content) >= 3 and recv.content[1].isdigit():  # 判断是否为转账指令
+        args = recv.command.args  # 关键词后的参数
+        if recv.from_group() and recv.command.mentions and args[0].isdigit():  # 判断是否为转账指令
             roomid, trader_wxid = recv.roomid, recv.sender  # 获取群号和转账人wxid
 
             target_wxid = recv.ats[0]  # 获取转账目标wxid
 
-            points_num = recv.content[1]  # 获取转账积分数
+            points_num = args[0]  # 获取转账积分数
 
             error_message = self.get_error_message(
                 target_wxid, trader_wxid, points_num
@@ -40,15 +38,19 @@ class points_trade(PluginInterface):
 
             if not error_message:  # 判断是否有错误信息和是否转账成功
                 points_num = int(points_num)
-                self.db.safe_trade_points(trader_wxid, target_wxid, points_num)
-                # 记录日志和发送成功信息
-                await self.log_and_send_success_message(bot, roomid, trader_wxid, target_wxid, points_num)
+                if self.db.safe_trade_points(trader_wxid, target_wxid, points_num, reason="积分转帐",
+                                             plugin="points_trade"):
+                    # 记录日志和发送成功信息
+                    await self.log_and_send_success_message(bot, roomid, trader_wxid, target_wxid, points_num)
+                else:  # 检查之后余额又变少了
+                    error_message = f"\n-----XYBot-----\n积分不足！❌\n需要{points_num}点！"
+                    await self.log_and_send_error_message(bot, roomid, trader_wxid, error_message)
             else:
                 await self.log_and_send_error_message(bot, roomid, trader_wxid, error_message)  # 记录日志和发送错误信息
         else:
             out_message = f"@{self.db.get_nickname(recv.sender)}\n-----XYBot-----\n转帐失败❌\n指令格式错误/在私聊转帐积分(仅可在群聊中转帐积分)❌"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)
 
     def get_error_message(self, target_wxid, trader_wxid, points_num: str):  # 获取错误信息
         if not target_wxid:
@@ -72,9 +74,9 @@ class points_trade(PluginInterface):
         trader_points, target_points = self.db.get_points(trader_wxid), self.db.get_points(target_wxid)
         out_message = f"@{trader_nick} @{target_nick}\n-----XYBot-----\n转帐成功✅! 你现在有{trader_points}点积分 {target_nick}现在有{target_points}点积分"
         logger.info(f'[发送@信息]{out_message}| [发送到] {roomid}')
-        bot.send_text(out_message, roomid, ",".join([trader_wxid, target_wxid]))
+        await message_sender.send_text(bot, out_message, roomid, ",".join([trader_wxid, target_wxid]))
 
     async def log_and_send_error_message(self, bot: client.Wcf, roomid, trader_wxid, error_message):  # 记录日志和发送错误信息
         error_message = f"@{self.db.get_nickname(trader_wxid)}\n{error_message}"
         logger.info(f'[发送@信息]{error_message}| [发送到] {roomid}')
-        bot.send_text(error_message, roomid, trader_wxid)
+        await message_sender.send_text(bot, error_message, roomid, trader_wxid)
@@ -3,7 +3,6 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import os
-import re
 import time
 
 import aiohttp
@@ -11,6 +10,7 @@ import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -26,8 +26,6 @@ class random_picture(PluginInterface):
         self.cache_path = "resources/cache"
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         # 图片缓存路径
         cache_path_original = os.path.abspath(os.path.join(self.cache_path, f"picture_{time.time_ns()}"))
 
@@ -42,10 +40,10 @@ class random_picture(PluginInterface):
             await conn_ssl.close()
 
             logger.info(f'[发送信息](随机图图图片) {cache_path}| [发送到] {recv.roomid}')
-            bot.send_image(os.path.abspath(cache_path), recv.roomid)  # 发送图片
+            await message_sender.send_image(bot, os.path.abspath(cache_path), recv.roomid)  # 发送图片
 
         except Exception as error:
             out_message = f"-----XYBot-----\n出现错误❌！{error}"
             logger.error(error)
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
@@ -2,13 +2,12 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import aiohttp
 import yaml
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -23,8 +22,6 @@ class random_picture_link(PluginInterface):
         self.link_count = config["link_count"]  # 链接数量
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         try:
             out_message = "-----XYBot-----\n❓❓❓\n"
 
@@ -37,10 +34,10 @@ class random_picture_link(PluginInterface):
             await conn_ssl.close()
 
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')  # 发送信息
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
 
         except Exception as error:
             out_message = f"-----XYBot-----\n出现错误❌！{error}"
             logger.error(error)
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
@@ -4,7 +4,6 @@
 
 import os
 import random
-import re
 import time
 
 import yaml
@@ -13,6 +12,7 @@ from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -45,39 +45,39 @@ class red_packet(PluginInterface):
         self.red_packets = {}  # 红包列表
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
-        if len(recv.content) == 3:  # 判断是否为红包指令
+        args = recv.command.args  # 关键词后的参数
+        if len(args) == 2:  # 判断是否为红包指令
             await self.send_red_packet(bot, recv)
-        elif len(recv.content) == 2:  # 判断是否为抢红包指令
+        elif len(args) == 1:  # 判断是否为抢红包指令
             await self.grab_red_packet(bot, recv)
         else:  # 指令格式错误
             await self.send_friend_or_group(bot, recv, "-----XYBot-----\n❌命令格式错误！请查看菜单获取正确命令格式")
 
     async def send_red_packet(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         red_packet_sender = recv.sender
 
         # 判断是否有错误
         error = ""
         if not recv.from_group():
             error = "-----XYBot-----\n❌红包只能在群里发！"
-        elif not recv.content[1].isdigit() or not recv.content[2].isdigit():
+        elif not args[0].isdigit() or not args[1].isdigit():
             error = "-----XYBot-----\n❌指令格式错误！请查看菜单！"
-        elif int(recv.content[1]) > self.max_point or int(recv.content[1]) < self.min_point:
+        elif int(args[0]) > self.max_point or int(args[0]) < self.min_point:
             error = f"-----XYBot-----\n⚠️积分无效！最大{self.max_point}，最小{self.min_point}！"
-        elif int(recv.content[2]) > self.max_packet:
+        elif int(args[1]) > self.max_packet:
             error = f"-----XYBot-----\n⚠️红包数量无效！最大{self.max_packet}！"
-        elif int(recv.content[2]) > int(recv.content[1]):
+        elif int(args[1]) > int(args[0]):
             error = "-----XYBot-----\n❌红包数量不能大于红包积分！"
 
         # 判断是否有足够积分
         if not error:
-            if self.db.get_points(red_packet_sender) < int(recv.content[1]):
+            if self.db.get_points(red_packet_sender) < int(args[0]):
                 error = "-----XYBot-----\n❌积分不足！"
 
         if not error:
-            red_packet_points = int(recv.content[1])  # 红包积分
-            red_packet_amount = int(recv.content[2])  # 红包数量
+            red_packet_points = int(args[0])  # 红包积分
+            red_packet_amount = int(args[1])  # 红包数量
             red_packet_chatroom = recv.roomid  # 红包所在群聊
 
             red_packet_sender_nick = self.db.get_nickname(red_packet_sender)  # 获取昵称
@@ -102,26 +102,30 @@ class red_packet(PluginInterface):
                 "sender_nick": red_packet_sender_nick,
             }  # 红包信息
 
+            if not self.db.add_points(red_packet_sender, red_packet_points * -1, reason="发红包",
+                                      plugin="red_packet"):  # 扣除积分，余额不足时不发红包
+                await self.send_friend_or_group(bot, recv, "-----XYBot-----\n❌积分不足！")
+                return
             self.red_packets[chr_5] = new_red_packet  # 把红包放入红包列表
-            self.db.add_points(red_packet_sender, red_packet_points * -1)  # 扣除积分
 
             # 组建信息
             out_message = f"-----XYBot-----\n{red_packet_sender_nick} 发送了一个红包！\n\n🧧红包金额：{red_packet_points}点积分\n🧧红包数量：{red_packet_amount}个\n\n🧧红包口令请见下图！\n\n快输入指令来抢红包！\n指令：{self.command_prefix}抢红包 口令"
 
             # 发送信息
-            bot.send_text(out_message, recv.roomid)
+            await message_sender.send_text(bot, out_message, recv.roomid)
             logger.info(f'[发送信息] (红包口令图片) {captcha_path} | [发送到] {recv.roomid}')
 
-            bot.send_image(captcha_path, recv.roomid)
+            await message_sender.send_image(bot, captcha_path, recv.roomid)
 
 
         else:
             await self.send_friend_or_group(bot, recv, error)  # 发送错误信息
 
     async def grab_red_packet(self, bot: client.Wcf, recv: XYBotWxMsg):
+        args = recv.command.args  # 关键词后的参数
         red_packet_grabber = recv.sender
 
-        req_captcha = recv.content[1]
+        req_captcha = args[0]
 
         # 判断是否有错误
         error = ""
@@ -149,7 +153,7 @@ class red_packet(PluginInterface):
                 if not red_packet_grabber_nick:
                     red_packet_grabber_nick = red_packet_grabber
 
-                self.db.add_points(red_packet_grabber, grabbed_points)  # 增加积分
+                self.db.add_points(red_packet_grabber, grabbed_points, reason="抢红包", plugin="red_packet")  # 增加积分
 
                 # 组建信息
                 out_message = f"-----XYBot-----\n🧧恭喜 {red_packet_grabber_nick} 抢到了 {grabbed_points} 点积分！"
@@ -228,20 +232,21 @@ class red_packet(PluginInterface):
                 red_packet_chatroom = self.red_packets[key]["chatroom"]  # 获取红包所在群聊
                 red_packet_sender_nick = self.red_packets[key]["sender_nick"]  # 获取红包发送人昵称
 
-                self.db.add_points(red_packet_sender, red_packet_points_left_sum)  # 归还积分
+                self.db.add_points(red_packet_sender, red_packet_points_left_sum, reason="红包超时退还",
+                                   plugin="red_packet")  # 归还积分
                 self.red_packets.pop(key)  # 删除红包
                 logger.info("[红包]有红包超时，已归还积分！")  # 记录日志
 
                 # 组建信息并发送
                 out_message = f"-----XYBot-----\n🧧发现有红包 {key} 超时！已归还剩余 {red_packet_points_left_sum} 积分给 {red_packet_sender_nick}"
-                bot.send_text(out_message, red_packet_chatroom)
+                await message_sender.send_text(bot, out_message, red_packet_chatroom)
                 logger.info(f"[发送信息]{out_message}| [发送到] {red_packet_chatroom}")
 
     async def send_friend_or_group(self, bot: client.Wcf, recv: XYBotWxMsg, out_message="null"):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
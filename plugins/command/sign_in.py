@@ -3,7 +3,6 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import random
-import re
 from datetime import datetime
 from datetime import timedelta
 
@@ -13,6 +12,7 @@ from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -39,8 +39,6 @@ class sign_in(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
         signin_points = random.randint(self.min_points, self.max_points)  # 随机3-20积分
 
         sign_wxid = recv.sender
@@ -48,7 +46,7 @@ class sign_in(PluginInterface):
         signstat = str(self.db.get_stat(sign_wxid))  # 从数据库获取签到状态
 
         if self.signstat_check(signstat):  # 如果今天未签到
-            self.db.add_points(sign_wxid, signin_points)  # 在数据库加积分
+            self.db.add_points(sign_wxid, signin_points, reason="签到", plugin="sign_in")  # 在数据库加积分
             now_datetime = datetime.now(tz=pytz.timezone(self.timezone)).strftime("%Y%m%d")  # 获取现在格式化后时间
             self.db.set_stat(sign_wxid, now_datetime)  # 设置签到状态为现在格式化后时间
 
@@ -59,14 +57,14 @@ class sign_in(PluginInterface):
 
             out_message = f"@{self.db.get_nickname(sign_wxid)}\n-----XYBot-----\n签到成功！你领到了{signin_points}个积分！✅\n\n{lucky_star_message}"  # 创建发送信息
             logger.info(f"[发送@信息]{out_message}| [发送到] {recv.roomid}")
-            bot.send_text(out_message, recv.roomid, sign_wxid)
+            await message_sender.send_text(bot, out_message, recv.roomid, sign_wxid)
 
         else:  # 今天已签到，不加积分
             next_sign_in_date = datetime.strptime(signstat, "%Y%m%d") + timedelta(days=1)
             next_sign_in_date_formatted = next_sign_in_date.strftime("%Y年%m月%d日")
             out_message = f"@{self.db.get_nickname(sign_wxid)}\n-----XYBot-----\n❌你今天已经签到过了，每日凌晨刷新签到哦！下一次签到日期：{next_sign_in_date_formatted}"  # 创建信息
             logger.info(f"[发送@信息]{out_message}| [发送到] {recv.roomid}")
-            bot.send_text(out_message, recv.roomid, sign_wxid)
+            await message_sender.send_text(bot, out_message, recv.roomid, sign_wxid)
 
     def signstat_check(self, signstat):  # 检查签到状态
         signstat = "20000101" if signstat in ["0", "1"] else signstat
@@ -4,14 +4,13 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import aiohttp
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -27,17 +26,16 @@ class warthunder(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         error = ""
-        if len(recv.content) < 2:
+        if not args:
             error = "-----XYBot-----\n参数错误!❌\n请发送正确的指令格式：\n战雷数据 玩家昵称"
 
         if error:
             await self.send_friend_or_group(bot, recv, error)
             return
 
-        player_name = ' '.join(recv.content[1:])
+        player_name = ' '.join(args)
         await self.send_friend_or_group(bot, recv, f"-----XYBot-----\n正在查询玩家{player_name}的数据，请稍等...😄")
 
         data = await self.get_player_data(player_name)
@@ -103,7 +101,7 @@ class warthunder(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
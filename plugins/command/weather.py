@@ -2,14 +2,13 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import aiohttp
 import yaml
 from loguru import logger
 from wcferry import client
 
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -25,15 +24,14 @@ class weather(PluginInterface):
         self.db = BotDatabase()
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-
+        args = recv.command.args  # 关键词后的参数
         error = ''
-        if len(recv.content) != 2:
+        if len(args) != 1:
             error = '指令格式错误！'
 
         if not error:
             # 首先请求geoapi，查询城市的id
-            request_city = recv.content[1]
+            request_city = args[0]
             geo_api_url = f'https://geoapi.qweather.com/v2/city/lookup?key={self.weather_api_key}&number=1&location={request_city}'
 
             conn_ssl = aiohttp.TCPConnector(verify_ssl=False)
@@ -78,10 +76,10 @@ class weather(PluginInterface):
         if recv.from_group():  # 判断是群还是私聊
             out_message = f"@{self.db.get_nickname(recv.sender)}\n{out_message}"
             logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+            await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
         else:
             logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-            bot.send_text(out_message, recv.roomid)  # 发送
+            await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
 
     @staticmethod
     def compose_weather_message(city_name, now_weather_api_json, weather_forecast_api_json):
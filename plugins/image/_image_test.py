@@ -5,6 +5,7 @@
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -16,5 +17,5 @@ class image_test(PluginInterface):
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
         logger.debug(f"收到图片消息！{recv}")
 
-        bot.send_text(f"收到图片消息！{recv}", recv.roomid)
-        bot.send_image(recv.image, recv.roomid)
+        await message_sender.send_text(bot, f"收到图片消息！{recv}", recv.roomid)
+        await message_sender.send_image(bot, recv.image, recv.roomid)
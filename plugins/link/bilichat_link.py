@@ -12,6 +12,7 @@ from openai import AsyncOpenAI,AzureOpenAI
 from wcferry import client
 import xml.etree.ElementTree as ET
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 from utils.bilichat.content import Video
@@ -27,6 +28,8 @@ hc = httpx.AsyncClient(
     follow_redirects=True,
 )
 class bilichat_link(PluginInterface):
+    chat_scope = "group"  # 只处理群聊消息
+
     def __init__(self):
         config_path = "plugins/link/bilichat_link.yml"
 
@@ -45,7 +48,9 @@ class bilichat_link(PluginInterface):
         self.admins = main_config["admins"]  # 管理员列表
 
         self.db = BotDatabase()
-        
+
+        self.enabled = self.enable_bilichat
+
     async def _bili_check(self, bot: client.Wcf, message: str, type: int) -> str:
         # logger.debug(f"待处理消息{message}")
         out_message = ""
@@ -159,15 +164,9 @@ class bilichat_link(PluginInterface):
             return None
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        if not self.enable_bilichat:
-            return  # 如果不开启，不处理
-        elif not recv.from_group():
-            return  # 如果是私聊消息，不处理
-
         roomid = recv.roomid
-        recv.content = re.split(" |\u2005", recv.content) # 拆分消息    
-        message = " ".join(recv.content)
+        message = " ".join(recv.command.tokens)
         # logger.debug(f"bilichat 处理消息:{message}")
         out_message = await self._bili_check(bot, message, recv.type)
         if out_message:
-            bot.send_text(out_message, roomid)
+            await message_sender.send_text(bot, out_message, roomid)
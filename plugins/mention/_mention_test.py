@@ -5,6 +5,7 @@
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -15,4 +16,4 @@ class mention_test(PluginInterface):
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
         logger.debug(f"收到@消息！{recv}")
-        bot.send_text(str(recv), recv.roomid)
+        await message_sender.send_text(bot, str(recv), recv.roomid)
@@ -12,6 +12,7 @@ from openai import AsyncOpenAI,AzureOpenAI
 from wcferry import client
 import xml.etree.ElementTree as ET
 from utils.database import BotDatabase
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 from utils.bilichat.content import Video
@@ -27,6 +28,9 @@ hc = httpx.AsyncClient(
     follow_redirects=True,
 )
 class bilichat(PluginInterface):
+    chat_scope = "private"  # 只处理私聊消息
+    trigger_regex = re.compile(r"(?i)b23|av|bv|cv|dynamic|opus|t\.bilibili\.com")  # 与_bili_check的判断一致
+
     def __init__(self):
         config_path = "plugins/text/bilichat.yml"
 
@@ -61,7 +65,9 @@ class bilichat(PluginInterface):
         self.sensitive_words = sensitive_words_config["sensitive_words"]  # 敏感词列表
 
         self.db = BotDatabase()
-        
+
+        self.enabled = self.enable_bilichat
+
     async def _bili_check(self, bot: client.Wcf, message: str, type: int) -> str:
         # logger.debug(f"待处理消息{message}")
         out_message = ""
@@ -183,15 +189,10 @@ class bilichat(PluginInterface):
             return None
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        if not self.enable_bilichat:
-            return  # 如果不开启，不处理
-        elif recv.from_group():
-            return  # 如果是私聊消息，不处理
         roomid = recv.roomid
-        recv.content = re.split(" |\u2005", recv.content) # 拆分消息    
-        message = " ".join(recv.content)
+        message = " ".join(recv.command.tokens)
         # logger.debug(f"bilichat 处理消息:{message}")
         out_message = await self._bili_check(bot, message, recv.type)
         if out_message:
-            bot.send_text(out_message, roomid)
+            await message_sender.send_text(bot, out_message, roomid)
 
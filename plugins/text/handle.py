@@ -23,6 +23,7 @@ from config.config import handle_color_enhance,handle_strict_mode
 from utils.handle_data import GuessResult, Handle
 from utils.handle import random_idiom
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 from utils.xybot import send_friend_or_group, send_friend_or_group_image
@@ -31,6 +32,8 @@ games: dict[str, Handle] = {}
 timers: dict[str, TimerHandle] = {}
 last_hint = 0
 class handle(PluginInterface):
+    chat_scope = "group"  # 只处理群聊消息
+
     def __init__(self):
         config_path = "plugins/text/handle.yml"
         with open(config_path, "r", encoding="utf-8") as f:
@@ -38,6 +41,12 @@ class handle(PluginInterface):
         self.enable_private_handle = config["enable_private_handle"]
         self.command = config["command_keywords"]
         self.db = BotDatabase()
+
+        self.enabled = self.enable_private_handle
+        self.trigger_prefixes = (self.command,)  # 开始游戏的指令
+
+    def has_active_session(self, roomid: str) -> bool:
+        return roomid in games  # 游戏进行中，所有消息都可能是猜测
     def stop_game(self, room_id: str):
         if timer := timers.pop(room_id, None):
             timer.cancel()
@@ -66,24 +75,17 @@ class handle(PluginInterface):
         timers[room_id] = timer
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        if not self.enable_private_handle:
-            return  # 如果不开启私聊，不处理
-        elif not recv.from_group():
-            return  # 如果非群聊消息，不处理
         logger.debug(f"handle 处理消息:{recv.content}")
-        try:
-            recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-        except:
-            pass
+        keyword, args = recv.command.keyword, recv.command.args  # 分发器已拆分好的消息
         room_id = recv.roomid
         game = games.get(room_id, None)
-        if not game and recv.content[0]=='handle':
+        if not game and keyword=='handle':
             # logger.debug("handle: 开始游戏")
-            if len(recv.content) >1 :
-                if recv.content[1] == "-s":
+            if args :
+                if args[0] == "-s":
                     is_strict = True
                 else:
-                    bot.send_text("参数错误",recv.roomid)
+                    await message_sender.send_text(bot, "参数错误",recv.roomid)
                     return
             else :
                 is_strict = handle_strict_mode
@@ -102,12 +104,12 @@ class handle(PluginInterface):
                 f.write(raw.getvalue())
             await send_friend_or_group(self.db, bot, recv, msg)
         elif game:
-            if recv.content[0]=='结束':
+            if keyword=='结束':
                 self.stop_game(room_id)
                 await send_friend_or_group(self.db, bot, recv, "猜成语结束")
                 return
-            if recv.content[0]=='提示':
-                hint_key = (recv.content[0], room_id)
+            if keyword=='提示':
+                hint_key = (keyword, room_id)
                 if hint_key in hint_cache:
                     logger.info(f"距离上次提示时间过短，忽略")
                     return
@@ -119,14 +121,14 @@ class handle(PluginInterface):
                         f.write(raw.getvalue())
                     await send_friend_or_group_image(bot, recv, save_path)
                 return
-            if not (re.fullmatch(r'^[\u4e00-\u9fa5]{4}$', recv.content[0])):
+            if not (re.fullmatch(r'^[\u4e00-\u9fa5]{4}$', keyword)):
                 logger.debug("非四字词语，跳过")
                 return
 
             self.set_timeout(bot, room_id, recv, 300.0)
 
             # idiom = str(matched["idiom"])
-            idiom = "".join(recv.content[0])
+            idiom = keyword
             result = game.guess(idiom)
 
             if result in [GuessResult.WIN, GuessResult.LOSS]:
@@ -2,19 +2,20 @@
 #
 #  This program is licensed under the GNU General Public License v3.0.
 
-import re
-
 import yaml
 from loguru import logger
-from openai import AsyncOpenAI
 from wcferry import client
 
-from utils.database import BotDatabase
+from utils.database import AsyncBotDatabase, BotDatabase
+from utils.llm_clients import llm_clients
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
 
 class private_chatgpt(PluginInterface):
+    chat_scope = "private"  # 只处理私聊消息
+
     def __init__(self):
         config_path = "plugins/text/private_chatgpt.yml"
 
@@ -47,16 +48,10 @@ class private_chatgpt(PluginInterface):
 
         self.db = BotDatabase()
 
-    async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        if not self.enable_private_chat_gpt:
-            return  # 如果不开启私聊chatgpt，不处理
-        elif recv.from_group():
-            return  # 如果是群聊消息，不处理
+        self.enabled = self.enable_private_chat_gpt
 
-        recv.content = re.split(" |\u2005", recv.content) # 拆分消息
-
-        # 这里recv.content中的内容是分割的
-        gpt_request_message = " ".join(recv.content)
+    async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
+        gpt_request_message = " ".join(recv.command.tokens)  # 分发器已拆分好的消息
         wxid = recv.sender
 
         if gpt_request_message.startswith("我是"):  # 微信打招呼消息，不需要处理
@@ -69,30 +64,31 @@ class private_chatgpt(PluginInterface):
             error = "您的问题中包含敏感词，请重新输入！⚠️"
 
         if not error:  # 如果没有错误
-            if recv.content[0] in self.clear_dialogue_keyword:  # 如果是清除对话记录的关键词，清除数据库对话记录
-                self.clear_dialogue(wxid)  # 保存清除了的数据到数据库
+            if recv.command.keyword in self.clear_dialogue_keyword:  # 如果是清除对话记录的关键词，清除数据库对话记录
+                self.db.clear_dialogue(wxid)  # 清除数据库中的对话记录
                 out_message = "对话记录已清除！✅"
-                bot.send_text(out_message, wxid)
+                await message_sender.send_text(bot, out_message, wxid)
                 logger.info(f'[发送信息]{out_message}| [发送到] {wxid}')
             else:
                 gpt_answer = await self.chatgpt(wxid, gpt_request_message)  # 调用chatgpt函数
                 if gpt_answer[0]:  # 如果没有错误
-                    bot.send_text(gpt_answer[1], wxid)  # 发送回答
+                    await message_sender.send_text(bot, gpt_answer[1], wxid)  # 发送回答
                     logger.info(f'[发送信息]{gpt_answer[1]}| [发送到] {wxid}')
                     if wxid not in self.admins or not self.db.get_whitelist(wxid):
-                        self.db.add_points(wxid, -self.private_chat_gpt_price)  # 扣除积分，管理员不扣
+                        self.db.add_points(wxid, -self.private_chat_gpt_price, reason="私聊GPT",
+                                           plugin="private_chatgpt")  # 扣除积分，管理员不扣
                 else:
                     out_message = f"出现错误⚠️！\n{gpt_answer[1]}"  # 如果有错误，发送错误信息
-                    bot.send_text(out_message, wxid)
+                    await message_sender.send_text(bot, out_message, wxid)
                     logger.error(f'[发送信息]{out_message}| [发送到] {wxid}')
         else:
-            bot.send_text(error, recv.roomid)
+            await message_sender.send_text(bot, error, recv.roomid)
             logger.info(f'[发送信息]{error}| [发送到] {wxid}')
 
     async def chatgpt(self, wxid: str, message: str):  # 这个函数请求了openai的api
-        request_content = self.compose_gpt_dialogue_request_content(wxid, message)  # 构成对话请求内容，返回一个包含之前对话的列表
+        request_content = await self.compose_gpt_dialogue_request_content(wxid, message)  # 构成对话请求内容，返回一个包含之前对话的列表
 
-        client = AsyncOpenAI(api_key=self.openai_api_key, base_url=self.openai_api_base)
+        client = llm_clients.get_client("openai", self.openai_api_key, self.openai_api_base)  # 复用连接池
         try:
             chat_completion = await client.chat.completions.create(
                 messages=request_content,
@@ -101,20 +97,14 @@ class private_chatgpt(PluginInterface):
                 max_tokens=self.gpt_max_token,
             )  # 调用openai api
 
-            self.save_gpt_dialogue_request_content(wxid, request_content,
-                                                   chat_completion.choices[0].message.content)  # 保存对话请求与回答内容
+            await self.save_gpt_dialogue_request_content(wxid, message,
+                                                         chat_completion.choices[0].message.content)  # 保存对话请求与回答内容
             return True, chat_completion.choices[0].message.content  # 返回对话回答内容
         except Exception as error:
             return False, error
 
-    def compose_gpt_dialogue_request_content(self, wxid: str, new_message: str) -> list:
-        json_data = self.db.get_private_gpt_data(wxid)  # 从数据库获得到之前的对话
-
-        if not json_data or "data" not in json_data.keys():  # 如果没有对话数据，则初始化
-            init_data = {"data": []}
-            json_data = init_data
-
-        previous_dialogue = json_data['data'][self.dialogue_count * -2:]  # 获取指定轮数的对话，乘-2是因为一轮对话包含了1个请求和1个答复
+    async def compose_gpt_dialogue_request_content(self, wxid: str, new_message: str) -> list:
+        previous_dialogue = await AsyncBotDatabase().get_dialogue(wxid, max_messages=self.dialogue_count * 2)  # 获取指定轮数的对话，乘2是因为一轮对话包含了1个请求和1个答复
         request_content = [{"role": "system", "content": "You are a helpful assistant that speaks in plain text."}]
         request_content += previous_dialogue  # 将之前的对话加入到api请求内容中
 
@@ -122,18 +112,12 @@ class private_chatgpt(PluginInterface):
 
         return request_content
 
-    def save_gpt_dialogue_request_content(self, wxid: str, request_content: list, gpt_response: str) -> None:
-        request_content.append({"role": "assistant", "content": gpt_response})  # 将gpt回答加入到api请求内容
-        request_content = request_content[self.dialogue_count * -2:]  # 将列表切片以符合指定的对话轮数，乘-2是因为一轮对话包含了1个请求和1个答复
-
-        json_data = {"data": request_content}  # 构成保存需要的json数据
-        self.db.save_private_gpt_data(wxid, json_data)  # 保存到数据库中
+    async def save_gpt_dialogue_request_content(self, wxid: str, new_message: str, gpt_response: str) -> None:
+        new_messages = [{"role": "user", "content": new_message}, {"role": "assistant", "content": gpt_response}]
+        await AsyncBotDatabase().append_dialogue(wxid, new_messages)  # 只追加这一轮对话
 
     def senstitive_word_check(self, message):  # 检查敏感词
         for word in self.sensitive_words:
             if word in message:
                 return False
         return True
-
-    def clear_dialogue(self, wxid):  # 清除对话记录
-        self.db.save_private_gpt_data(wxid, {"data": []})
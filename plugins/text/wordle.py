@@ -21,6 +21,7 @@ from utils.database import BotDatabase
 from utils.wordle_data import GuessResult, Wordle
 from utils.wordle import dic_list, random_word
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -51,7 +52,7 @@ async def stop_game_timeout(bot: client.Wcf, room_id: str):
         msg = "猜成语超时，游戏结束。"
         if len(game.guessed_idiom) >= 1:
             msg += f"\n{str(game.result)}"
-        await bot.send_text(f"{msg}", room_id)
+        await message_sender.send_text(bot, f"{msg}", room_id)
 
 def set_timeout(bot: client.Wcf, room_id: str, timeout: float = 300):
     logger.debug(f"wordle :设置超时时间")
@@ -65,6 +66,8 @@ def set_timeout(bot: client.Wcf, room_id: str, timeout: float = 300):
     timers[room_id] = timer
 
 class wordle(PluginInterface):
+    chat_scope = "group"  # 只处理群聊消息
+
     def __init__(self):
         config_path = "plugins/text/wordle.yml"
         with open(config_path, "r", encoding="utf-8") as f:
@@ -72,49 +75,48 @@ class wordle(PluginInterface):
         self.enable_private_wordle = config["enable_private_wordle"]
         self.command = config["command_keywords"]
 
+        self.enabled = self.enable_private_wordle
+        self.trigger_prefixes = (self.command,)  # 开始游戏的指令
+
+    def has_active_session(self, roomid: str) -> bool:
+        return roomid in games  # 游戏进行中，所有消息都可能是猜测
+
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
-        if not self.enable_private_wordle:
-            return  # 如果不开启私聊，不处理
-        elif not recv.from_group():
-            return  # 如果是群聊消息，不处理
         logger.debug(f"wordle 处理消息:{recv.content}")
-        try:
-            recv.content = re.split(" |\u2005", recv.content)  # 拆分消息
-        except:
-            pass
+        keyword, args = recv.command.keyword, recv.command.args  # 分发器已拆分好的消息
         room_id = recv.roomid
         game = games.get(room_id, None)
         length = 5
         dictionary = "GRE"
-        if not game and recv.content[0]=='wordle':
+        if not game and keyword=='wordle':
             # logger.debug("wordle: 开始游戏")
-            if len(recv.content) >4 :
+            if len(args) > 3 :
                 try:
-                    if recv.content[1] == "-l":
-                        length = int(recv.content[2])
-                    elif recv.content[3] == "-l":
-                        length = int(recv.content[4])
-                    if recv.content[1] == "-d":
-                        dictionary = recv.content[2]
-                    elif recv.content[3] == "-d":
-                        dictionary = recv.content[4]
+                    if args[0] == "-l":
+                        length = int(args[1])
+                    elif args[2] == "-l":
+                        length = int(args[3])
+                    if args[0] == "-d":
+                        dictionary = args[1]
+                    elif args[2] == "-d":
+                        dictionary = args[3]
                 except:
-                    bot.send_text("参数错误",recv.roomid)
+                    await message_sender.send_text(bot, "参数错误",recv.roomid)
                     return
-            elif len(recv.content) >2 :
+            elif len(args) > 1 :
                 try:
-                    if recv.content[1] == "-l":
-                        length = int(recv.content[2])
-                    if recv.content[1] == "-d":
-                        dictionary = recv.content[2]
+                    if args[0] == "-l":
+                        length = int(args[1])
+                    if args[0] == "-d":
+                        dictionary = args[1]
                 except:
-                    bot.send_text("参数错误",recv.roomid)
+                    await message_sender.send_text(bot, "参数错误",recv.roomid)
                     return
             if length<3 or length>8:
-                bot.send_text("单词长度应在3-8之间",recv.roomid)
+                await message_sender.send_text(bot, "单词长度应在3-8之间",recv.roomid)
                 return 
             if dictionary not in dic_list:
-                bot.send_text("支持的词典：" + ", ".join(dic_list),recv.roomid)
+                await message_sender.send_text(bot, "支持的词典：" + ", ".join(dic_list),recv.roomid)
                 return 
             # logger.debug("wordle: 创建游戏")
             word, meaning = random_word(dictionary, length)
@@ -133,22 +135,22 @@ class wordle(PluginInterface):
             await send_friend_or_group(bot, recv, msg)
             # await send_friend_or_group_image(bot, recv, save_path)
         elif game:
-            if recv.content[0]=='不猜了':
+            if keyword=='不猜了':
                 stop_game(room_id)
                 await send_friend_or_group(bot, recv, "猜单词结束")
                 return
-            if recv.content[0]=='单词':
+            if keyword=='单词':
                 save_path = get_latest_file("resources/cache/wordle_*")
                 logger.debug(f"wordle:最新文件地址:{save_path}")
                 await send_friend_or_group_image(bot, recv, save_path)
                 return
-            if not (re.fullmatch(f'^[a-zA-Z]{{{game.length}}}', recv.content[0])):
+            if not (re.fullmatch(f'^[a-zA-Z]{{{game.length}}}', keyword)):
                 logger.debug("非给定长度单词，跳过")
                 return
 
             set_timeout(bot, room_id)
 
-            word = "".join(recv.content[0])
+            word = keyword
             result = game.guess(word)
 
             if result in [GuessResult.WIN, GuessResult.LOSS]:
@@ -183,14 +185,14 @@ async def send_friend_or_group(bot: client.Wcf, recv: XYBotWxMsg, out_message="n
     if recv.from_group():  # 判断是群还是私聊
         out_message = f"@{db.get_nickname(recv.sender)}\n{out_message}"
         logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
+        await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
 
     else:
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        bot.send_text(out_message, recv.roomid)  # 发送
+        await message_sender.send_text(bot, out_message, recv.roomid)  # 发送
 
 async def send_friend_or_group_image(bot: client.Wcf, recv: XYBotWxMsg, image_path: str):
-    bot.send_image(image_path, recv.roomid)
+    await message_sender.send_image(bot, image_path, recv.roomid)
 
 P = ParamSpec("P")
 R = TypeVar("R")
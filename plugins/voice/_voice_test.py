@@ -5,6 +5,7 @@
 from loguru import logger
 from wcferry import client
 
+from utils.message_sender import message_sender
 from utils.plugin_interface import PluginInterface
 from wcferry_helper import XYBotWxMsg
 
@@ -15,5 +16,5 @@ class voice_test(PluginInterface):
 
     async def run(self, bot: client.Wcf, recv: XYBotWxMsg):
         logger.debug(f"收到语音消息！{recv}")
-        bot.send_text(str(recv), recv.roomid)
-        bot.send_file(recv.voice, recv.roomid)
+        await message_sender.send_text(bot, str(recv), recv.roomid)
+        await message_sender.send_file(bot, recv.voice, recv.roomid)
@@ -1,28 +1,21 @@
 import os
 import socket
 
-import pynng
 import schedule
 import yaml
 from loguru import logger
-from wcferry import wcf_pb2, WxMsg
+from wcferry import wcf_pb2
 
 import utils.xybot as xybot
+from utils.llm_clients import llm_clients
+from utils.openai_plugin.http_session import http_session
+from utils.message_dispatcher import MessageDispatcher
+from utils.message_receiver import MessageReceiver
 from utils.plans_manager import plan_manager
 from utils.plugin_manager import plugin_manager
 from wcferry_helper import *
 
 
-async def recv_msg_async(sock, rsp):
-    loop = asyncio.get_running_loop()
-    try:
-        message = await loop.run_in_executor(None, sock.recv_msg, True)
-        rsp.ParseFromString(message.bytes)
-    except Exception as e:
-        raise Exception(f"接受消息失败:{e}")
-    return rsp.wxmsg
-
-
 def callback(worker):  # 处理线程结束时，有无错误
     worker_exception = worker.exception()
     if worker_exception:
@@ -124,16 +117,20 @@ async def main():
 
     await asyncio.sleep(5) # 等待微信消息接受准备
 
-    rsp = wcf_pb2.Response()
+    receiver = MessageReceiver()
+    receiver.start(bot.msg_url)  # 在独立线程中接收消息
+    logger.info(f"开始接受消息，队列长度: {receiver.maxsize}，队列满时策略: {receiver.policy}")
 
-    with pynng.Pair1() as sock:
-        sock.dial(bot.msg_url, block=True)
-        logger.success(f"连接成功: {bot.msg_url}")
+    dispatcher = MessageDispatcher()
+    dispatcher.start(lambda message: handlebot.message_handler(bot, message))  # 按会话分片处理消息
 
-        logger.info("开始接受消息")
+    try:
         while True:
-            message = await recv_msg_async(sock, rsp)
-            asyncio.create_task(handlebot.message_handler(bot, WxMsg(message))).add_done_callback(callback)
+            message = await receiver.get()
+            await dispatcher.dispatch(message)
+    finally:
+        await llm_clients.close()  # 退出时关闭大模型客户端的连接池
+        await http_session.close()  # 关闭GPT工具的HTTP连接池
 
 
 if __name__ == "__main__":
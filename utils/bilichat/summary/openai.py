@@ -8,7 +8,7 @@ from loguru import logger
 
 from ..config import *
 from ..model.openai import OpenAI, TokenUsage
-from openai import AsyncOpenAI,AzureOpenAI
+from utils.llm_clients import llm_clients
 logger.info("加载 OpenAI Token enc 模型, 这可能需要一段时间进行下载")
 tiktoken_enc = tiktoken.encoding_for_model(gpt_version)
 logger.success(f"Enc 模型 {tiktoken_enc.name} 加载成功")
@@ -109,35 +109,26 @@ async def openai_req(
     #     if temperature:
     #         data["temperature"] = temperature
 
-    if openai_provider == "azure" :
-        client = AzureOpenAI(
-            api_key=token,
-            azure_endpoint=api_base,
-            api_version="2024-05-01-preview",
-        )
-    else:
-        client = AsyncOpenAI(api_key=token, base_url=api_base)
+    client = llm_clients.get_client(openai_provider, token, api_base, api_version="2024-05-01-preview")  # 复用连接池
 
     try:
-        chat_completion = client.chat.completions.create(
+        chat_completion = await client.chat.completions.create(
             messages=prompt_message,
             model=model,
             temperature=temperature,
             max_tokens=gpt_max_token,
         )
         # req = chat_completion.choices[0].message.content
-    except Exception as error:
-        return False, error
+    except Exception as error:  # 请求失败时SDK会抛出异常，不再需要检查状态码
+        return OpenAI(error=True, message=str(error))
 
     # req = await client.post(f"{api_base}/v1/chat/completions", json=data)
-    if chat_completion.status_code != 200:
-        return OpenAI(error=True, message=chat_completion.text, raw=chat_completion)
     logger.info(f"[OpenAI] Response:\n{chat_completion.choices[0].message.content}")
     usage = chat_completion.usage
     logger.info(f"[OpenAI] Response 实际 token 消耗: {usage}")
 
     return OpenAI(
         response=chat_completion.choices[0].message.content,
-        raw=chat_completion,
-        token_usage=TokenUsage(**usage),
+        raw=chat_completion.model_dump(),
+        token_usage=TokenUsage(**usage.model_dump()) if usage else None,
     )
@@ -0,0 +1,159 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+import time
+
+import yaml
+from loguru import logger
+from wcferry import client
+
+from utils.singleton import singleton
+
+FRIEND = "friend"  # 好友
+CHATROOM = "chatroom"  # 群聊
+OFFICIAL = "official"  # 公众号
+OTHER = "other"  # 文件传输助手等系统账号
+
+SYSTEM_WXIDS = {"fmessage", "medianote", "floatbottle", "filehelper", "newsapp"}
+
+
+@singleton
+class ContactDirectory:
+    """
+    通讯录目录。按wxid、名字和类型索引通讯录，定时在后台刷新，刷新时只更新有变化的联系人。
+    Contact directory. Indexes the contact list by wxid, name and type, refreshes it periodically in the background and only re-indexes contacts that changed.
+    """
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.miss_reload_interval = main_config.get("contact_miss_reload_interval", 60)  # 找不到联系人时重新获取的最小间隔(秒)
+        self.refresh_interval = main_config.get("contact_refresh_interval", 30)  # 定时刷新通讯录的间隔(分钟)
+
+        self.loaded_at = 0.0  # 上次获取通讯录的时间
+
+        self._contacts = {}  # wxid -> 联系人
+        self._by_type = {FRIEND: {}, CHATROOM: {}, OFFICIAL: {}, OTHER: {}}  # 类型 -> wxid -> 联系人
+        self._by_name = {}  # 名字或备注 -> wxid集合
+        self._loading = None  # 正在进行的获取任务
+
+    def get(self, wxid: str) -> dict:
+        """
+        按wxid获取联系人。Get a contact by wxid.
+        :return: dict - 联系人，不存在时为None。The contact, None if not found.
+        """
+        return self._contacts.get(wxid)
+
+    def find_by_name(self, name: str) -> list:
+        """
+        按名字或备注获取联系人。Get contacts by name or remark.
+        :return: list - 名字或备注相同的联系人。Contacts whose name or remark matches.
+        """
+        return [self._contacts[wxid] for wxid in self._by_name.get(name, ())]
+
+    def get_by_type(self, contact_type: str) -> list:
+        """
+        按类型获取联系人。Get contacts by type.
+        :param contact_type: FRIEND, CHATROOM, OFFICIAL 或 OTHER。FRIEND, CHATROOM, OFFICIAL or OTHER.
+        """
+        return list(self._by_type[contact_type].values())
+
+    def get_all(self) -> list:
+        """
+        获取所有联系人。Get all contacts.
+        """
+        return list(self._contacts.values())
+
+    @staticmethod
+    def contact_type(wxid: str) -> str:
+        """
+        根据wxid判断联系人类型。Tell the contact type from a wxid.
+        """
+        if wxid.endswith("@chatroom"):
+            return CHATROOM
+        if wxid.startswith("gh_"):
+            return OFFICIAL
+        if wxid in SYSTEM_WXIDS:
+            return OTHER
+        return FRIEND
+
+    async def lookup(self, bot: client.Wcf, wxid: str) -> dict:
+        """
+        按wxid获取联系人，找不到时(例如新好友)重新获取通讯录，两次之间有最小间隔。
+        Get a contact by wxid. A miss (e.g. a new friend) reloads the contact list, rate limited by a minimum interval.
+        :return: dict - 联系人，不存在时为None。The contact, None if not found.
+        """
+        await self.ensure_loaded(bot)
+        contact = self._contacts.get(wxid)
+        if contact is None and time.monotonic() - self.loaded_at > self.miss_reload_interval:
+            await self.refresh(bot)
+            contact = self._contacts.get(wxid)
+        return contact
+
+    async def ensure_loaded(self, bot: client.Wcf) -> None:
+        """
+        还没有获取过通讯录时获取一次。Load the contact list if it has never been loaded.
+        """
+        if not self.loaded_at:
+            await self.refresh(bot)
+
+    async def refresh(self, bot: client.Wcf) -> None:
+        """
+        重新获取通讯录并更新索引，同时只有一个获取在进行。Reload the contact list and update the indexes; only one reload runs at a time.
+        """
+        if self._loading is None:
+            self._loading = asyncio.create_task(self._refresh(bot))
+        await asyncio.shield(self._loading)
+
+    async def _refresh(self, bot: client.Wcf):
+        try:
+            contacts = await asyncio.get_running_loop().run_in_executor(None, bot.get_contacts)
+            contacts = {contact["wxid"]: dict(contact) for contact in contacts}  # bot.get_contacts会复用同一个列表
+        except Exception as error:
+            logger.error(f"[通讯录]获取通讯录失败: {error}")
+            return
+        finally:
+            self.loaded_at = time.monotonic()  # 失败也更新时间，避免反复请求
+            self._loading = None
+
+        changed = 0
+        for wxid in self._contacts.keys() - contacts.keys():  # 已删除的联系人
+            self._unindex(self._contacts.pop(wxid))
+            changed += 1
+
+        for wxid, contact in contacts.items():  # 新增或有变化的联系人
+            old = self._contacts.get(wxid)
+            if old == contact:
+                continue
+            if old is not None:
+                self._unindex(old)
+            self._contacts[wxid] = contact
+            self._index(contact)
+            changed += 1
+
+        if changed:
+            logger.info(f"[通讯录]已更新 {changed} 个联系人，共 {len(self._contacts)} 个")
+
+    def _index(self, contact: dict):
+        wxid = contact["wxid"]
+        self._by_type[self.contact_type(wxid)][wxid] = contact
+        for name in {contact.get("name"), contact.get("remark")}:
+            if name:
+                self._by_name.setdefault(name, set()).add(wxid)
+
+    def _unindex(self, contact: dict):
+        wxid = contact["wxid"]
+        self._by_type[self.contact_type(wxid)].pop(wxid, None)
+        for name in {contact.get("name"), contact.get("remark")}:
+            wxids = self._by_name.get(name)
+            if wxids is not None:
+                wxids.discard(wxid)
+                if not wxids:
+                    del self._by_name[name]
+
+
+# 实例化通讯录目录
+contact_directory = ContactDirectory()
@@ -1,11 +1,19 @@
 #  Copyright (c) 2024. Henry Yang
 #
 #  This program is licensed under the GNU General Public License v3.0.
+import asyncio
+import atexit
+import bisect
 import json
 import os
+import queue
 import sqlite3
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 
+import yaml
 from loguru import logger
 
 from utils.singleton import singleton
@@ -13,16 +21,40 @@ from utils.singleton import singleton
 
 # sb queue内置库没法获取返回值
 
+_MISSING = object()  # 键值存储缓存中没有这个键
+
+POINTS_JOURNAL = "points_journal.log"  # write-behind模式下还没写入数据库的积分变化
+POINTS_JOURNAL_FLUSHING = "points_journal.flushing.log"  # 正在写入数据库的那部分积分变化
+
 
 @singleton
 class BotDatabase:
+    """
+    用户数据库。userdata.db使用WAL模式：
+    - 写操作由一个写线程执行，短时间窗口内的写操作合并成一个事务提交(group commit)，每个操作有自己的SAVEPOINT，出错只回滚自己。
+    - 读操作由只读连接池并行执行，不会被写操作阻塞。
+    User database. userdata.db runs in WAL mode:
+    - Writes run on a single writer thread; writes arriving within a short window are committed as one transaction (group commit), each with its own SAVEPOINT so a failure only rolls back itself.
+    - Reads run in parallel on a pool of read-only connections and are not blocked by writers.
+    """
+
     def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.read_connections = main_config.get("database_read_connections", 4)  # 只读连接数
+        self.commit_window = main_config.get("database_commit_window", 0.005)  # 合并提交的时间窗口(秒)
+        self.commit_batch_size = main_config.get("database_commit_batch_size", 100)  # 一次提交最多合并的操作数
+        self.kv_flush_delay = main_config.get("database_kv_flush_delay", 1.0)  # 键值存储的修改延迟多久写入数据库(秒)
+        self.points_write_behind = main_config.get("points_write_behind", False)  # 积分是否先写内存再批量写入数据库
+        self.points_flush_interval = main_config.get("points_flush_interval", 1.0)  # 积分写入数据库的间隔(秒)
+
         if not os.path.exists("userdata.db"):  # 检查数据库是否存在
             logger.warning("检测到数据库不存在，正在创建数据库")
             conn = sqlite3.connect("userdata.db")
             c = conn.cursor()
             c.execute(
-                """CREATE TABLE USERDATA (WXID TEXT PRIMARY KEY, NICKNAME TEXT, POINTS INT, SIGNINSTAT INT, WHITELIST INT, PRIVATE_GPT_DATA TEXT)"""
+                """CREATE TABLE USERDATA (WXID TEXT PRIMARY KEY, NICKNAME TEXT, POINTS INT, SIGNINSTAT INT, WHITELIST INT, PRIVATE_GPT_DATA TEXT, SIGNIN_EPOCH INT)"""
             )
             conn.commit()
             c.close()
@@ -30,14 +62,17 @@ class BotDatabase:
             logger.warning("已创建数据库")
 
         self.database = sqlite3.connect(
-            "userdata.db", check_same_thread=False
-        )  # 连接数据库
+            "userdata.db", check_same_thread=False, isolation_level=None
+        )  # 写连接，事务由写线程自己管理
+        self.database.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+        self.database.execute("PRAGMA synchronous=FULL")  # 提交后数据一定落盘，group commit摊薄fsync开销
+        self.database.execute("PRAGMA busy_timeout=5000")
 
         # 检测数据库是否有正确的列
         logger.info("[数据库]检测数据库是否有正确的列")
         correct_columns = {'WXID': 'TEXT PRIMARY KEY', 'NICKNAME': 'TEXT', 'POINTS': 'INT', 'SIGNINSTAT': 'INT',
                            'WHITELIST': 'INT',
-                           'PRIVATE_GPT_DATA': 'TEXT'}
+                           'PRIVATE_GPT_DATA': 'TEXT', 'SIGNIN_EPOCH': 'INT'}
         cursor = self.database.cursor()
         cursor.execute("PRAGMA table_info(USERDATA)")
         columns = cursor.fetchall()
@@ -48,84 +83,357 @@ class BotDatabase:
                 cursor.execute(sql)
                 logger.info(f"[数据库]已添加列 {c}")
 
-        self.wxid_list = self._get_wxid_list()  # 获取已有用户列表
+        # 机器人自身的状态，键值对
+        cursor.execute("CREATE TABLE IF NOT EXISTS BOTMETA (KEY TEXT PRIMARY KEY, VALUE)")
+        # 签到重置的代数，重置签到只需要加一，SIGNIN_EPOCH不等于它的签到状态视为未签到
+        cursor.execute("INSERT OR IGNORE INTO BOTMETA (KEY, VALUE) VALUES ('signin_epoch', 0)")
 
-        self.executor = ThreadPoolExecutor(
-            max_workers=1, thread_name_prefix="database"
-        )  # 用来当queue用
+        # 积分流水，只追加不修改
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS POINTS_LEDGER (ID INTEGER PRIMARY KEY AUTOINCREMENT, WXID TEXT, DELTA INT, BALANCE INT, REASON TEXT, PLUGIN TEXT, TS INT)"""
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS POINTS_LEDGER_WXID ON POINTS_LEDGER (WXID)")
 
-    def _execute_in_queue(self, method, *args, **kwargs):
-        future = self.executor.submit(method, *args, **kwargs)
+        # GPT对话记录，一条消息一行，WXID可以是用户也可以是群
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS GPT_DIALOGUE (WXID TEXT, SEQ INTEGER, ROLE TEXT, MESSAGE TEXT, TOKENS INT, PRIMARY KEY (WXID, SEQ))"""
+        )
+        self._migrate_private_gpt_data(cursor)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS USERDATA_POINTS ON USERDATA (POINTS DESC, WXID)")  # 积分榜
 
+        # 插件的键值存储，VALUE是JSON
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS PLUGIN_KV (NAMESPACE TEXT, KEY TEXT, VALUE TEXT, PRIMARY KEY (NAMESPACE, KEY))"""
+        )
+
+        # 已写入数据库的最后一条积分日志序号，恢复日志时跳过这之前的
+        cursor.execute("INSERT OR IGNORE INTO BOTMETA (KEY, VALUE) VALUES ('points_journal_seq', 0)")
+        self._points_seq = self._recover_points_journal(cursor)
+        cursor.close()
+
+        self.wxid_set = self._get_wxid_set()  # 已有用户的集合，用来O(1)判断用户是否存在
+        self._batch_wxids = []  # 当前批次中新建、还未提交的用户
+        self._after_commit = []  # 当前批次提交后才执行的内存更新
+
+        # 积分榜缓存，由积分写入路径增量维护
+        self._leaderboard = None  # [(wxid, 昵称, 积分)]，按积分从高到低，None代表需要重新查询
+        self._leaderboard_limit = 0  # 缓存查询时的名次数
+        self._leaderboard_version = 0  # 每次修改缓存加一，防止读线程写入过期的查询结果
+        self._leaderboard_lock = threading.Lock()
+
+        # 键值存储缓存，修改先写缓存，再由写线程批量写入数据库(write-behind)
+        self._kv_cache = {}  # (命名空间, 键) -> JSON字符串，None代表不存在
+        self._kv_dirty = {}  # 还没写入数据库的修改，(命名空间, 键) -> JSON字符串，None代表删除
+        self._kv_flush_scheduled = False
+        self._kv_lock = threading.RLock()
+        atexit.register(self.kv_flush)  # 退出前写入所有修改
+
+        # write-behind模式的积分表，积分变化先写内存和日志文件，再由后台线程定时批量写入数据库
+        self._points = {}  # wxid -> 积分
+        self._points_pending = []  # 还没写入数据库的积分变化
+        self._points_flushing = None  # 正在写入数据库的积分变化，失败时下次重试
+        self._points_lock = threading.Lock()
+        self._points_flush_lock = threading.Lock()
+        self._points_journal = None
+        if self.points_write_behind:
+            self._points_journal = open(POINTS_JOURNAL, "a", encoding="utf-8")
+            threading.Thread(target=self._points_flush_loop, name="points_flusher", daemon=True).start()
+            atexit.register(self.flush_points)
+            logger.info(f"[数据库]积分write-behind模式已开启，每 {self.points_flush_interval} 秒写入数据库")
+
+        self._local = threading.local()  # 每个线程自己的连接
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="database_writer", daemon=True)
+        self._writer.start()
+
+        self.read_executor = ThreadPoolExecutor(
+            max_workers=self.read_connections, thread_name_prefix="database_read",
+            initializer=self._open_read_connection
+        )
+
+    def submit(self, method, *args, **kwargs) -> Future:
+        """
+        把写操作交给写线程，在包含它的批次提交后完成。Submit a write to the writer thread; it completes once its batch has been committed.
+        :return: concurrent.futures.Future - 操作的结果。The result of the operation.
+        """
+        future = Future()
+        self._write_queue.put((future, method, args, kwargs))
+        return future
+
+    def submit_read(self, method, *args, wxid: str = None) -> Future:
+        """
+        把读操作交给只读连接池。如果用户还不存在，需要先创建用户，交给写线程执行。
+        Submit a read to the read-only pool. If the user does not exist yet it has to be created first, so the read goes to the writer.
+        :param wxid: 读操作涉及的用户。The user the read is about.
+        :return: concurrent.futures.Future - 操作的结果。The result of the operation.
+        """
+        if wxid is not None and wxid not in self.wxid_set:
+            return self.submit(method, *args)
+        return self.read_executor.submit(method, *args)
+
+    def _execute_in_queue(self, method, *args, **kwargs):  # 同步接口，会阻塞调用的线程，异步代码请用AsyncBotDatabase
+        return self._wait(self.submit(method, *args, **kwargs))
+
+    def _execute_read(self, method, *args, wxid: str = None):  # 同步接口
+        return self._wait(self.submit_read(method, *args, wxid=wxid))
+
+    @staticmethod
+    def _wait(future: Future):
         try:
             return future.result(timeout=20)
         except Exception as error:
             # 处理异常情况
             logger.error(error)
 
-    def _get_wxid_list(self):
+    def _connection(self) -> sqlite3.Connection:
+        return getattr(self._local, "connection", self.database)  # 没有自己的连接时使用写连接
+
+    def _open_read_connection(self):  # 在只读连接池的线程中运行
+        connection = sqlite3.connect("file:userdata.db?mode=ro", uri=True)
+        connection.execute("PRAGMA busy_timeout=5000")
+        self._local.connection = connection
+
+    def _write_loop(self):
+        self._local.connection = self.database
+
+        while True:
+            batch = [self._write_queue.get()]
+            deadline = time.monotonic() + self.commit_window
+            while len(batch) < self.commit_batch_size:  # 在时间窗口内收集更多写操作
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._write_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list):
+        results = []
+        cursor = self.database.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for future, method, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():  # 已被取消
+                    continue
+
+                new_wxid_count, hook_count = len(self._batch_wxids), len(self._after_commit)
+                cursor.execute("SAVEPOINT job")
+                try:
+                    results.append((future, method(*args, **kwargs), None))
+                    cursor.execute("RELEASE job")
+                except Exception as error:  # 只回滚这一个操作
+                    cursor.execute("ROLLBACK TO job")
+                    cursor.execute("RELEASE job")
+                    del self._batch_wxids[new_wxid_count:]
+                    del self._after_commit[hook_count:]
+                    results.append((future, None, error))
+            cursor.execute("COMMIT")
+        except Exception as error:  # 整批提交失败
+            logger.error(f"[数据库]批量提交失败: {error}")
+            if self.database.in_transaction:
+                self.database.execute("ROLLBACK")
+            self._batch_wxids.clear()
+            self._after_commit.clear()
+            for future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            cursor.close()
+
+        self.wxid_set.update(self._batch_wxids)  # 提交后读连接才能看到新用户
+        self._batch_wxids.clear()
+        for hook in self._after_commit:
+            hook()
+        self._after_commit.clear()
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _migrate_private_gpt_data(self, cursor: sqlite3.Cursor):  # 把旧的PRIVATE_GPT_DATA对话记录迁移到GPT_DIALOGUE
+        cursor.execute("SELECT WXID, PRIVATE_GPT_DATA FROM USERDATA WHERE PRIVATE_GPT_DATA NOT IN ('', '{}')")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        cursor.execute("BEGIN")
+        for wxid, json_string in rows:
+            try:
+                messages = json.loads(json_string).get("data", [])
+            except (ValueError, AttributeError):
+                messages = []
+            self._insert_dialogue(cursor, wxid, [message for message in messages if isinstance(message, dict)])
+            cursor.execute("UPDATE USERDATA SET PRIVATE_GPT_DATA='{}' WHERE WXID=?", (wxid,))
+        cursor.execute("COMMIT")
+        logger.info(f"[数据库]已迁移 {len(rows)} 个用户的GPT对话记录")
+
+    def _get_wxid_set(self) -> set:
         cursor = self.database.cursor()
 
         try:
             cursor.execute("select u.WXID from USERDATA u;")  # 获取已有用户列表
-            return cursor.fetchall()
+            return {row[0] for row in cursor.fetchall()}
         finally:
             cursor.close()
 
     def _check_user(self, wxid):
-        cursor = self.database.cursor()
-        try:
-            if not (wxid,) in self.wxid_list:  # 不存在，创建用户并设置积分为增加的积分
-                sql = "INSERT INTO USERDATA (WXID, NICKNAME, POINTS, SIGNINSTAT, WHITELIST, PRIVATE_GPT_DATA) VALUES (?, ?, ?, ?, ?, ?)"
-                arg = (wxid, "", 0, 0, 0, "{}")
-                cursor.execute(sql, arg)
-                self.database.commit()  # 提交数据库
-            cursor.execute("select u.WXID from USERDATA u;")  # 刷新已有用户列表
-            self.wxid_list = cursor.fetchall()  # 刷新已有用户列表
+        if wxid in self.wxid_set or wxid in self._batch_wxids:  # 已存在，不需要查询数据库
+            return
+
+        cursor = self._connection().cursor()
+        try:  # 不存在，创建用户并设置积分为0。OR IGNORE 防止用户已被其他途径写入
+            sql = "INSERT OR IGNORE INTO USERDATA (WXID, NICKNAME, POINTS, SIGNINSTAT, WHITELIST, PRIVATE_GPT_DATA) VALUES (?, ?, ?, ?, ?, ?)"
+            arg = (wxid, "", 0, 0, 0, "{}")
+            cursor.execute(sql, arg)
+            self._batch_wxids.append(wxid)  # 批次提交后加入用户集合
+            self._after_commit.append(self._leaderboard_user_added)
         finally:
             cursor.close()
 
-    def add_points(self, wxid, num):
-        return self._execute_in_queue(self._add_points, wxid, num)
+    def add_points(self, wxid, num, reason: str = "", plugin: str = "") -> bool:
+        if self.points_write_behind:
+            self._load_points(wxid)
+            return self._write_behind_add_points(wxid, num, reason, plugin)
+        return self._execute_in_queue(self._add_points, wxid, num, reason, plugin)
 
-    def _add_points(self, wxid, num):
-        cursor = self.database.cursor()
+    def _add_points(self, wxid, num, reason: str = "", plugin: str = "") -> bool:
+        """
+        原子地增减积分并写入积分流水。扣除积分时余额不能变成负数。
+        Atomically change the points and append to the ledger. Deducting can never make the balance negative.
+        :return: bool - 积分不足时返回False。False if the balance was insufficient.
+        """
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
-            sql = "SELECT POINTS FROM USERDATA WHERE WXID=?"  # 获取当前积分
-            arg = (wxid,)
-            cursor.execute(sql, arg)
-            new_points = cursor.fetchall()[0][0] + num
-            sql = "UPDATE USERDATA SET POINTS=? WHERE WXID=?"
-            arg = (new_points, wxid,)
+            if num == 0:  # 比如价格为0的扣除，不需要更新也不写流水
+                return True
+            sql = "UPDATE USERDATA SET POINTS=POINTS+? WHERE WXID=? AND (?>=0 OR POINTS+?>=0)"  # 扣分时检查余额
+            arg = (num, wxid, num, num,)
             cursor.execute(sql, arg)
-            self.database.commit()
+            if cursor.rowcount == 0:
+                logger.info(f"[数据库] {wxid} 积分不足，无法扣除 {-num} 点")
+                return False
+
+            new_points = self._record_points(cursor, wxid, num, reason, plugin)
             logger.info(f"[数据库] {wxid} 积分已加 {num} 点，当前积分{new_points}")
+            return True
         finally:
             cursor.close()
 
-    def set_points(self, wxid, num):
-        return self._execute_in_queue(self._set_points, wxid, num)
+    def add_points_entries(self, wxid, entries: list, plugin: str = "") -> bool:
+        if self.points_write_behind:
+            self._load_points(wxid)
+            return self._write_behind_add_points_entries(wxid, entries, plugin)
+        return self._execute_in_queue(self._add_points_entries, wxid, entries, plugin)
+
+    def _add_points_entries(self, wxid, entries: list, plugin: str = "") -> bool:
+        """
+        在同一个事务中依次写入多个积分变化，每个变化一条流水，比如抽奖的消耗和奖励。任何一个扣除失败则全部不写入。
+        Apply several points changes in one transaction, one ledger row each, e.g. the cost and the prize of a draw. If any deduction fails, nothing is written.
+        :param entries: [(积分变化, 原因)]。[(delta, reason)]
+        :return: bool - 积分不足时返回False。False if the balance was insufficient.
+        """
+        self._check_user(wxid)
+        hook_count = len(self._after_commit)
+        cursor = self._connection().cursor()
 
-    def _set_points(self, wxid, num):
-        cursor = self.database.cursor()
+        try:
+            cursor.execute("SAVEPOINT points_entries")
+            for num, reason in entries:
+                if not self._add_points(wxid, num, reason, plugin):
+                    cursor.execute("ROLLBACK TO points_entries")
+                    cursor.execute("RELEASE points_entries")
+                    del self._after_commit[hook_count:]
+                    return False
+            cursor.execute("RELEASE points_entries")
+            return True
+        finally:
+            cursor.close()
+
+    def set_points(self, wxid, num, reason: str = "", plugin: str = ""):
+        if self.points_write_behind:
+            self._load_points(wxid)
+            return self._write_behind_set_points(wxid, num, reason, plugin)
+        return self._execute_in_queue(self._set_points, wxid, num, reason, plugin)
+
+    def _set_points(self, wxid, num, reason: str = "", plugin: str = ""):
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
+            sql = "SELECT POINTS FROM USERDATA WHERE WXID=?"  # 在同一个事务里，流水记录变化量
+            arg = (wxid,)
+            cursor.execute(sql, arg)
+            old_points = cursor.fetchone()[0]
             sql = "UPDATE USERDATA SET POINTS=? WHERE WXID=?"
             arg = (num, wxid,)
             cursor.execute(sql, arg)
-            self.database.commit()
+            self._record_points(cursor, wxid, num - old_points, reason, plugin)
             logger.info(f"[数据库] {wxid} 积分已设置为 {num} 点")
         finally:
             cursor.close()
 
+    def _record_points(self, cursor: sqlite3.Cursor, wxid, delta, reason: str, plugin: str) -> int:  # 写入积分流水，返回当前积分
+        cursor.execute("SELECT POINTS, NICKNAME FROM USERDATA WHERE WXID=?", (wxid,))
+        balance, nickname = cursor.fetchone()
+        sql = "INSERT INTO POINTS_LEDGER (WXID, DELTA, BALANCE, REASON, PLUGIN, TS) VALUES (?, ?, ?, ?, ?, ?)"
+        arg = (wxid, delta, balance, reason, plugin, int(time.time()),)
+        cursor.execute(sql, arg)
+        self._after_commit.append(partial(self._leaderboard_points_changed, wxid, nickname, balance))
+        return balance
+
+    def get_points_ledger(self, wxid: str = None, limit: int = 100) -> list:
+        return self._execute_read(self._get_points_ledger, wxid, limit)
+
+    def _get_points_ledger(self, wxid: str = None, limit: int = 100) -> list:
+        """
+        读取积分流水，从新到旧。write-behind模式下包括还没写入数据库的变化，它们的ID为None。
+        Read the points ledger, newest first. In write-behind mode this includes changes not yet written to the database, with an ID of None.
+        """
+        unflushed = self._unflushed_points_entries() if self.points_write_behind else []  # 先取内存，再读数据库
+        connection = self._connection()
+        cursor = connection.cursor()
+
+        try:
+            if unflushed:
+                cursor.execute("BEGIN")  # 流水和已写入的序号来自同一个快照
+            if wxid is None:
+                sql = "SELECT * FROM POINTS_LEDGER ORDER BY ID DESC LIMIT ?"
+                arg = (limit,)
+            else:
+                sql = "SELECT * FROM POINTS_LEDGER WHERE WXID=? ORDER BY ID DESC LIMIT ?"
+                arg = (wxid, limit,)
+            cursor.execute(sql, arg)
+            result = cursor.fetchall()
+            if not unflushed:
+                return result
+
+            cursor.execute("SELECT VALUE FROM BOTMETA WHERE KEY='points_journal_seq'")
+            flushed_seq = cursor.fetchone()[0]
+        finally:
+            if unflushed and connection.in_transaction:
+                connection.rollback()  # 只读，结束快照
+            cursor.close()
+
+        pending = [(None, *entry[1:]) for entry in reversed(unflushed)
+                   if entry[0] > flushed_seq and (wxid is None or entry[1] == wxid)]  # 读取期间已写入的不重复
+        return (pending + result)[:limit]
+
     def get_points(self, wxid):
-        return self._execute_in_queue(self._get_points, wxid)
+        if self.points_write_behind:  # 内存中的积分包含还没写入数据库的变化
+            self._load_points(wxid)
+            return self._points.get(wxid)
+        return self._execute_read(self._get_points, wxid, wxid=wxid)
 
     def _get_points(self, wxid):
-        cursor = self.database.cursor()
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
@@ -138,14 +446,19 @@ class BotDatabase:
             cursor.close()
 
     def get_stat(self, wxid):
-        return self._execute_in_queue(self._get_stat, wxid)
+        return self._execute_read(self._get_stat, wxid, wxid=wxid)
 
     def _get_stat(self, wxid):
-        cursor = self.database.cursor()
+        """
+        获取上次签到的日期(YYYYMMDD)，未签到或签到状态已被重置时为0。
+        Get the date (YYYYMMDD) of the last sign-in, 0 if never signed in or sign-ins were reset since.
+        """
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
-            sql = "SELECT SIGNINSTAT FROM USERDATA WHERE WXID=?"
+            sql = """SELECT CASE WHEN COALESCE(SIGNIN_EPOCH, 0)=(SELECT VALUE FROM BOTMETA WHERE KEY='signin_epoch')
+                     THEN SIGNINSTAT ELSE 0 END FROM USERDATA WHERE WXID=?"""
             arg = (wxid,)
             cursor.execute(sql, arg)
             result = cursor.fetchall()[0][0]
@@ -157,57 +470,168 @@ class BotDatabase:
         return self._execute_in_queue(self._set_stat, wxid, num)
 
     def _set_stat(self, wxid, num):
-        cursor = self.database.cursor()
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
-            sql = "UPDATE USERDATA SET SIGNINSTAT=? WHERE WXID=?"
+            sql = "UPDATE USERDATA SET SIGNINSTAT=?, SIGNIN_EPOCH=(SELECT VALUE FROM BOTMETA WHERE KEY='signin_epoch') WHERE WXID=?"
 
             arg = (num, wxid,)
             cursor.execute(sql, arg)
-            self.database.commit()  # 提交数据库
             logger.info(f"[数据库] {wxid} 签到状态已设置为 {num}")
         finally:
             cursor.close()
 
     def reset_stat(self):
-        cursor = self.database.cursor()
+        return self._execute_in_queue(self._reset_stat)
+
+    def _reset_stat(self):
+        """
+        重置所有人的签到状态。只修改BOTMETA中的一行，不需要改写整个用户表。
+        Reset everyone's sign-in state. Only one row of BOTMETA is updated instead of rewriting the whole user table.
+        """
+        cursor = self._connection().cursor()
 
         try:
-            sql = "UPDATE USERDATA SET SIGNINSTAT=0"
+            sql = "UPDATE BOTMETA SET VALUE=VALUE+1 WHERE KEY='signin_epoch'"
             cursor.execute(sql)
-            self.database.commit()  # 提交数据库
             logger.info("[数据库] 签到状态已重置")
         finally:
             cursor.close()
 
     def get_highest_points(self, num):
-        cursor = self.database.cursor()
-
+        return self._execute_read(self._get_highest_points, num)
+
+    def _get_highest_points(self, num):
+        """
+        获取积分最高的用户的完整数据。基于积分榜，排名(积分从高到低，同分按WXID)和缓存都与积分榜相同。
+        Get the full rows of the users with the most points. Built on the leaderboard, so the order (points descending, ties by WXID) and the cache are shared with it.
+        """
+        leaderboard = self._get_leaderboard(num)
+        rows = {row[0]: row for row in self._select_users("SELECT * FROM USERDATA", [entry[0] for entry in leaderboard])}
+        return [(*rows[wxid][:2], points, *rows[wxid][3:]) for wxid, _, points in leaderboard if wxid in rows]
+
+    def get_leaderboard(self, num: int) -> list:
+        return self._execute_read(self._get_leaderboard, num)
+
+    def _get_leaderboard(self, num: int) -> list:
+        """
+        获取积分榜，优先使用缓存。write-behind模式下使用内存中的积分。
+        Get the points leaderboard, from the cache when possible. In write-behind mode the in-memory balances are used.
+        :param num: 名次数。Number of places.
+        :return: list - [(wxid, 昵称, 积分)]，按积分从高到低。[(wxid, nickname, points)] from highest to lowest.
+        """
+        balances = self._unflushed_points_balances() if self.points_write_behind else {}
+        if not balances:
+            return self._query_leaderboard(num)
+
+        result = self._query_leaderboard(num + len(balances))  # 内存中有变化的用户可能掉出前num名，多取一些
+        return self._overlay_points(result, balances, num)
+
+    def _query_leaderboard(self, num: int) -> list:  # 数据库中的积分榜
+        with self._leaderboard_lock:
+            if self._leaderboard is not None and num <= self._leaderboard_limit:
+                return self._leaderboard[:num]
+            version = self._leaderboard_version
+
+        cursor = self._connection().cursor()
         try:
-            sql = "select * from USERDATA order by POINTS DESC, SIGNINSTAT LIMIT 0,?"
-            arg = (num,)
-            cursor.execute(sql, arg)
+            sql = "SELECT WXID, NICKNAME, POINTS FROM USERDATA ORDER BY POINTS DESC, WXID LIMIT ?"  # 走USERDATA_POINTS索引
+            cursor.execute(sql, (num,))
             result = cursor.fetchall()
-            return result
         finally:
             cursor.close()
 
+        with self._leaderboard_lock:
+            if version == self._leaderboard_version:  # 查询期间没有积分变化，结果可以缓存
+                self._leaderboard = result
+                self._leaderboard_limit = num
+                self._leaderboard_version += 1
+        return result[:num]
+
+    def _overlay_points(self, rows: list, balances: dict, num: int) -> list:
+        """
+        用内存中的积分替换积分榜中的积分并重新排序。Replace leaderboard points with in-memory balances and re-sort.
+        :param rows: [(wxid, 昵称, 积分)]
+        :param balances: wxid -> 内存中的积分。wxid -> in-memory balance.
+        """
+        found = {row[0] for row in rows}
+        rows = list(rows) + self._select_users("SELECT WXID, NICKNAME, POINTS FROM USERDATA",
+                                               [wxid for wxid in balances if wxid not in found])
+        rows = [(wxid, nickname, balances.get(wxid, points)) for wxid, nickname, points in rows]
+        rows.sort(key=lambda row: (-row[2], row[0]))  # 与USERDATA_POINTS索引和积分榜缓存的顺序相同
+        return rows[:num]
+
+    def _select_users(self, select_sql: str, wxids: list) -> list:  # 按wxid读取用户，select_sql不带WHERE
+        result = []
+        cursor = self._connection().cursor()
+        try:
+            for i in range(0, len(wxids), 500):  # SQLite参数个数有限制
+                chunk = wxids[i:i + 500]
+                cursor.execute(f"{select_sql} WHERE WXID IN ({','.join('?' * len(chunk))})", chunk)
+                result.extend(cursor.fetchall())
+        finally:
+            cursor.close()
+        return result
+
+    def _leaderboard_points_changed(self, wxid: str, nickname: str, points: int):  # 在写线程中，提交后运行
+        with self._leaderboard_lock:
+            self._leaderboard_version += 1
+            leaderboard = self._leaderboard
+            if leaderboard is None:
+                return
+
+            full = len(leaderboard) >= self._leaderboard_limit  # 没满代表所有用户都在榜上
+            index = next((i for i, entry in enumerate(leaderboard) if entry[0] == wxid), None)
+            if index is not None:
+                del leaderboard[index]
+
+            key = (-points, wxid)
+            if full and leaderboard and key > (-leaderboard[-1][2], leaderboard[-1][0]):  # 排在榜上最后一名之后
+                if index is not None:
+                    self._leaderboard = None  # 掉出了榜，不知道榜外谁补上，下次重新查询
+                return
+
+            keys = [(-entry[2], entry[0]) for entry in leaderboard]
+            leaderboard.insert(bisect.bisect(keys, key), (wxid, nickname, points))
+            del leaderboard[self._leaderboard_limit:]
+
+    def _leaderboard_nickname_changed(self, wxid: str, nickname: str):  # 在写线程中，提交后运行
+        with self._leaderboard_lock:
+            if self._leaderboard is None:
+                return
+            for i, entry in enumerate(self._leaderboard):
+                if entry[0] == wxid:
+                    self._leaderboard[i] = (wxid, nickname, entry[2])
+                    self._leaderboard_version += 1
+                    break
+
+    def _leaderboard_user_added(self):  # 在写线程中，提交后运行
+        with self._leaderboard_lock:
+            if self._leaderboard is not None and len(self._leaderboard) < self._leaderboard_limit:
+                self._leaderboard = None  # 榜没满时新用户也要上榜
+                self._leaderboard_version += 1
+
     def set_whitelist(self, wxid, stat):
-        cursor = self.database.cursor()
+        return self._execute_in_queue(self._set_whitelist, wxid, stat)
+
+    def _set_whitelist(self, wxid, stat):
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
             sql = "UPDATE USERDATA SET WHITELIST=? WHERE WXID=?"
             arg = (stat, wxid,)
             cursor.execute(sql, arg)
-            self.database.commit()  # 提交数据库
             logger.info(f"[数据库] {wxid} 白名单状态已设置为 {stat}")
         finally:
             cursor.close()
 
     def get_whitelist(self, wxid):
-        cursor = self.database.cursor()
+        return self._execute_read(self._get_whitelist, wxid, wxid=wxid)
+
+    def _get_whitelist(self, wxid):
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
@@ -219,33 +643,195 @@ class BotDatabase:
         finally:
             cursor.close()
 
-    def safe_trade_points(self, trader_wxid, target_wxid, num):
+    def safe_trade_points(self, trader_wxid, target_wxid, num, reason: str = "", plugin: str = "") -> bool:
+        if self.points_write_behind:
+            for wxid in (trader_wxid, target_wxid):
+                self._load_points(wxid)
+            return self._write_behind_trade_points(trader_wxid, target_wxid, num, reason, plugin)
         return self._execute_in_queue(
-            self._safe_trade_points, trader_wxid, target_wxid, num
+            self._safe_trade_points, trader_wxid, target_wxid, num, reason, plugin
         )
 
-    def _safe_trade_points(self, trader_wxid, target_wxid, num):
-        cursor = self.database.cursor()
+    def _safe_trade_points(self, trader_wxid, target_wxid, num, reason: str = "", plugin: str = "") -> bool:
+        self._check_user(target_wxid)
+        if not self._add_points(trader_wxid, num * -1, reason, plugin):  # 余额检查和扣除是同一条语句
+            return False
+        self._add_points(target_wxid, num, reason, plugin)  # 与扣除在同一个SAVEPOINT中，要么都成功要么都回滚
+        return True
+
+    def flush_points(self) -> None:
+        """
+        立即把write-behind模式下内存中的积分变化写入数据库。Write the in-memory points changes of write-behind mode to the database now.
+        """
+        with self._points_flush_lock:
+            if self._points_flushing is None:
+                with self._points_lock:
+                    if not self._points_pending:
+                        return
+                    self._points_flushing, self._points_pending = self._points_pending, []
+                    self._rotate_points_journal()
+
+            if self._execute_in_queue(self._flush_points, self._points_flushing):
+                os.remove(POINTS_JOURNAL_FLUSHING)  # 已提交，日志不再需要
+                self._points_flushing = None
+
+    def _load_points(self, wxid):  # write-behind模式下把积分读入内存
+        if wxid not in self._points:
+            self._cache_points(wxid, self._execute_read(self._get_points, wxid, wxid=wxid))
+
+    def _cache_points(self, wxid, points):
+        if points is None:  # 读取失败
+            return
+        with self._points_lock:
+            self._points.setdefault(wxid, points)
+
+    def _unflushed_points_entries(self) -> list:  # 还没写入数据库的积分变化，按序号排列
+        with self._points_lock:
+            return (self._points_flushing or []) + self._points_pending
+
+    def _unflushed_points_balances(self) -> dict:  # 有还没写入数据库的变化的用户 -> 内存中的积分
+        with self._points_lock:
+            return {entry[1]: self._points[entry[1]] for entry in (self._points_flushing or []) + self._points_pending}
+
+    def _require_points(self, wxid):  # 需要持有锁。积分没能读入内存时不能当作积分不足，也不能静默忽略
+        if wxid not in self._points:
+            logger.error(f"[数据库] 无法读取 {wxid} 的积分，积分操作已取消")
+            raise RuntimeError(f"无法读取 {wxid} 的积分")
+
+    def _write_behind_add_points(self, wxid, num, reason: str, plugin: str) -> bool:
+        with self._points_lock:
+            self._require_points(wxid)
+            if num == 0:
+                return True
+            if num < 0 and self._points[wxid] + num < 0:  # 扣分时检查余额
+                logger.info(f"[数据库] {wxid} 积分不足，无法扣除 {-num} 点")
+                return False
+            self._journal_points(wxid, num, reason, plugin)
+            logger.info(f"[数据库] {wxid} 积分已加 {num} 点，当前积分{self._points[wxid]}")
+            return True
+
+    def _write_behind_add_points_entries(self, wxid, entries: list, plugin: str) -> bool:
+        with self._points_lock:  # 检查余额和所有变化在同一个锁内
+            self._require_points(wxid)
+            balance = self._points[wxid]
+            for num, _ in entries:
+                balance += num
+                if num < 0 and balance < 0:
+                    logger.info(f"[数据库] {wxid} 积分不足，无法扣除 {-num} 点")
+                    return False
+            for num, reason in entries:
+                if num != 0:
+                    self._journal_points(wxid, num, reason, plugin)
+            logger.info(f"[数据库] {wxid} 积分已变化 {sum(num for num, _ in entries)} 点，当前积分{self._points[wxid]}")
+            return True
+
+    def _write_behind_set_points(self, wxid, num, reason: str, plugin: str):
+        with self._points_lock:
+            self._require_points(wxid)
+            self._journal_points(wxid, num - self._points[wxid], reason, plugin)
+            logger.info(f"[数据库] {wxid} 积分已设置为 {num} 点")
 
-        try:
-            self._check_user(trader_wxid)
-            self._check_user(target_wxid)
-            sql = "SELECT POINTS FROM USERDATA WHERE WXID=?"
-            arg = (trader_wxid,)
+    def _write_behind_trade_points(self, trader_wxid, target_wxid, num, reason: str, plugin: str) -> bool:
+        with self._points_lock:  # 检查余额和两边的变化在同一个锁内
+            self._require_points(trader_wxid)
+            self._require_points(target_wxid)
+            if self._points[trader_wxid] - num < 0:
+                logger.info(f"[数据库] {trader_wxid} 积分不足，无法扣除 {num} 点")
+                return False
+            self._journal_points(trader_wxid, -num, reason, plugin)
+            self._journal_points(target_wxid, num, reason, plugin)
+            return True
+
+    def _journal_points(self, wxid, delta, reason: str, plugin: str):  # 需要持有锁
+        self._points[wxid] += delta
+        self._points_seq += 1
+        entry = [self._points_seq, wxid, delta, self._points[wxid], reason, plugin, int(time.time())]
+        self._points_pending.append(entry)
+        self._points_journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._points_journal.flush()  # 交给操作系统，进程崩溃不会丢失；每次写入数据库前fsync
+
+    def _rotate_points_journal(self):  # 需要持有锁
+        self._points_journal.flush()
+        os.fsync(self._points_journal.fileno())
+        self._points_journal.close()
+        os.replace(POINTS_JOURNAL, POINTS_JOURNAL_FLUSHING)
+        self._points_journal = open(POINTS_JOURNAL, "a", encoding="utf-8")
+
+    def _points_flush_loop(self):
+        while True:
+            time.sleep(self.points_flush_interval)
+            try:
+                self.flush_points()
+            except Exception as error:
+                logger.error(f"[数据库]积分写入失败: {error}")
+
+    def _flush_points(self, entries: list) -> bool:  # 在写线程中运行
+        cursor = self._connection().cursor()
 
-            cursor.execute(sql, arg)
-            trader_points = cursor.fetchall()[0][0]
-            if trader_points >= num:
-                self._add_points(trader_wxid, num * -1)
-                self._add_points(target_wxid, num)
+        try:
+            # 上次等待超时的写入可能之后还是提交了，和恢复日志一样跳过已写入的部分，避免重复加分
+            cursor.execute("SELECT VALUE FROM BOTMETA WHERE KEY='points_journal_seq'")
+            flushed_seq = cursor.fetchone()[0]
+            entries = [entry for entry in entries if entry[0] > flushed_seq]
+            if not entries:
                 return True
-            else:
-                return False
+
+            for wxid in self._apply_points_entries(cursor, entries):
+                cursor.execute("SELECT POINTS, NICKNAME FROM USERDATA WHERE WXID=?", (wxid,))
+                balance, nickname = cursor.fetchone()
+                self._after_commit.append(partial(self._leaderboard_points_changed, wxid, nickname, balance))
+            return True
         finally:
             cursor.close()
 
+    @staticmethod
+    def _apply_points_entries(cursor: sqlite3.Cursor, entries: list) -> dict:
+        deltas = {}  # 同一个用户的变化合并成一次更新
+        for _, wxid, delta, _, _, _, _ in entries:
+            deltas[wxid] = deltas.get(wxid, 0) + delta
+
+        cursor.executemany("UPDATE USERDATA SET POINTS=POINTS+? WHERE WXID=?",
+                           [(delta, wxid) for wxid, delta in deltas.items()])
+        cursor.executemany("INSERT INTO POINTS_LEDGER (WXID, DELTA, BALANCE, REASON, PLUGIN, TS) VALUES (?, ?, ?, ?, ?, ?)",
+                           [entry[1:] for entry in entries])
+        cursor.execute("UPDATE BOTMETA SET VALUE=? WHERE KEY='points_journal_seq'", (entries[-1][0],))
+        return deltas
+
+    def _recover_points_journal(self, cursor: sqlite3.Cursor) -> int:  # 把上次退出时还没写入数据库的积分变化写入，返回最后的序号
+        cursor.execute("SELECT VALUE FROM BOTMETA WHERE KEY='points_journal_seq'")
+        flushed_seq = cursor.fetchone()[0]
+
+        entries = []
+        for path in (POINTS_JOURNAL_FLUSHING, POINTS_JOURNAL):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # 崩溃时写了一半的行
+                        continue
+                    if entry[0] > flushed_seq:
+                        entries.append(entry)
+
+        if entries:
+            entries.sort()
+            cursor.execute("BEGIN")
+            self._apply_points_entries(cursor, entries)
+            cursor.execute("COMMIT")
+            logger.warning(f"[数据库]已从积分日志恢复 {len(entries)} 条积分变化")
+            flushed_seq = entries[-1][0]
+
+        for path in (POINTS_JOURNAL_FLUSHING, POINTS_JOURNAL):
+            if os.path.exists(path):
+                os.remove(path)
+        return flushed_seq
+
     def get_user_list(self) -> list:
-        cursor = self.database.cursor()
+        return self._execute_read(self._get_user_list)
+
+    def _get_user_list(self) -> list:
+        cursor = self._connection().cursor()
 
         try:
             cursor.execute("select * from USERDATA")
@@ -255,7 +841,10 @@ class BotDatabase:
             cursor.close()
 
     def get_user_count(self) -> int:
-        cursor = self.database.cursor()
+        return self._execute_read(self._get_user_count)
+
+    def _get_user_count(self) -> int:
+        cursor = self._connection().cursor()
 
         try:
             cursor.execute("select count(*) from USERDATA")
@@ -264,64 +853,252 @@ class BotDatabase:
         finally:
             cursor.close()
 
-    def get_private_gpt_data(self, wxid: str) -> dict:
-        cursor = self.database.cursor()
+    def append_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:
+        return self._execute_in_queue(self._append_dialogue, wxid, messages, tokens)
+
+    def _append_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:
+        """
+        在对话记录末尾追加消息。Append messages to the end of a dialogue.
+        :param messages: openai格式的消息。Messages in openai format.
+        :param tokens: 每条消息的token数，不提供则估算。Token count of each message, estimated if not given.
+        """
+        cursor = self._connection().cursor()
 
         try:
-            self._check_user(wxid)
-            sql = "SELECT PRIVATE_GPT_DATA FROM USERDATA WHERE WXID=?"
-            arg = (wxid,)
-            cursor.execute(sql, arg)
-            json_string = cursor.fetchone()[0]
-            if not json_string:
-                return {}
-            else:
-                json_data = json.loads(json_string)
-                return json_data
+            self._insert_dialogue(cursor, wxid, messages, tokens)
         finally:
             cursor.close()
 
-    def save_private_gpt_data(self, wxid: str, data: dict) -> None:
-        cursor = self.database.cursor()
+    def replace_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:
+        return self._execute_in_queue(self._replace_dialogue, wxid, messages, tokens)
+
+    def _replace_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:  # 比如用总结替换整个对话
+        self._clear_dialogue(wxid)
+        self._append_dialogue(wxid, messages, tokens)
+
+    def get_dialogue(self, wxid: str, max_messages: int = None, max_tokens: int = None) -> list:
+        return self._execute_read(self._get_dialogue, wxid, max_messages, max_tokens)
+
+    def _get_dialogue(self, wxid: str, max_messages: int = None, max_tokens: int = None) -> list:
+        """
+        读取最近的对话，只读取需要的行。Read the most recent part of a dialogue, loading only the rows needed.
+        :param max_messages: 最多读取的消息数。The maximum number of messages.
+        :param max_tokens: 最多读取的token数。The maximum number of tokens.
+        :return: list - 按时间顺序排列的消息。Messages in chronological order.
+        """
+        cursor = self._connection().cursor()
 
         try:
-            self._check_user(wxid)
-            json_string = json.dumps(data)
+            sql = """SELECT SEQ, MESSAGE, SUM(TOKENS) OVER (ORDER BY SEQ DESC) AS TOTAL
+                     FROM GPT_DIALOGUE WHERE WXID=? ORDER BY SEQ DESC LIMIT ?"""  # 从最新的消息往前累计token数
+            arg = [wxid, -1 if max_messages is None else max_messages]
+            if max_tokens is not None:
+                sql = f"SELECT * FROM ({sql}) WHERE TOTAL<=?"
+                arg.append(max_tokens)
+            cursor.execute(f"SELECT MESSAGE FROM ({sql}) ORDER BY SEQ", arg)
+            return [json.loads(row[0]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def get_dialogue_tokens(self, wxid: str) -> int:
+        return self._execute_read(self._get_dialogue_tokens, wxid)
+
+    def _get_dialogue_tokens(self, wxid: str) -> int:
+        cursor = self._connection().cursor()
+
+        try:
+            cursor.execute("SELECT COALESCE(SUM(TOKENS), 0) FROM GPT_DIALOGUE WHERE WXID=?", (wxid,))
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def clear_dialogue(self, wxid: str) -> None:
+        return self._execute_in_queue(self._clear_dialogue, wxid)
+
+    def _clear_dialogue(self, wxid: str) -> None:
+        cursor = self._connection().cursor()
+
+        try:
+            cursor.execute("DELETE FROM GPT_DIALOGUE WHERE WXID=?", (wxid,))
+            logger.info(f"[数据库] {wxid} GPT对话记录已清除")
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _insert_dialogue(cursor: sqlite3.Cursor, wxid: str, messages: list, tokens: list = None):
+        cursor.execute("SELECT COALESCE(MAX(SEQ), 0) FROM GPT_DIALOGUE WHERE WXID=?", (wxid,))  # 走主键索引
+        seq = cursor.fetchone()[0]
+        if tokens is None:
+            tokens = [len(str(message.get("content") or "")) + 3 for message in messages]  # 按字符数估算，不会少估
+
+        sql = "INSERT INTO GPT_DIALOGUE (WXID, SEQ, ROLE, MESSAGE, TOKENS) VALUES (?, ?, ?, ?, ?)"
+        cursor.executemany(sql, [(wxid, seq + i, message.get("role"), json.dumps(message, ensure_ascii=False), count)
+                                 for i, (message, count) in enumerate(zip(messages, tokens), start=1)])
+
+    def kv_get(self, namespace: str, key: str, default=None):
+        """
+        读取插件键值存储中的值，优先使用缓存。Read a value from the plugin key-value store, from the cache when possible.
+        :param namespace: 命名空间，一般是插件名。The namespace, usually the plugin name.
+        :param key: 键。The key.
+        :param default: 键不存在时返回的值。Returned when the key does not exist.
+        :return: 可以JSON序列化的值，每次返回新的对象。A JSON-serializable value, a new object every time.
+        """
+        value = self._kv_cache.get((namespace, key), _MISSING)
+        if value is _MISSING:
+            value = self._execute_read(self._kv_load, namespace, key)
+        return default if value is None else json.loads(value)
+
+    def kv_set(self, namespace: str, key: str, value) -> None:
+        """
+        写入插件键值存储，立即对读取可见，稍后批量写入数据库。
+        Write to the plugin key-value store. Visible to reads immediately, written to the database in a batch shortly after.
+        :param value: 可以JSON序列化的值。A JSON-serializable value.
+        """
+        self._kv_write(namespace, key, json.dumps(value, ensure_ascii=False))
+
+    def kv_delete(self, namespace: str, key: str) -> None:
+        self._kv_write(namespace, key, None)
+
+    def kv_update(self, namespace: str, key: str, func, default=None):
+        """
+        原子地修改一个键，同一个键的并发修改不会丢失。Atomically update a key; concurrent updates of the same key are never lost.
+        :param func: 接收旧值(不存在时为default)并返回新值的函数，不能有耗时操作。Takes the old value (default if missing) and returns the new one; must be quick.
+        :return: 新值。The new value.
+        """
+        if (namespace, key) not in self._kv_cache:
+            self._execute_read(self._kv_load, namespace, key)
+        return self._kv_apply(namespace, key, func, default)
+
+    def kv_items(self, namespace: str) -> dict:
+        """
+        读取一个命名空间中的所有键值。Read every key and value in a namespace.
+        :return: dict - 键 -> 值。Key -> value.
+        """
+        return self._kv_decode(self._execute_read(self._kv_load_namespace, namespace) or {})
+
+    def kv_flush(self) -> None:
+        """
+        立即把键值存储的修改写入数据库。Write pending key-value changes to the database now.
+        """
+        if self._kv_dirty:
+            self._execute_in_queue(self._kv_flush)
+
+    def _kv_load(self, namespace: str, key: str):  # 在只读连接池中运行，读取后放入缓存
+        cursor = self._connection().cursor()
 
-            sql = "UPDATE USERDATA SET PRIVATE_GPT_DATA=? WHERE WXID=?"
-            args = (json_string, wxid,)
-            cursor.execute(sql, args)
-            self.database.commit()  # 提交数据库
-            logger.info(f"[数据库] {wxid} 私聊GPT数据已保存")
+        try:
+            cursor.execute("SELECT VALUE FROM PLUGIN_KV WHERE NAMESPACE=? AND KEY=?", (namespace, key,))
+            row = cursor.fetchone()
         finally:
             cursor.close()
 
+        with self._kv_lock:  # 读取期间被修改过的话，以缓存为准
+            return self._kv_cache.setdefault((namespace, key), row[0] if row else None)
+
+    def _kv_load_namespace(self, namespace: str) -> dict:
+        cursor = self._connection().cursor()
+
+        try:
+            cursor.execute("SELECT KEY, VALUE FROM PLUGIN_KV WHERE NAMESPACE=?", (namespace,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        with self._kv_lock:
+            for key, value in rows:
+                self._kv_cache.setdefault((namespace, key), value)
+            return {key: value for (cached_namespace, key), value in self._kv_cache.items()
+                    if cached_namespace == namespace and value is not None}
+
+    @staticmethod
+    def _kv_decode(items: dict) -> dict:
+        return {key: json.loads(value) for key, value in items.items()}
+
+    def _kv_apply(self, namespace: str, key: str, func, default=None):
+        with self._kv_lock:
+            value = self._kv_cache.get((namespace, key))
+            new_value = func(json.loads(json.dumps(default)) if value is None else json.loads(value))  # 给func新的对象
+            self._kv_write(namespace, key, json.dumps(new_value, ensure_ascii=False))
+        return new_value
+
+    def _kv_write(self, namespace: str, key: str, value):
+        with self._kv_lock:
+            self._kv_cache[(namespace, key)] = value
+            self._kv_dirty[(namespace, key)] = value
+            self._kv_schedule_flush()
+
+    def _kv_schedule_flush(self):  # 需要持有锁
+        if not self._kv_flush_scheduled:
+            self._kv_flush_scheduled = True
+            timer = threading.Timer(self.kv_flush_delay, self._kv_flush_later)
+            timer.daemon = True
+            timer.start()
+
+    def _kv_flush_later(self):
+        self.submit(self._kv_flush).add_done_callback(self._kv_flush_done)
+
+    def _kv_flush_done(self, future: Future):
+        if future.exception() is not None:  # 写入失败，修改还在，稍后重试
+            logger.error(f"[数据库]键值存储写入失败: {future.exception()}")
+            with self._kv_lock:
+                if self._kv_dirty:
+                    self._kv_schedule_flush()
+
+    def _kv_flush(self):  # 在写线程中运行
+        with self._kv_lock:
+            self._kv_flush_scheduled = False  # 之后的修改会重新安排写入
+            dirty = dict(self._kv_dirty)
+
+        cursor = self._connection().cursor()
+        try:
+            cursor.executemany("INSERT OR REPLACE INTO PLUGIN_KV (NAMESPACE, KEY, VALUE) VALUES (?, ?, ?)",
+                               [(namespace, key, value) for (namespace, key), value in dirty.items() if value is not None])
+            cursor.executemany("DELETE FROM PLUGIN_KV WHERE NAMESPACE=? AND KEY=?",
+                               [(namespace, key) for (namespace, key), value in dirty.items() if value is None])
+        finally:
+            cursor.close()
+
+        self._after_commit.append(partial(self._kv_flushed, dirty))
+
+    def _kv_flushed(self, dirty: dict):  # 提交后才从待写入中移除，期间又被修改的键保留
+        with self._kv_lock:
+            for item, value in dirty.items():
+                if self._kv_dirty.get(item, _MISSING) is value:
+                    del self._kv_dirty[item]
+
     def add_column(self, column_name: str, column_type: str) -> None:
-        cursor = self.database.cursor()
+        return self._execute_in_queue(self._add_column, column_name, column_type)
+
+    def _add_column(self, column_name: str, column_type: str) -> None:
+        cursor = self._connection().cursor()
 
         try:
             sql = "ALTER TABLE USERDATA ADD COLUMN ? ?"
             arg = (column_name, column_type,)
             cursor.execute(sql, arg)
-            self.database.commit()
             logger.info(f"[数据库] 已添加列 {column_name}")
         finally:
             cursor.close()
 
     def remove_column(self, column_name: str) -> None:
-        cursor = self.database.cursor()
+        return self._execute_in_queue(self._remove_column, column_name)
+
+    def _remove_column(self, column_name: str) -> None:
+        cursor = self._connection().cursor()
 
         try:
             sql = "ALTER TABLE USERDATA DROP COLUMN ?"
             arg = (column_name,)
             cursor.execute(sql, arg)
-            self.database.commit()
             logger.info(f"[数据库] 已删除列 {column_name}")
         finally:
             cursor.close()
 
     def get_columns(self) -> list:
-        cursor = self.database.cursor()
+        return self._execute_read(self._get_columns)
+
+    def _get_columns(self) -> list:
+        cursor = self._connection().cursor()
 
         try:
             cursor.execute("PRAGMA table_info(USERDATA)")
@@ -332,7 +1109,10 @@ class BotDatabase:
             cursor.close()
 
     def get_nickname(self, wxid: str) -> str:
-        cursor = self.database.cursor()
+        return self._execute_read(self._get_nickname, wxid, wxid=wxid)
+
+    def _get_nickname(self, wxid: str) -> str:
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
@@ -346,7 +1126,10 @@ class BotDatabase:
             cursor.close()
 
     def set_nickname(self, wxid: str, nickname: str) -> None:
-        cursor = self.database.cursor()
+        return self._execute_in_queue(self._set_nickname, wxid, nickname)
+
+    def _set_nickname(self, wxid: str, nickname: str) -> None:
+        cursor = self._connection().cursor()
 
         try:
             self._check_user(wxid)
@@ -354,6 +1137,136 @@ class BotDatabase:
 
             arg = (nickname, wxid,)
             cursor.execute(sql, arg)
-            self.database.commit()  # 提交数据库
+            self._after_commit.append(partial(self._leaderboard_nickname_changed, wxid, nickname))
         finally:
             cursor.close()
+
+
+@singleton
+class AsyncBotDatabase:
+    """
+    BotDatabase的异步接口，方法名与BotDatabase相同。操作在写线程或只读连接池中执行，等待时不会阻塞事件循环。
+    Async interface of BotDatabase with the same method names. Operations run on the writer thread or the read-only pool, awaiting them does not block the event loop.
+    """
+
+    def __init__(self):
+        self.db = BotDatabase()
+
+    @staticmethod
+    async def _execute(future: Future):
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception as error:
+            # 与同步接口一致，记录错误并返回None
+            logger.error(error)
+
+    async def add_points(self, wxid, num, reason: str = "", plugin: str = "") -> bool:
+        if self.db.points_write_behind:
+            await self._load_points(wxid)
+            return self.db._write_behind_add_points(wxid, num, reason, plugin)
+        return await self._execute(self.db.submit(self.db._add_points, wxid, num, reason, plugin))
+
+    async def add_points_entries(self, wxid, entries: list, plugin: str = "") -> bool:
+        if self.db.points_write_behind:
+            await self._load_points(wxid)
+            return self.db._write_behind_add_points_entries(wxid, entries, plugin)
+        return await self._execute(self.db.submit(self.db._add_points_entries, wxid, entries, plugin))
+
+    async def set_points(self, wxid, num, reason: str = "", plugin: str = ""):
+        if self.db.points_write_behind:
+            await self._load_points(wxid)
+            return self.db._write_behind_set_points(wxid, num, reason, plugin)
+        return await self._execute(self.db.submit(self.db._set_points, wxid, num, reason, plugin))
+
+    async def get_points_ledger(self, wxid: str = None, limit: int = 100) -> list:
+        return await self._execute(self.db.submit_read(self.db._get_points_ledger, wxid, limit))
+
+    async def get_points(self, wxid):
+        if self.db.points_write_behind:
+            await self._load_points(wxid)
+            return self.db._points.get(wxid)
+        return await self._execute(self.db.submit_read(self.db._get_points, wxid, wxid=wxid))
+
+    async def _load_points(self, wxid):  # write-behind模式下把积分读入内存
+        if wxid not in self.db._points:
+            self.db._cache_points(wxid, await self._execute(self.db.submit_read(self.db._get_points, wxid, wxid=wxid)))
+
+    async def get_stat(self, wxid):
+        return await self._execute(self.db.submit_read(self.db._get_stat, wxid, wxid=wxid))
+
+    async def set_stat(self, wxid, num):
+        return await self._execute(self.db.submit(self.db._set_stat, wxid, num))
+
+    async def reset_stat(self):
+        return await self._execute(self.db.submit(self.db._reset_stat))
+
+    async def get_highest_points(self, num):
+        return await self._execute(self.db.submit_read(self.db._get_highest_points, num))
+
+    async def get_leaderboard(self, num: int) -> list:
+        return await self._execute(self.db.submit_read(self.db._get_leaderboard, num))
+
+    async def set_whitelist(self, wxid, stat):
+        return await self._execute(self.db.submit(self.db._set_whitelist, wxid, stat))
+
+    async def get_whitelist(self, wxid):
+        return await self._execute(self.db.submit_read(self.db._get_whitelist, wxid, wxid=wxid))
+
+    async def safe_trade_points(self, trader_wxid, target_wxid, num, reason: str = "", plugin: str = "") -> bool:
+        if self.db.points_write_behind:
+            await self._load_points(trader_wxid)
+            await self._load_points(target_wxid)
+            return self.db._write_behind_trade_points(trader_wxid, target_wxid, num, reason, plugin)
+        return await self._execute(
+            self.db.submit(self.db._safe_trade_points, trader_wxid, target_wxid, num, reason, plugin))
+
+    async def get_user_list(self) -> list:
+        return await self._execute(self.db.submit_read(self.db._get_user_list))
+
+    async def get_user_count(self) -> int:
+        return await self._execute(self.db.submit_read(self.db._get_user_count))
+
+    async def append_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:
+        return await self._execute(self.db.submit(self.db._append_dialogue, wxid, messages, tokens))
+
+    async def replace_dialogue(self, wxid: str, messages: list, tokens: list = None) -> None:
+        return await self._execute(self.db.submit(self.db._replace_dialogue, wxid, messages, tokens))
+
+    async def get_dialogue(self, wxid: str, max_messages: int = None, max_tokens: int = None) -> list:
+        return await self._execute(self.db.submit_read(self.db._get_dialogue, wxid, max_messages, max_tokens))
+
+    async def get_dialogue_tokens(self, wxid: str) -> int:
+        return await self._execute(self.db.submit_read(self.db._get_dialogue_tokens, wxid))
+
+    async def clear_dialogue(self, wxid: str) -> None:
+        return await self._execute(self.db.submit(self.db._clear_dialogue, wxid))
+
+    async def get_nickname(self, wxid: str) -> str:
+        return await self._execute(self.db.submit_read(self.db._get_nickname, wxid, wxid=wxid))
+
+    async def kv_get(self, namespace: str, key: str, default=None):
+        value = self.db._kv_cache.get((namespace, key), _MISSING)
+        if value is _MISSING:
+            value = await self._execute(self.db.submit_read(self.db._kv_load, namespace, key))
+        return default if value is None else json.loads(value)
+
+    async def kv_set(self, namespace: str, key: str, value) -> None:
+        self.db.kv_set(namespace, key, value)  # 只写缓存，不会阻塞
+
+    async def kv_delete(self, namespace: str, key: str) -> None:
+        self.db.kv_delete(namespace, key)
+
+    async def kv_update(self, namespace: str, key: str, func, default=None):
+        if (namespace, key) not in self.db._kv_cache:
+            await self._execute(self.db.submit_read(self.db._kv_load, namespace, key))
+        return self.db._kv_apply(namespace, key, func, default)
+
+    async def kv_items(self, namespace: str) -> dict:
+        return self.db._kv_decode(await self._execute(self.db.submit_read(self.db._kv_load_namespace, namespace)) or {})
+
+    async def kv_flush(self) -> None:
+        if self.db._kv_dirty:
+            await self._execute(self.db.submit(self.db._kv_flush))
+
+    async def set_nickname(self, wxid: str, nickname: str) -> None:
+        return await self._execute(self.db.submit(self.db._set_nickname, wxid, nickname))
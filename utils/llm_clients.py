@@ -0,0 +1,107 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+
+import httpx
+import yaml
+from loguru import logger
+from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+from utils.singleton import singleton
+
+AZURE_API_VERSION = "2024-07-01-preview"
+
+
+@singleton
+class LLMClients:
+    """
+    大模型客户端注册表。按服务商、地址和Key复用长期存在的客户端，共享连接池和keep-alive连接，不用每次请求都重新握手。
+    LLM client registry. Reuses long-lived clients keyed by provider, endpoint and key, so requests share a connection pool with keep-alive instead of a new handshake each time.
+    """
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.max_connections = main_config.get("llm_max_connections", 20)  # 每个客户端的最大连接数
+        self.max_keepalive_connections = main_config.get("llm_max_keepalive_connections", 10)  # 保持的空闲连接数
+        self.keepalive_expiry = main_config.get("llm_keepalive_expiry", 60)  # 空闲连接保持的秒数
+        self.timeout = main_config.get("llm_timeout", 120)  # 请求超时时间(秒)
+
+        self._clients = {}  # (服务商, 地址, Key, API版本) -> 客户端
+
+    def get_client(self, provider: str, api_key: str, api_base: str, api_version: str = AZURE_API_VERSION):
+        """
+        获取可复用的客户端，不存在时创建。Get a reusable client, creating it if needed.
+        :param provider: 服务商，azure使用AsyncAzureOpenAI，其他使用AsyncOpenAI。The provider; azure uses AsyncAzureOpenAI, anything else AsyncOpenAI.
+        :param api_key: API Key。The API key.
+        :param api_base: API地址。The API endpoint.
+        :param api_version: Azure的API版本。The Azure API version.
+        :return: AsyncOpenAI | AsyncAzureOpenAI
+        """
+        azure = provider == "azure"
+        key = (azure, api_base, api_key, api_version if azure else None)
+        client = self._clients.get(key)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive_connections,
+                                    keepalive_expiry=self.keepalive_expiry),
+                timeout=self.timeout,
+            )
+            if azure:
+                client = AsyncAzureOpenAI(api_key=api_key, azure_endpoint=api_base, api_version=api_version,
+                                          timeout=self.timeout, http_client=http_client)
+            else:
+                client = AsyncOpenAI(api_key=api_key, base_url=api_base, timeout=self.timeout, http_client=http_client)
+            self._clients[key] = client
+            logger.debug(f"[大模型客户端]已创建 {provider or 'openai'} 客户端: {api_base}")
+        return client
+
+    def get_provider_client(self, provider: str):
+        """
+        按config/config.py中的服务商设置获取客户端。Get the client of a provider configured in config/config.py.
+        :param provider: azure, workers, 其他都使用deepseek。azure, workers, anything else uses deepseek.
+        """
+        import config.config as CONFIG  # 用到时才导入，没有配置GPT时也能启动
+        if provider == "azure":
+            return self.get_client(provider, CONFIG.OPENAI_API_KEY, CONFIG.OPENAI_API_BASE)
+        elif provider == "workers":
+            return self.get_client(provider, CONFIG.CLOUDFLARE_API_KEY,
+                                   f"https://api.cloudflare.com/client/v4/accounts/{CONFIG.CLOUDFLARE_ACCOUNT_ID}/ai/v1")
+        return self.get_client(provider, CONFIG.DEEPSEEK_API_KEY, CONFIG.DEEPSEEK_API_BASE)
+
+    def reset(self):
+        """
+        丢弃所有客户端，之后的请求会创建新的客户端。旧客户端在进行中的请求超时后关闭。
+        Drop every client so later requests build new ones. Old clients are closed once their in-flight requests have timed out.
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # 没有事件循环，不会有进行中的请求
+            return
+        loop.call_later(self.timeout, lambda: loop.create_task(self._close_clients(clients)))
+
+    async def close(self):
+        """
+        关闭所有客户端和它们的连接池。Close every client and its connection pool.
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await self._close_clients(clients)
+
+    @staticmethod
+    async def _close_clients(clients: list):
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as error:
+                logger.warning(f"[大模型客户端]关闭客户端失败: {error}")
+
+
+# 实例化大模型客户端注册表
+llm_clients = LLMClients()
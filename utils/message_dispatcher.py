@@ -0,0 +1,154 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+import collections
+import zlib
+
+import yaml
+from loguru import logger
+
+from utils.singleton import singleton
+
+
+@singleton
+class MessageDispatcher:
+    """
+    消息分发器。按会话(roomid/sender)把消息分片到固定数量的worker，同一会话内严格按顺序处理，不同会话并行处理。
+    Message dispatcher. Shards messages by conversation (roomid/sender) onto a fixed number of workers, so each conversation is handled strictly in order while different conversations run in parallel.
+
+    分片队列满时按message_queue_policy处理，不会让一个繁忙的会话挡住其他会话 Policies when a shard queue is full, so one busy conversation never stalls the others:
+    - block: 放入该分片的溢出队列。所有分片的溢出总数达到上限时才等待，把背压传给接收队列。Park the message in the shard's overflow; only when the total overflow is full does dispatch wait, passing backpressure on to the ingress queue.
+    - drop_oldest: 丢弃该分片中最旧的消息。Drop the oldest message of that shard.
+    - drop_newest: 丢弃新收到的消息。Drop the newly received message.
+    """
+
+    policies = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.worker_count = main_config.get("message_workers", 8)  # worker数量
+        self.worker_queue_size = main_config.get("message_worker_queue_size", 100)  # 每个worker的队列长度
+        self.max_concurrency = main_config.get("message_max_concurrency", 0)  # 全局并发上限，0为不限制(即worker数量)
+        self.overflow_size = main_config.get("message_overflow_size", 1000)  # block策略下所有分片溢出队列的总长度
+        self.policy = main_config.get("message_queue_policy", "block")  # 与接收队列相同的策略
+        if self.policy not in self.policies:
+            self.policy = "block"  # 接收器已经记录过错误
+
+        self.dropped_count = 0  # 分片队列满时丢弃的消息数
+
+        self._queues = []
+        self._overflows = []  # 每个分片的溢出队列
+        self._overflow_count = 0
+        self._overflow_space = None
+        self._workers = []
+        self._semaphore = None
+        self._handler = None
+
+    def start(self, handler):
+        """
+        启动所有worker。必须在事件循环中调用。Start all workers. Must be called from the event loop.
+        :param handler: 处理单条消息的协程函数。The coroutine function handling a single message.
+        """
+        if self._workers:
+            return
+
+        self._handler = handler
+        if self.max_concurrency and self.max_concurrency < self.worker_count:  # 只有小于worker数量才有限制作用
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._overflow_space = asyncio.Event()
+        for i in range(self.worker_count):
+            queue = asyncio.Queue(maxsize=self.worker_queue_size)
+            overflow = collections.deque()
+            self._queues.append(queue)
+            self._overflows.append(overflow)
+            self._workers.append(asyncio.create_task(self._worker(queue, overflow), name=f"message_worker_{i}"))
+
+        logger.info(f"[消息分发]已启动 {self.worker_count} 个worker，全局并发上限 "
+                    f"{self.max_concurrency if self._semaphore else '不限制'}")
+
+    async def stop(self):
+        """
+        停止所有worker。Stop all workers.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        self._overflows.clear()
+        self._overflow_count = 0
+
+    async def dispatch(self, message):
+        """
+        把消息放入对应会话的worker队列。分片队列满时按策略处理，只有block策略下所有溢出队列都满了才会等待。
+        Put the message onto the worker queue of its conversation. A full shard is handled by the policy; only with block and the total overflow full does this wait.
+        :param message: 带有roomid和sender的消息。A message with roomid and sender.
+        """
+        shard = self.shard_of(message)
+        queue, overflow = self._queues[shard], self._overflows[shard]
+        if not overflow:  # 有溢出时新消息也要排在溢出之后，保证顺序
+            try:
+                queue.put_nowait(message)
+                return
+            except asyncio.QueueFull:
+                pass
+
+        if self.policy == "drop_newest":
+            self._record_drop()
+        elif self.policy == "drop_oldest":
+            queue.get_nowait()
+            queue.task_done()
+            queue.put_nowait(message)
+            self._record_drop()
+        else:
+            while self._overflow_count >= self.overflow_size:  # 全局都满了，等待任意分片腾出空位
+                self._overflow_space.clear()
+                await self._overflow_space.wait()
+            overflow.append(message)
+            self._overflow_count += 1
+
+    def shard_of(self, message) -> int:
+        """
+        计算消息所属的分片。Compute the shard of a message.
+        :param message: 带有roomid和sender的消息。A message with roomid and sender.
+        :return: int - 分片序号。The shard index.
+        """
+        conversation = message.roomid or message.sender
+        return zlib.crc32(conversation.encode("utf-8")) % self.worker_count
+
+    def get_stats(self) -> dict:
+        """
+        获取各个worker的队列深度。Get the queue depth of every worker.
+        :return: dict - 总队列深度(包括溢出)，各分片队列深度，已丢弃数。Total queue depth (overflow included), per-shard queue depths and dropped count.
+        """
+        depths = [queue.qsize() + len(overflow) for queue, overflow in zip(self._queues, self._overflows)]
+        return {"queue_depth": sum(depths), "shard_depths": depths, "dropped": self.dropped_count}
+
+    def _record_drop(self):
+        self.dropped_count += 1
+        if self.dropped_count % 100 == 1:  # 避免日志刷屏
+            logger.warning(f"[消息分发]分片队列已满，已丢弃 {self.dropped_count} 条消息")
+
+    async def _worker(self, queue: asyncio.Queue, overflow: collections.deque):
+        while True:
+            message = await queue.get()
+            if overflow:  # 刚取出一条，队列有空位
+                queue.put_nowait(overflow.popleft())
+                self._overflow_count -= 1
+                self._overflow_space.set()
+            try:
+                if self._semaphore is None:
+                    await self._handler(message)
+                else:
+                    async with self._semaphore:
+                        await self._handler(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.exception(f"[消息分发]处理消息出错: {error}")
+            finally:
+                queue.task_done()
@@ -0,0 +1,197 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+import collections
+import threading
+
+import pynng
+import yaml
+from loguru import logger
+from wcferry import wcf_pb2
+
+from utils.singleton import singleton
+
+
+@singleton
+class MessageReceiver:
+    """
+    消息接收器。由一个常驻线程独占pynng.Pair1 socket，解析wcf_pb2.Response后放入有界的asyncio队列。
+    Message receiver. A long-lived thread owns the pynng.Pair1 socket, decodes wcf_pb2.Response frames and pushes them into a bounded asyncio queue.
+
+    队列满时的策略 Policies when the queue is full:
+    - block: 阻塞接收线程，让消息积压在wcferry一侧 (背压)。Block the receiver thread so messages pile up on the wcferry side (backpressure).
+    - drop_oldest: 丢弃队列中最旧的消息。Drop the oldest queued message.
+    - drop_newest: 丢弃新收到的消息。Drop the newly received message.
+    丢弃策略下，接收线程先把消息放入有界的中转队列，事件循环繁忙时也不会无限积压。
+    With the drop policies the receiver thread first puts messages into a bounded hand-off buffer, so nothing piles up without limit while the event loop is busy.
+    """
+
+    policies = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.maxsize = main_config.get("message_queue_size", 1000)  # 接收队列长度
+        self.policy = main_config.get("message_queue_policy", "block")  # 队列满时的策略
+        if self.policy not in self.policies:
+            logger.error(f"未知的消息队列策略：{self.policy}，已改为block")
+            self.policy = "block"
+
+        self.reconnect_interval = main_config.get("message_reconnect_interval", 5)  # 连接失败后重新连接的间隔(秒)
+
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.connected = False  # 是否已连接到wcferry的消息地址
+        self.last_error = None  # 最近一次接收失败的原因
+
+        self.received_count = 0  # 已接收消息数
+        self.dropped_count = 0  # 已丢弃消息数
+
+        self._loop = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._handoff = collections.deque()  # 丢弃策略下等待事件循环取走的消息，最多maxsize条
+        self._handoff_lock = threading.Lock()
+        self._drain_scheduled = False  # 事件循环中最多只有一个取走消息的回调
+        self._drop_lock = threading.Lock()
+
+    def start(self, msg_url: str):
+        """
+        开始在后台线程接收消息。必须在事件循环中调用。Start receiving messages in a background thread. Must be called from the event loop.
+        :param msg_url: wcferry的消息地址。The wcferry message url.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._receive_loop, args=(msg_url,), name="message_receiver",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """
+        停止接收线程。Stop the receiver thread.
+        :param timeout: 等待线程结束的秒数。Seconds to wait for the thread to exit.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    async def get(self):
+        """
+        获取下一条消息。Get the next message.
+        :return: wcf_pb2.WxMsg
+        """
+        return await self.queue.get()
+
+    def get_stats(self) -> dict:
+        """
+        获取接收队列的统计信息。Get statistics of the ingress queue.
+        :return: dict - 队列深度，队列长度，已接收数，已丢弃数，是否已连接，最近的错误。Queue depth, queue size, received count, dropped count, whether connected and the last error.
+        """
+        return {
+            "queue_depth": self.queue.qsize() + len(self._handoff),
+            "queue_maxsize": self.maxsize,
+            "received": self.received_count,
+            "dropped": self.dropped_count,
+            "connected": self.connected,
+            "last_error": self.last_error,
+        }
+
+    def _receive_loop(self, msg_url: str):
+        while not self._stop_event.is_set():
+            try:
+                if not self._receive(msg_url):
+                    return
+            except Exception as error:  # 比如wcferry的消息地址还没启动，连接失败
+                self.last_error = str(error)
+                logger.error(f"[消息接收]连接 {msg_url} 失败: {error}，{self.reconnect_interval} 秒后重新连接")
+            finally:
+                self.connected = False
+            self._stop_event.wait(self.reconnect_interval)
+
+    def _receive(self, msg_url: str) -> bool:  # 返回False代表不需要重新连接
+        with pynng.Pair1(recv_timeout=1000) as sock:  # 设置超时，以便能检查停止信号
+            sock.dial(msg_url, block=True)
+            self.connected = True
+            self.last_error = None
+            logger.success(f"连接成功: {msg_url}")
+
+            while not self._stop_event.is_set():
+                try:
+                    message = sock.recv_msg()
+                    rsp = wcf_pb2.Response()
+                    rsp.ParseFromString(message.bytes)
+                except pynng.Timeout:
+                    continue
+                except pynng.Closed:
+                    return False
+                except Exception as error:
+                    logger.error(f"接受消息失败:{error}")
+                    continue
+
+                self.received_count += 1
+                if not self._put(rsp.wxmsg):
+                    return False
+        return False
+
+    def _put(self, wxmsg) -> bool:
+        if self._loop.is_closed():
+            return False
+
+        if self.policy == "block":  # 阻塞直到队列有空位
+            future = asyncio.run_coroutine_threadsafe(self.queue.put(wxmsg), self._loop)
+            try:
+                future.result()
+            except Exception as error:
+                logger.error(f"消息放入队列失败:{error}")
+                return False
+            return True
+
+        with self._handoff_lock:  # 在接收线程中限制数量，事件循环繁忙时也不会无限积压
+            if len(self._handoff) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self._record_drop()
+                    return True
+                self._handoff.popleft()  # drop_oldest
+                self._record_drop()
+            self._handoff.append(wxmsg)
+            if self._drain_scheduled:
+                return True
+            self._drain_scheduled = True
+
+        try:
+            self._loop.call_soon_threadsafe(self._drain_handoff)
+        except RuntimeError:  # 事件循环已关闭
+            return False
+        return True
+
+    def _drain_handoff(self):  # 在事件循环线程中运行
+        with self._handoff_lock:
+            messages = list(self._handoff)
+            self._handoff.clear()
+            self._drain_scheduled = False
+
+        for wxmsg in messages:
+            self._put_nowait(wxmsg)
+
+    def _put_nowait(self, wxmsg):  # 在事件循环线程中运行
+        if self.queue.full():
+            if self.policy == "drop_newest":
+                self._record_drop()
+                return
+
+            self.queue.get_nowait()  # drop_oldest
+            self._record_drop()
+
+        self.queue.put_nowait(wxmsg)
+
+    def _record_drop(self):
+        with self._drop_lock:  # 接收线程和事件循环都会丢弃消息
+            self.dropped_count += 1
+            dropped_count = self.dropped_count
+        if dropped_count % 100 == 1:  # 避免日志刷屏
+            logger.warning(f"[消息队列]队列已满，已丢弃 {dropped_count} 条消息")
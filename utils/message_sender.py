@@ -0,0 +1,208 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+import yaml
+from loguru import logger
+from wcferry import client
+
+from utils.singleton import singleton
+
+
+class _SendJob:
+    __slots__ = ("receiver", "func", "args", "loop", "future", "attempt")
+
+    def __init__(self, receiver: str, func, args: tuple, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.receiver = receiver
+        self.func = func
+        self.args = args
+        self.loop = loop
+        self.future = future
+        self.attempt = 0
+
+
+@singleton
+class MessageSender:
+    """
+    消息发送器。所有发送请求进入有界队列，由一个专用线程按会话轮流发送，同一会话内保持顺序。
+    Outbound message sender. Every send request goes into a bounded queue and a dedicated thread sends them round-robin across conversations, keeping order within each conversation.
+
+    - 可以设置每个会话和全局的最小发送间隔，默认不限制。A minimum send interval can be set per conversation and for the whole bot; neither is limited by default.
+    - 发送时抛出异常(连接错误等)会按指数退避重试，重试期间该会话后面的消息等待，其他会话不受影响。Sends that raise (transport errors and the like) are retried with exponential backoff; later messages of that conversation wait, other conversations are not affected.
+    - wcferry返回非0不重试：消息可能已经发出，重试会重复发送。A non-zero wcferry return code is not retried: the message may have been delivered, and retrying could send it twice.
+    """
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.maxsize = main_config.get("send_queue_size", 1000)  # 发送队列长度
+        self.room_interval = main_config.get("send_room_interval", 0)  # 同一会话两条消息的最小间隔(秒)，0为不限制
+        self.global_interval = main_config.get("send_global_interval", 0)  # 任意两条消息的最小间隔(秒)，0为不限制
+        self.retries = main_config.get("send_retries", 3)  # 抛出异常时的重试次数
+        self.retry_backoff = main_config.get("send_retry_backoff", 1.0)  # 第一次重试前等待的秒数，之后每次翻倍
+
+        self.sent_count = 0  # 已发送消息数
+        self.failed_count = 0  # 最终发送失败的消息数
+
+        self._rooms = {}  # 会话 -> 待发送的消息deque
+        self._ready = deque()  # 有待发送消息的会话，轮流发送
+        self._room_next_time = {}  # 会话 -> 下一次可以发送的时间
+        self._global_next_time = 0.0
+        self._pending = 0
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._slots = None  # 事件循环中的信号量，队列满时让调用方等待而不阻塞事件循环
+
+    async def send_text(self, bot: client.Wcf, msg: str, receiver: str, aters: str = "") -> int:
+        """
+        发送文本消息，可以@群成员。Send a text message, optionally mentioning group members.
+        :param bot: wcferry客户端。The wcferry client.
+        :param msg: 消息内容。The message.
+        :param receiver: 接收者wxid或群号。The receiver wxid or room id.
+        :param aters: 要@的wxid，多个用逗号分隔。The wxids to mention, separated by commas.
+        :return: int - wcferry的返回值，0为成功。The wcferry return code, 0 on success.
+        """
+        return await self._submit(receiver, bot.send_text, (msg, receiver, aters))
+
+    async def send_image(self, bot: client.Wcf, path: str, receiver: str) -> int:
+        """
+        发送图片。Send an image.
+        :param path: 图片的绝对路径或链接。The absolute path or url of the image.
+        """
+        return await self._submit(receiver, bot.send_image, (path, receiver))
+
+    async def send_file(self, bot: client.Wcf, path: str, receiver: str) -> int:
+        """
+        发送文件。Send a file.
+        :param path: 文件的绝对路径或链接。The absolute path or url of the file.
+        """
+        return await self._submit(receiver, bot.send_file, (path, receiver))
+
+    def get_stats(self) -> dict:
+        """
+        获取发送队列的统计信息。Get statistics of the outbound queue.
+        :return: dict - 待发送数，队列长度，已发送数，发送失败数。Pending count, queue size, sent count and failed count.
+        """
+        return {
+            "pending": self._pending,
+            "queue_maxsize": self.maxsize,
+            "sent": self.sent_count,
+            "failed": self.failed_count,
+        }
+
+    async def _submit(self, receiver: str, func, args: tuple) -> int:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxsize)
+        self._ensure_thread()
+
+        await self._slots.acquire()  # 队列满时在这里等待
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(lambda _: self._slots.release())
+
+        with self._condition:
+            room = self._rooms.get(receiver)
+            if room is None:
+                room = self._rooms[receiver] = deque()
+                self._ready.append(receiver)
+            room.append(_SendJob(receiver, func, args, loop, future))
+            self._pending += 1
+            self._condition.notify()
+
+        return await asyncio.shield(future)  # 调用方被取消时，消息仍然会发出
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._send_loop, name="message_sender", daemon=True)
+        self._thread.start()
+
+    def _send_loop(self):
+        while True:
+            job = self._next_job()
+
+            try:
+                result = job.func(*job.args)
+            except Exception as error:  # 请求没有完成，可以安全重试
+                if job.attempt < self.retries:
+                    job.attempt += 1
+                    delay = self.retry_backoff * 2 ** (job.attempt - 1)
+                    logger.warning(f"[发送失败]{job.receiver}: {error}，{delay} 秒后第 {job.attempt} 次重试")
+                    self._retry_later(job, delay)
+                    continue
+
+                self.failed_count += 1
+                logger.error(f"[发送失败]{job.receiver}: {error}，已放弃")
+                self._finish(job, -1)
+                continue
+
+            if result != 0:  # 不知道消息是否已经发出，不重试，避免重复发送
+                self.failed_count += 1
+                logger.error(f"[发送失败]{job.receiver}: 返回值 {result}")
+            else:
+                self.sent_count += 1
+            self._finish(job, result)
+
+    def _next_job(self) -> _SendJob:
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = None
+
+                if self._ready and self._global_next_time > now:
+                    wait = self._global_next_time - now
+                else:
+                    for _ in range(len(self._ready)):  # 找到第一个已经可以发送的会话
+                        receiver = self._ready.popleft()
+                        next_time = self._room_next_time.get(receiver, 0.0)
+                        if next_time <= now:
+                            return self._pop_job(receiver, now)
+                        self._ready.append(receiver)
+                        wait = next_time - now if wait is None else min(wait, next_time - now)
+
+                self._condition.wait(wait)
+
+    def _pop_job(self, receiver: str, now: float) -> _SendJob:  # 需要持有锁
+        room = self._rooms[receiver]
+        job = room.popleft()
+        if room:
+            self._ready.append(receiver)  # 还有消息，排到最后，让其他会话先发
+        else:
+            del self._rooms[receiver]
+
+        self._room_next_time[receiver] = now + self.room_interval
+        self._global_next_time = now + self.global_interval
+        if len(self._room_next_time) > self.maxsize:  # 清理已经过期的发送时间
+            self._room_next_time = {key: value for key, value in self._room_next_time.items() if value > now}
+        return job
+
+    def _retry_later(self, job: _SendJob, delay: float):
+        with self._condition:
+            room = self._rooms.get(job.receiver)
+            if room is None:
+                room = self._rooms[job.receiver] = deque()
+                self._ready.append(job.receiver)
+            room.appendleft(job)  # 放回会话最前面，保证顺序
+            self._room_next_time[job.receiver] = time.monotonic() + delay
+
+    def _finish(self, job: _SendJob, result: int):
+        with self._condition:
+            self._pending -= 1
+        if not job.loop.is_closed():
+            job.loop.call_soon_threadsafe(self._set_result, job.future, result)
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, result: int):  # 在事件循环线程中运行
+        if not future.done():
+            future.set_result(result)
+
+
+# 实例化消息发送器
+message_sender = MessageSender()
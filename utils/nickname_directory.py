@@ -0,0 +1,106 @@
+#  Copyright (c) 2024. Henry Yang
+#
+#  This program is licensed under the GNU General Public License v3.0.
+
+import asyncio
+import time
+
+import yaml
+from loguru import logger
+from wcferry import client
+
+from utils.contact_directory import contact_directory
+from utils.database import AsyncBotDatabase
+from utils.singleton import singleton
+
+CONTACTS = ""  # 获取好友昵称时的群号
+
+
+@singleton
+class NicknameDirectory:
+    """
+    昵称目录。在内存中缓存群昵称，按群批量获取并定时刷新，好友昵称来自通讯录目录，只有昵称变化时才写入数据库。
+    Nickname directory. Keeps group aliases in memory, loads them in bulk per group and refreshes them periodically; friend nicknames come from the contact directory. Only writes to the database when a nickname changes.
+
+    - 缓存过期后先返回旧昵称，同时在后台刷新。Once expired, the stale nickname is returned while a refresh runs in the background.
+    - 找不到的用户(新成员/新好友)会触发一次重新获取，两次之间有最小间隔。A missing user (new member or friend) triggers a reload, rate limited by a minimum interval.
+    """
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.ttl = main_config.get("nickname_ttl", 600)  # 昵称缓存的有效时间(秒)
+        self.miss_reload_interval = main_config.get("nickname_miss_reload_interval", 60)  # 找不到用户时重新获取的最小间隔(秒)
+
+        self._members = {}  # 群号 -> {wxid: 群昵称}
+        self._loaded_at = {}  # 群号 -> 上次获取的时间
+        self._loading = {}  # 群号 -> 正在进行的获取任务，同一个群同时只获取一次
+        self._saved = {}  # wxid -> 已经写入数据库的昵称
+
+    async def update(self, bot: client.Wcf, recv) -> None:
+        """
+        根据收到的消息更新发送者的昵称，昵称变化时才写入数据库。
+        Update the nickname of the sender of a message, writing to the database only when it changed.
+        :param bot: wcferry客户端。The wcferry client.
+        :param recv: 收到的消息。The received message.
+        """
+        wxid = recv.sender
+        nickname = await self.get_nickname(bot, wxid, recv.roomid if recv.from_group() else CONTACTS)
+        if not nickname:
+            return
+
+        db = AsyncBotDatabase()
+        if wxid not in self._saved:  # 第一次见到这个用户，读取数据库里的昵称
+            self._saved[wxid] = await db.get_nickname(wxid)
+
+        if self._saved[wxid] != nickname:
+            await db.set_nickname(wxid, nickname)
+            self._saved[wxid] = nickname
+
+    async def get_nickname(self, bot: client.Wcf, wxid: str, roomid: str = CONTACTS) -> str:
+        """
+        获取用户的群昵称或好友昵称。Get the group alias or friend nickname of a user.
+        :param wxid: 用户wxid。The user wxid.
+        :param roomid: 群号，为空时获取好友昵称。The room id, or empty for the friend nickname.
+        :return: str - 昵称，找不到时为空。The nickname, empty if not found.
+        """
+        if roomid == CONTACTS:  # 好友昵称来自通讯录目录
+            contact = await contact_directory.lookup(bot, wxid)
+            return contact["name"] if contact else ""
+
+        members = self._members.get(roomid)
+        if members is None:  # 还没有获取过
+            members = await asyncio.shield(self._fetch_once(bot, roomid))
+        elif time.monotonic() - self._loaded_at[roomid] > self.ttl:  # 已过期，后台刷新，先用旧的
+            self._fetch_once(bot, roomid)
+
+        nickname = members.get(wxid)
+        if nickname is None and time.monotonic() - self._loaded_at[roomid] > self.miss_reload_interval:
+            members = await asyncio.shield(self._fetch_once(bot, roomid))  # 可能是新成员或新好友
+            nickname = members.get(wxid)
+
+        return nickname or ""
+
+    def _fetch_once(self, bot: client.Wcf, roomid: str) -> asyncio.Task:  # 正在获取时复用同一个任务
+        if roomid not in self._loading:
+            self._loading[roomid] = asyncio.create_task(self._fetch(bot, roomid))
+        return self._loading[roomid]
+
+    async def _fetch(self, bot: client.Wcf, roomid: str) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            members = await loop.run_in_executor(None, bot.get_chatroom_members, roomid)
+            self._members[roomid] = members
+        except Exception as error:  # 获取失败时继续使用旧的昵称
+            logger.error(f"[昵称目录]获取群 {roomid} 的昵称失败: {error}")
+            members = self._members.setdefault(roomid, {})
+        finally:
+            self._loaded_at[roomid] = time.monotonic()  # 失败也更新时间，避免反复请求
+            del self._loading[roomid]
+
+        return members
+
+
+# 实例化昵称目录
+nickname_directory = NicknameDirectory()
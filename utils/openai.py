@@ -1,6 +1,6 @@
-from openai import AsyncOpenAI,AsyncAzureOpenAI
 import config.config as CONFIG
-from utils.database import BotDatabase
+from utils.database import AsyncBotDatabase, BotDatabase
+from utils.llm_clients import llm_clients
 from typing import Dict
 import yaml
 import base64
@@ -13,10 +13,12 @@ import json
 _openai_provider = CONFIG.OPENAI_PROVIDER
 _model = CONFIG.GPT_VERSION
 _max_dialogue_tokens = CONFIG.MAX_DIALOGUE_TOKENS
+_max_tool_iterations = getattr(CONFIG, "MAX_TOOL_ITERATIONS", 3)  # 一次回复中最多调用几轮工具
 def update_config(provider, model):
     global _openai_provider, _model
     _openai_provider = provider
     _model = model
+    llm_clients.reset()  # 之后的请求使用新建的客户端
     file_path = 'config/config.py'
     CONFIG.OPENAI_PROVIDER=provider
     CONFIG.GPT_VERSION=model
@@ -30,105 +32,86 @@ def update_config(provider, model):
     with open(file_path, 'w') as file:    
         file.writelines(lines)
 
-async def compose_gpt_dialogue_request_content(wxid: str, new_message: str) -> list:
-    db = BotDatabase()
-    json_data = db.get_private_gpt_data(wxid)  # 从数据库获得到之前的对话
-    request_content = []
-    if not json_data or "data" not in json_data.keys():  # 如果没有对话数据，则初始化
-        init_data = {"data": []}
-        json_data = init_data
-        request_content = [{"role": "system", "content": "Please try to keep your response concise, in 75 words or less"}]
-
-    previous_dialogue = json_data['data']  # 获取指定轮数的对话，乘-2是因为一轮对话包含了1个请求和1个答复
-    token_count= count_tokens(previous_dialogue)
+async def compose_gpt_dialogue_request_content(wxid: str, new_message: str) -> (list, int):
+    """
+    构成对话请求内容。Compose the dialogue request content.
+    :return: (list, int) - 请求内容，以及其中已经保存过的消息数。The request content and how many of its messages are already stored.
+    """
+    db = AsyncBotDatabase()
+    token_count = await db.get_dialogue_tokens(wxid)  # 数据库直接求和，不读取对话
     if token_count > _max_dialogue_tokens:  # 如果对话token数超过限制，则进行对话总结
         logger.info("Token count exceeds the limit, summarizing the conversation")
-        summary = await summarise(previous_dialogue)
-        request_content = [{"role": "system", "content": "Please try to keep your response concise, in 75 words or less"}]
-        request_content.append({"role": "assistant", "content": summary})
-        json_data = {"data": request_content}  # 构成保存需要的json数据
-        db=BotDatabase()
-        db.save_private_gpt_data(wxid, json_data)
+        summary = await summarise(await db.get_dialogue(wxid))
+        request_content = [{"role": "system", "content": "Please try to keep your response concise, in 75 words or less"},
+                           {"role": "assistant", "content": summary}]
+        await db.replace_dialogue(wxid, request_content, [count_message_tokens(message) for message in request_content])
     else:
-        request_content += previous_dialogue  # 将之前的对话加入到api请求内容中
+        request_content = await db.get_dialogue(wxid, max_tokens=_max_dialogue_tokens)  # 获取之前的对话
+        if not request_content:  # 如果没有对话数据，则初始化
+            request_content = [{"role": "system", "content": "Please try to keep your response concise, in 75 words or less"}]
+            await db.append_dialogue(wxid, request_content, [count_message_tokens(request_content[0])])
+    history_length = len(request_content)
 
     request_content.append({"role": "user", "content": new_message})  # 将用户新的问题加入api请求内容
 
-    return request_content
-    
+    return request_content, history_length
+
 async def chatgpt(wxid: str, message: str):  # 这个函数请求了openai的api
-    request_content = [] 
-    if _openai_provider == "azure" :
-        client = AsyncAzureOpenAI(
-            api_key=CONFIG.OPENAI_API_KEY,
-            azure_endpoint=CONFIG.OPENAI_API_BASE,
-            api_version="2024-07-01-preview",
-        )
-    elif _openai_provider == "workers":
-        client = AsyncOpenAI(
-            api_key= CONFIG.CLOUDFLARE_API_KEY,
-            base_url= f"https://api.cloudflare.com/client/v4/accounts/{CONFIG.CLOUDFLARE_ACCOUNT_ID}/ai/v1"
-        )
-    else :
-        client = AsyncOpenAI(api_key=CONFIG.DEEPSEEK_API_KEY, base_url=CONFIG.DEEPSEEK_API_BASE)
+    client = llm_clients.get_provider_client(_openai_provider)  # 复用连接池
     try:
-        if _openai_provider == "azure":
-            response = await client.chat.completions.create(
+        request_content, history_length = await compose_gpt_dialogue_request_content(wxid, message)
+        tools = get_tools_request_kwargs()
+        final_tools = get_tools_request_kwargs(final=True)
+        for iteration in range(_max_tool_iterations + 1):  # 只有模型要求调用工具时才再请求一次
+            chat_completion = await client.chat.completions.create(
+                messages=request_content,
                 model=_model,
-                messages=[{"role":"user","content":message}],
-                tools=openai_function_manager.get_functions_specs('azure'),
-                tool_choice="auto",
-            )
-            # logger.info(f"send request with tool:{openai_function_manager.get_functions_specs('azure')}")
-            # Process the model's response
-            response_message = response.choices[0].message
-            request_content = await compose_gpt_dialogue_request_content(wxid, message)
-            # Handle function calls
-            if response_message.tool_calls:
-                for tool_call in response_message.tool_calls:
-                    if tool_call.function.name :
-                        function_args = tool_call.function.arguments
-                        function_response = await openai_function_manager.call_function(tool_call.function.name, function_args)
-                        # logger.info(f"get function {tool_call.function.name} response message:{function_response}")
-                        request_content = add_function_call_to_request(request_content=request_content, 
-                            function_name=tool_call.function.name,content=function_response,tool_call_id=tool_call.id,arguments=function_args)
-        elif _openai_provider == "openai":
-            response = await client.chat.completions.create(
-                model=_model,
-                messages=[{"role":"user","content":message}],
-                functions=openai_function_manager.get_functions_specs(),
-                function_call="auto",
-            )
-            # Process the model's response
-            response_message = response.choices[0].message
-            request_content = await compose_gpt_dialogue_request_content(wxid, message)
-            # Handle function calls
-            if response_message.function_call:
-                for tool_call in response_message.function_call:
-                    if tool_call.name:
-                        function_args = tool_call.arguments
-                        function_response = await openai_function_manager.call_function(tool_call.name, function_args)
-                        # logger.info(f"get web response:{web_response}")
-                        request_content = add_function_call_to_request(request_content=request_content, 
-                            function_name=tool_call.name,content=function_response,arguments=function_args)
-        else:
-            request_content = await compose_gpt_dialogue_request_content(wxid, message)
-        logger.info(f"final requests:{request_content}")
-        chat_completion = await client.chat.completions.create(
-            messages=request_content,
-            model=_model,
-            temperature=CONFIG.TEMPERATURE,
-            max_tokens=CONFIG.MAX_TOKENS,
-            timeout=30.0,
-            stream=False
-        )  # 调用openai api
+                temperature=CONFIG.TEMPERATURE,
+                max_tokens=CONFIG.MAX_TOKENS,
+                timeout=30.0,
+                stream=False,
+                **(tools if iteration < _max_tool_iterations else final_tools),  # 最后一轮仍提供工具但禁止调用，让模型直接回答
+            )  # 调用openai api
+            response_message = chat_completion.choices[0].message
+            if _openai_provider == "azure" and response_message.tool_calls:
+                request_content.append({"role": "assistant", "content": response_message.content or "",
+                                        "tool_calls": [tool_call.model_dump() for tool_call in response_message.tool_calls]})
+                function_responses = await openai_function_manager.call_functions(
+                    [(tool_call.function.name, tool_call.function.arguments) for tool_call in response_message.tool_calls])  # 并发调用
+                for tool_call, function_response in zip(response_message.tool_calls, function_responses):
+                    request_content = add_function_call_to_request(request_content=request_content,
+                        function_name=tool_call.function.name, content=function_response, tool_call_id=tool_call.id)
+            elif _openai_provider == "openai" and response_message.function_call:
+                function_call = response_message.function_call
+                request_content.append({"role": "assistant", "content": response_message.content or "",
+                                        "function_call": function_call.model_dump()})
+                function_response, = await openai_function_manager.call_functions([(function_call.name, function_call.arguments)])
+                request_content = add_function_call_to_request(request_content=request_content,
+                    function_name=function_call.name, content=function_response)
+            else:
+                break
         logger.info(f"final response:{chat_completion.choices[0]}")
-        save_gpt_dialogue_request_content(wxid, request_content,
-                                            chat_completion.choices[0].message.content)  # 保存对话请求与回答内容
+        await save_gpt_dialogue_request_content(wxid, request_content[history_length:history_length + 1],
+                                                chat_completion.choices[0].message.content)  # 只保存用户问题与回答，工具调用的中间消息不进入历史
         return True, chat_completion.choices[0].message.content  # 返回对话回答内容
     except Exception as error:
         return False, error
 
+def get_tools_request_kwargs(final: bool = False) -> dict:
+    """
+    获取请求中提供工具的参数，不支持工具的服务商或没有工具时为空。
+    Get the request arguments offering tools; empty for providers without tool support or when there are no tools.
+    :param final: 最后一轮，工具仍然提供(请求中已有工具调用消息，部分服务商要求同时提供工具)，但禁止调用。The last round: tools are still sent, since some backends reject tool messages without them, but calling them is disabled.
+    """
+    choice = "none" if final else "auto"
+    if _openai_provider == "azure":
+        specs = openai_function_manager.get_functions_specs('azure')
+        return {"tools": specs, "tool_choice": choice} if specs else {}
+    elif _openai_provider == "openai":
+        specs = openai_function_manager.get_functions_specs()
+        return {"functions": specs, "function_call": choice} if specs else {}
+    return {}
+
 async def chatgpt_img(wxid:str, image_path: str, message: str = "Describe this picture:"):
     # Function to encode a local image into data URL 
     # Guess the MIME type of the image based on the file extension
@@ -142,47 +125,40 @@ async def chatgpt_img(wxid:str, image_path: str, message: str = "Describe this p
     # Construct the data URL
     # return f"data:{mime_type};base64,{base64_encoded_data}"
 
-    request_content = await compose_gpt_dialogue_request_content(wxid, message)  # 构成对话请求内容，返回一个包含之前对话的列表
+    request_content, history_length = await compose_gpt_dialogue_request_content(wxid, message)  # 构成对话请求内容，返回一个包含之前对话的列表
     request_content.append({"type": "image_url","image_url": {"url": "data:image/jpeg;base64,{base64_encoded_data}"}})
 
     if _openai_provider == "azure" :
-        client = AsyncAzureOpenAI(
-            api_key=CONFIG.OPENAI_API_KEY,
-            azure_endpoint=CONFIG.OPENAI_API_BASE,
-            api_version="2024-07-01-preview",
-        )
+        client = llm_clients.get_provider_client("azure")  # 复用连接池
     else:
-        client = AsyncOpenAI(api_key=CONFIG.OPENAI_API_KEY, base_url=CONFIG.OPENAI_API_BASE)
+        client = llm_clients.get_client("openai", CONFIG.OPENAI_API_KEY, CONFIG.OPENAI_API_BASE)
     try:
-        chat_completion = client.chat.completions.create(
+        chat_completion = await client.chat.completions.create(
             messages=request_content,
             model=CONFIG.GPT_VISION_VERSION,
             temperature=CONFIG.TEMPERATURE,
             max_tokens=CONFIG.MAX_TOKENS,
         )  # 调用openai api
 
-        save_gpt_dialogue_request_content(wxid, request_content,
-                                                chat_completion.choices[0].message.content)  # 保存对话请求与回答内容
+        await save_gpt_dialogue_request_content(wxid, request_content[history_length:],
+                                                chat_completion.choices[0].message.content)  # 保存新的对话请求与回答内容
         return True, chat_completion.choices[0].message.content  # 返回对话回答内容
     except Exception as error:
         return False, error
 
-def save_gpt_dialogue_request_content(wxid: str, request_content: list, gpt_response: str) -> None:
-    request_content = [msg for msg in request_content if isinstance(msg, dict) ]
-    # logger.debug(f"save request:{str(request_content)};\nresponse:{gpt_response}")
-    request_content.append({"role": "assistant", "content": gpt_response})  # 将gpt回答加入到api请求内容
-    # request_content = request_content[CONFIG.DIALOGUE_COUNT * -2:]  # 将列表切片以符合指定的对话轮数，乘-2是因为一轮对话包含了1个请求和1个答复
+async def save_gpt_dialogue_request_content(wxid: str, new_messages: list, gpt_response: str) -> None:
+    new_messages = [msg for msg in new_messages if isinstance(msg, dict) and "role" in msg]
+    new_messages.append({"role": "assistant", "content": gpt_response})  # 将gpt回答加入到新消息
 
-    json_data = {"data": request_content}  # 构成保存需要的json数据
-    db=BotDatabase()
-    db.save_private_gpt_data(wxid, json_data)  # 保存到数据库中
+    db = AsyncBotDatabase()
+    await db.append_dialogue(wxid, new_messages, [count_message_tokens(message) for message in new_messages])  # 只追加新消息
 
-def add_function_call_to_request(request_content, function_name, content,tool_call_id=None,arguments=None):
+def add_function_call_to_request(request_content, function_name, content,tool_call_id=None):
     """
-    Adds a function call to the request
+    Adds the result of a function call to the request.
+    The assistant message requesting the call must already be in the request.
     """
     if _openai_provider == "azure":
-        request_content.append({"role": "assistant", 'tool_calls': [{'id': tool_call_id, 'function': {'arguments': arguments, 'name':  function_name}, 'type': 'function'}]})
         request_content.append({
             "tool_call_id": tool_call_id,
             "role": "tool",
@@ -216,19 +192,7 @@ async def summarise(conversation) -> str:
     messages = [
         {"role": "system", "content": "Summarize this conversation in 700 characters or less"}
     ] + conversation
-    if _openai_provider == "azure" :
-        client = AsyncAzureOpenAI(
-            api_key=CONFIG.OPENAI_API_KEY,
-            azure_endpoint=CONFIG.OPENAI_API_BASE,
-            api_version="2024-07-01-preview",
-        )
-    elif _openai_provider == "workers":
-        client = AsyncOpenAI(
-            api_key= CONFIG.CLOUDFLARE_API_KEY,
-            base_url= f"https://api.cloudflare.com/client/v4/accounts/{CONFIG.CLOUDFLARE_ACCOUNT_ID}/ai/v1"
-        )
-    else :
-        client = AsyncOpenAI(api_key=CONFIG.DEEPSEEK_API_KEY, base_url=CONFIG.DEEPSEEK_API_BASE)
+    client = llm_clients.get_provider_client(_openai_provider)  # 复用连接池
     response = await client.chat.completions.create(
         model=_model,
         messages=messages,
@@ -275,6 +239,13 @@ def count_tokens(messages) -> int:
                     num_tokens += tokens_per_name
     num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
     return num_tokens
+
+
+def count_message_tokens(message: dict) -> int:
+    """
+    Counts the tokens of a single stored message.
+    """
+    return count_tokens([message]) - 3
 def clear_dialogue(wxid):  # 清除对话记录
-    db=BotDatabase()
-    db.save_private_gpt_data(wxid, {"data": []})
\ No newline at end of file
+    db = BotDatabase()
+    db.clear_dialogue(wxid)
\ No newline at end of file
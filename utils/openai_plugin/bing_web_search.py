@@ -1,7 +1,9 @@
 import config.config as CONFIG
 from itertools import islice
 from typing import Dict
-import requests
+import yaml
+from .cache import TTLCache
+from .http_session import http_session
 from .plugin import Plugin
 from loguru import logger as logging
 
@@ -11,6 +13,9 @@ class BINGWebSearchPlugin(Plugin):
     """
     def __init__(self):
         self.subscription_key = CONFIG.BING_API_KEY
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+        self.cache = TTLCache(main_config.get("web_search_cache_ttl", 1800))  # 搜索结果缓存
 
     def get_source_name(self) -> str:
         return "Bing"
@@ -32,21 +37,25 @@ class BINGWebSearchPlugin(Plugin):
         }]
 
     async def execute(self, function_name, **kwargs) -> Dict:
+        query = " ".join(str(kwargs['query']).split())
+        key = query.lower()  # 忽略大小写和多余的空格
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
         endpoint = "https://api.bing.microsoft.com" + "/v7.0/search"
         # Construct a request
         mkt = 'zh-CN'
-        params = { 'q': kwargs['query'], 'mkt': mkt }
+        params = { 'q': query, 'mkt': mkt }
         headers = { 'Ocp-Apim-Subscription-Key': self.subscription_key }
-        results = ''
         # Call the API
         try:
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-            results = response.json()
+            response = await http_session.get_json(endpoint, headers=headers, params=params)
         except Exception as ex:
             logging.error(ex)
-        results = results['webPages']['value'][:2]
-        if results is None or len(results) == 0:
+            return {"Result": "No good Bing Search Result was found"}
+        results = response.get('webPages', {}).get('value', [])[:2]
+        if len(results) == 0:
             return {"Result": "No good Bing Search Result was found"}
 
         def to_metadata(result: Dict) -> Dict[str, str]:
@@ -56,7 +65,9 @@ class BINGWebSearchPlugin(Plugin):
             }
         logging.info({"result": [to_metadata(result) for result in results]})    
         # return {"Result": "No good Bing Search Result was found"}
-        return {"result": [to_metadata(result) for result in results]}
+        result = {"result": [to_metadata(result) for result in results]}
+        self.cache.set(key, result)
+        return result
 
 # def bing_search(query):
 #     subscription_key = os.environ['BING_API_KEY']
@@ -0,0 +1,40 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    带过期时间的结果缓存，超过最大数量时淘汰最久没有使用的结果。
+    Result cache with a time to live; evicts the least recently used result once it is full.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl  # 结果的有效时间(秒)，0为不缓存
+        self.maxsize = maxsize  # 最多缓存的结果数
+
+        self._items = OrderedDict()  # 键 -> (过期时间, 结果)
+
+    def get(self, key):
+        """
+        获取未过期的结果。Get a result that has not expired.
+        :return: 结果，不存在或已过期时为None。The result, None if missing or expired.
+        """
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value) -> None:
+        """
+        保存结果。Store a result.
+        """
+        if self.ttl <= 0:
+            return
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import yaml
+from loguru import logger
+
+from utils.singleton import singleton
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}  # 可以重试的状态码
+
+
+@singleton
+class HttpSession:
+    """
+    GPT工具共用的异步HTTP会话。所有工具共享一个连接池，请求有超时，网络错误和临时性的错误状态会按指数退避重试。
+    Shared async HTTP session for GPT tools. Every tool shares one connection pool; requests have timeouts, and network errors or transient error statuses are retried with exponential backoff.
+    """
+
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+
+        self.timeout = main_config.get("openai_function_http_timeout", 10)  # 请求超时时间(秒)
+        self.retries = main_config.get("openai_function_http_retries", 2)  # 失败重试次数
+        self.retry_backoff = main_config.get("openai_function_http_retry_backoff", 0.5)  # 第一次重试前等待的秒数，之后每次翻倍
+        self.max_connections = main_config.get("openai_function_http_max_connections", 20)  # 最大连接数
+
+        self._client = None
+
+    async def get_json(self, url: str, params: dict = None, headers: dict = None):
+        """
+        发送GET请求并解析JSON，失败时重试。Send a GET request and parse the JSON, retrying on failure.
+        :param url: 请求地址。The url.
+        :param params: 查询参数。The query parameters.
+        :param headers: 请求头。The request headers.
+        :return: 解析后的JSON。The parsed JSON.
+        :raises httpx.HTTPError: 重试后仍然失败。Still failing after the retries.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._get_client().get(url, params=params, headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"状态码 {response.status_code}"
+            except httpx.TransportError as exception:  # 连接失败、超时等
+                if attempt == self.retries:
+                    raise
+                error = exception
+
+            delay = self.retry_backoff * 2 ** attempt
+            logger.warning(f"[GPT工具]请求 {url} 失败: {error}，{delay} 秒后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        """
+        关闭连接池。Close the connection pool.
+        """
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:  # 第一次请求时在事件循环中创建
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=self.timeout,
+            )
+        return self._client
+
+
+# 实例化GPT工具的HTTP会话
+http_session = HttpSession()
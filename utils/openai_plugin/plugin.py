@@ -7,6 +7,8 @@ class Plugin(ABC):
     A plugin interface which can be used to create plugins for the ChatGPT API.
     """
 
+    timeout = None  # 这个插件的工具调用超时时间(秒)，None时使用openai_function_timeout
+
     @abstractmethod
     def get_source_name(self) -> str:
         """
@@ -1,8 +1,10 @@
 from datetime import datetime
 from typing import Dict
 
-import requests
+import yaml
 
+from .cache import TTLCache
+from .http_session import http_session
 from .plugin import Plugin
 
 
@@ -11,6 +13,11 @@ class WeatherPlugin(Plugin):
     A plugin to get the current weather and 7-day daily forecast for a location
     """
 
+    def __init__(self):
+        with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
+            main_config = yaml.safe_load(f.read())
+        self.cache = TTLCache(main_config.get("weather_cache_ttl", 600))  # 天气结果缓存
+
     def get_source_name(self) -> str:
         return "OpenMeteo"
 
@@ -58,19 +65,32 @@ class WeatherPlugin(Plugin):
         ]
 
     async def execute(self, function_name, **kwargs) -> Dict:
-        url = 'https://api.open-meteo.com/v1/forecast' \
-              f'?latitude={kwargs["latitude"]}' \
-              f'&longitude={kwargs["longitude"]}' \
-              f'&temperature_unit={kwargs["unit"]}'
+        # 坐标保留两位小数(约1公里)，附近的位置共用缓存
+        latitude = round(float(kwargs["latitude"]), 2)
+        longitude = round(float(kwargs["longitude"]), 2)
+        unit = str(kwargs["unit"]).lower()
+        params = {"latitude": latitude, "longitude": longitude, "temperature_unit": unit}
         if function_name == 'get_current_weather':
-            url += '&current_weather=true'
-            return requests.get(url).json()
+            key = (function_name, latitude, longitude, unit)
+            result = self.cache.get(key)
+            if result is None:
+                params["current_weather"] = "true"
+                result = await http_session.get_json('https://api.open-meteo.com/v1/forecast', params=params)
+                self.cache.set(key, result)
+            return result
 
         elif function_name == 'get_forecast_weather':
-            url += '&daily=weathercode,temperature_2m_max,temperature_2m_min,precipitation_probability_mean,'
-            url += f'&forecast_days={kwargs["forecast_days"]}'
-            url += '&timezone=auto'
-            response = requests.get(url).json()
+            today = datetime.today().strftime("%A, %B %d, %Y")
+            forecast_days = int(kwargs["forecast_days"])
+            key = (function_name, latitude, longitude, unit, forecast_days, today)  # 跨天后重新获取
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+
+            params["daily"] = "weathercode,temperature_2m_max,temperature_2m_min,precipitation_probability_mean"
+            params["forecast_days"] = forecast_days
+            params["timezone"] = "auto"
+            response = await http_session.get_json('https://api.open-meteo.com/v1/forecast', params=params)
             results = {}
             for i, time in enumerate(response["daily"]["time"]):
                 results[datetime.strptime(time, "%Y-%m-%d").strftime("%A, %B %d, %Y")] = {
@@ -79,4 +99,6 @@ class WeatherPlugin(Plugin):
                     "temperature_2m_min": response["daily"]["temperature_2m_min"][i],
                     "precipitation_probability_mean": response["daily"]["precipitation_probability_mean"][i]
                 }
-            return {"today": datetime.today().strftime("%A, %B %d, %Y"), "forecast": results}
+            result = {"today": today, "forecast": results}
+            self.cache.set(key, result)
+            return result
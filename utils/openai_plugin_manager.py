@@ -1,5 +1,9 @@
+import asyncio
 import json
+from datetime import date
+
 import yaml
+from loguru import logger
 # from openai_plugin.gtts_text_to_speech import GTTSTextToSpeech
 # from openai_plugin.auto_tts import AutoTextToSpeech
 # from openai_plugin.dice import DicePlugin
@@ -24,9 +28,24 @@ class OpenAIPluginManager:
     """
 
     def __init__(self):
+        self.plugins = []
+        self.function_timeout = 15
+        self.function_timeouts = {}  # 函数名 -> 单独设置的超时时间
+        self._plugin_by_function = {}  # 函数名 -> 插件
+        self._specs = {}  # 服务商 -> 函数说明列表
+        self._specs_date = None  # 生成函数说明的日期，说明中可能带有日期
+        self.reload()
+
+    def reload(self):
+        """
+        重新读取设置并加载插件，同时重建函数名索引和函数说明。
+        Re-read the config and load the plugins, rebuilding the function name index and the function specs.
+        """
         with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
             config = yaml.safe_load(f.read())
         enabled_plugins = config["openai_functions"]
+        self.function_timeout = config.get("openai_function_timeout", 15)  # 单个工具调用的默认超时时间(秒)
+        self.function_timeouts = config.get("openai_function_timeouts") or {}  # 单独设置的工具超时时间
         plugin_mapping = {
             # 'wolfram': WolframAlphaPlugin,
             'weather': WeatherPlugin,
@@ -46,15 +65,15 @@ class OpenAIPluginManager:
             'bing_web_search': BINGWebSearchPlugin,
         }
         self.plugins = [plugin_mapping[plugin]() for plugin in enabled_plugins if plugin in plugin_mapping]
+        self._build_index()
 
     def get_functions_specs(self,provider='openai'):
         """
         Return the list of function specs that can be called by the model
         """
-        if provider=='azure':
-            return [{"type":"function","function": spec} for specs in map(lambda plugin: plugin.get_spec(), self.plugins) for spec in specs]
-        else:
-            return [spec for specs in map(lambda plugin: plugin.get_spec(), self.plugins) for spec in specs]
+        if self._specs_date != date.today():  # 跨天后重新生成，说明中的日期才是今天
+            self._build_index()
+        return self._specs['azure' if provider == 'azure' else 'openai']
 
     async def call_function(self, function_name, arguments):
         """
@@ -65,6 +84,38 @@ class OpenAIPluginManager:
             return json.dumps({'error': f'Function {function_name} not found'})
         return json.dumps(await plugin.execute(function_name, **json.loads(arguments)), default=str)
 
+    async def call_functions(self, calls: list) -> list:
+        """
+        并发调用多个工具，每个工具有各自的超时，结果按原来的顺序返回。超时或出错的工具返回错误信息，不影响其他工具。
+        Call several functions concurrently, each with its own timeout, and return the results in the original order. A function that times out or fails returns an error instead of affecting the others.
+        :param calls: (函数名, 参数JSON)的列表。A list of (function name, JSON arguments).
+        :return: list - 每个调用的JSON结果。The JSON result of each call.
+        """
+        return list(await asyncio.gather(*(self._call_function_safely(name, arguments) for name, arguments in calls)))
+
+    def get_function_timeout(self, function_name) -> float:
+        """
+        获取工具的超时时间：设置中单独设置的，其次是插件自己的，最后是默认的。0或空代表不限制。
+        Get the timeout of a function: the per-function config first, then the plugin's own, then the default. 0 or empty means no limit.
+        """
+        if function_name in self.function_timeouts:
+            return self.function_timeouts[function_name] or None
+        plugin = self.__get_plugin_by_function_name(function_name)
+        if plugin is not None and plugin.timeout is not None:
+            return plugin.timeout or None
+        return self.function_timeout or None
+
+    async def _call_function_safely(self, function_name, arguments) -> str:
+        timeout = self.get_function_timeout(function_name)
+        try:
+            return await asyncio.wait_for(self.call_function(function_name, arguments), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[GPT工具]{function_name} 超过 {timeout} 秒未返回")
+            return json.dumps({'error': f'Function {function_name} timed out'})
+        except Exception as error:
+            logger.error(f"[GPT工具]{function_name} 调用失败: {error}")
+            return json.dumps({'error': f'Function {function_name} failed: {error}'})
+
     def get_plugin_source_name(self, function_name) -> str:
         """
         Return the source name of the plugin
@@ -75,7 +126,17 @@ class OpenAIPluginManager:
         return plugin.get_source_name()
 
     def __get_plugin_by_function_name(self, function_name):
-        return next((plugin for plugin in self.plugins
-                    if function_name in map(lambda spec: spec.get('name'), plugin.get_spec())), None)
+        return self._plugin_by_function.get(function_name)
+
+    def _build_index(self):  # 只在加载插件和跨天时调用get_spec
+        plugin_by_function = {}
+        specs = []
+        for plugin in self.plugins:
+            for spec in plugin.get_spec():
+                plugin_by_function[spec.get('name')] = plugin
+                specs.append(spec)
+        self._plugin_by_function = plugin_by_function
+        self._specs = {'openai': specs, 'azure': [{"type": "function", "function": spec} for spec in specs]}
+        self._specs_date = date.today()
 
 plugin_manager = OpenAIPluginManager()
\ No newline at end of file
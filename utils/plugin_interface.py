@@ -1,3 +1,16 @@
 class PluginInterface:
+    # 声明式过滤条件，插件管理器据此建立索引，不符合条件的消息不会调用插件
+    chat_scope = "all"  # 聊天范围 可以是 all group private
+    enabled = True  # 是否启用，可在__init__中根据插件设置覆盖
+    trigger_prefixes = ()  # 消息以其中之一开头时调用
+    trigger_regex = None  # 消息匹配该正则时调用(re.search)
+
+    def has_active_session(self, roomid: str) -> bool:
+        """
+        该会话中是否有进行中的会话(如游戏)，有则无论触发条件如何都调用插件。
+        Whether the conversation has an active session (e.g. a game); if so the plugin is called regardless of its triggers.
+        """
+        return False
+
     def run(self, bot, recv):
         raise NotImplementedError("Subclasses must implement the 'run' method.")
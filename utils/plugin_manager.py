@@ -4,6 +4,7 @@
 
 import importlib
 import os
+import re
 import sys
 
 import yaml
@@ -18,6 +19,8 @@ class PluginManager:
     def __init__(self):
         self.plugins = {"command": {}, "link": {},"text": {}, "mention": {}, "image": {}, "voice": {}, "join_group": {}}
         self.keywords = {}
+        self.command_router = ({}, None, [])  # (字面关键词字典, 合并后的正则, 正则分组对应的插件名)
+        self.plugin_index = {}  # {插件类型: {"group"/"private": [(插件名, 插件, 触发前缀, 触发正则)]}}
 
         with open("main_config.yml", "r", encoding="utf-8") as f:  # 读取设置
             config = yaml.safe_load(f.read())
@@ -28,10 +31,10 @@ class PluginManager:
 
     def refresh_keywords(self):
         """
-        刷新关键词。Refresh the keywords.
+        刷新关键词，并重新构建指令路由。Refresh the keywords and rebuild the command router.
         :return: (bool, str) - 如果刷新成功，返回True和成功消息。如果刷新失败，返回False和失败原因 (bool, str) - True and a success message if the keywords were refreshed successfully, False and an error message otherwise.
         """
-        self.keywords.clear()
+        keywords = {}
         plugins_folder = "plugins/command"
 
         # 遍历文件夹中的所有文件
@@ -49,14 +52,122 @@ class PluginManager:
 
                     if plugin_name in self.plugins["command"].keys():
                         for keyword in keywords_list:
-                            self.keywords[keyword] = plugin_name
+                            keywords[keyword] = plugin_name
+
+        command_router = self._build_command_router(keywords)
+
+        # 一次性替换，处理消息时不会看到构建到一半的路由
+        self.keywords = keywords
+        self.command_router = command_router
 
         logger.info("已刷新指令关键词")
         return True, "成功"
 
+    @staticmethod
+    def _build_command_router(keywords: dict) -> tuple:
+        """
+        构建指令路由：所有关键词按声明顺序合并成一个带命名分组的正则，与逐个re.match的结果相同(前缀匹配，先声明的优先)。
+        字面关键词本身的匹配结果预先算好放入字典，最常见的情况只需要一次字典查找。
+        Build the command router: every keyword is combined, in declaration order, into one pattern with named groups, giving the same result as calling re.match on each keyword in turn (prefix match, first declared wins).
+        The result for each literal keyword itself is precomputed into a dict, so the common case is a single dict lookup.
+        :param keywords: 关键词到插件名的字典。A dict of keyword to plugin name.
+        :return: tuple - (字面关键词字典, 合并后的正则或None, 正则分组对应的插件名) (literal keyword dict, combined regex or None, plugin names of the regex groups)
+        """
+        alternatives = []
+        plugin_names = []
+
+        for keyword, plugin_name in keywords.items():
+            try:
+                re.compile(keyword)
+            except re.error as error:
+                logger.error(f"! 指令关键词 {keyword} 不是有效的正则：{error}")
+                continue
+
+            alternatives.append(f"(?P<_route{len(plugin_names)}>{keyword})")
+            plugin_names.append(plugin_name)
+
+        if not alternatives:
+            return {}, None, []
+
+        combined_regex = re.compile("|".join(alternatives))
+        exact_routes = {}
+        for keyword in keywords:
+            if re.escape(keyword) == keyword:  # 没有正则特殊字符，是字面关键词
+                matched = combined_regex.match(keyword)  # 先声明的关键词可能也匹配它
+                exact_routes[keyword] = plugin_names[int(matched.lastgroup[len("_route"):])]
+        return exact_routes, combined_regex, plugin_names
+
+    def match_command(self, keyword: str):
+        """
+        查找指令关键词对应的插件名。Find the plugin name for a command keyword.
+        :param keyword: 指令关键词。The command keyword.
+        :return: str or None - 插件名，如果没有匹配则返回None。The plugin name, or None if nothing matched.
+        """
+        exact_routes, combined_regex, plugin_names = self.command_router
+
+        plugin_name = exact_routes.get(keyword)
+        if plugin_name or not combined_regex:
+            return plugin_name
+
+        matched = combined_regex.match(keyword)  # 前缀匹配，比如"签到abc"也会匹配"签到"
+        if not matched:
+            return None
+        return plugin_names[int(matched.lastgroup[len("_route"):])]
+
     def get_keywords(self):
         return self.keywords
 
+    def refresh_plugin_index(self):
+        """
+        根据插件声明的过滤条件，为每种插件类型建立群聊/私聊索引。Build group/private indexes for every plugin type from the filters plugins declare.
+        """
+        plugin_index = {}
+        for plugin_type in self.all_plugin_types:
+            scopes = {"group": [], "private": []}
+            for plugin_name, plugin in self.plugins[plugin_type].items():
+                if not plugin.enabled:  # 未启用的插件不进入索引
+                    continue
+
+                prefixes = tuple(plugin.trigger_prefixes)
+                regex = plugin.trigger_regex
+                if isinstance(regex, str):
+                    try:
+                        regex = re.compile(regex)
+                    except re.error as error:
+                        logger.error(f"! 插件 {plugin_name} 的触发正则无效：{error}")
+                        regex = None
+
+                for scope, entries in scopes.items():
+                    if plugin.chat_scope in ("all", scope):
+                        entries.append((plugin_name, plugin, prefixes, regex))
+            plugin_index[plugin_type] = scopes
+
+        self.plugin_index = plugin_index  # 一次性替换
+
+    def get_candidate_plugins(self, plugin_type: str, recv) -> dict:
+        """
+        获取可能处理该消息的插件。Get the plugins that may handle the message.
+        :param plugin_type: 插件类型。The plugin type.
+        :param recv: 消息。The message.
+        :return: dict - 插件名到插件的字典。A dict of plugin name to plugin.
+        """
+        scopes = self.plugin_index.get(plugin_type)
+        if not scopes:
+            return {}
+
+        content = recv.content
+        candidates = {}
+        for plugin_name, plugin, prefixes, regex in scopes["group" if recv.from_group() else "private"]:
+            if not prefixes and regex is None:  # 没有声明触发条件，总是调用
+                candidates[plugin_name] = plugin
+            elif prefixes and content.startswith(prefixes):
+                candidates[plugin_name] = plugin
+            elif regex is not None and regex.search(content):
+                candidates[plugin_name] = plugin
+            elif plugin.has_active_session(recv.roomid):
+                candidates[plugin_name] = plugin
+        return candidates
+
     def load_plugin(self, plugin_name: str, no_refresh: bool = False, log: bool = True):
         """
         按插件名称加载插件。插件必须是PluginInterface的子类。
@@ -82,6 +193,7 @@ class PluginManager:
                         logger.info(f"+ 已加载插件：{plugin_name}")
                     if not no_refresh:
                         self.refresh_keywords()
+                        self.refresh_plugin_index()
                     return True, "成功"  # 如果插件加载成功则返回True
 
                 else:
@@ -118,6 +230,7 @@ class PluginManager:
                             logger.error(f"! 未加载插件：{plugin_name}，因为它不是PluginInterface的子类")
 
         self.refresh_keywords()
+        self.refresh_plugin_index()
         return True, "成功"
 
     def unload_plugin(self, plugin_name, no_refresh: bool = False):
@@ -134,6 +247,7 @@ class PluginManager:
                 logger.info(f"- 已卸载插件：{plugin_name}")
                 if not no_refresh:
                     self.refresh_keywords()
+                    self.refresh_plugin_index()
                 return True, "成功"  # 如果插件卸载成功则返回True
         logger.info(f"! 未找到插件：{plugin_name}，无法卸载")
         return False, f"未找到插件：{plugin_name}"  # 如果插件不存在则返回False
@@ -151,6 +265,7 @@ class PluginManager:
                     del sys.modules[f"plugins.{plugin_type}.{plugin_name}"]
                     logger.info(f"- 已卸载插件：{plugin_name}")
         self.refresh_keywords()
+        self.refresh_plugin_index()
         return True, "成功"
 
     def reload_plugin(self, plugin_name):
@@ -177,6 +292,7 @@ class PluginManager:
                     self.plugins[plugin_type][plugin_name] = plugin_instance  # 将插件实例存入插件字典
 
                     self.refresh_keywords()
+                    self.refresh_plugin_index()
                     logger.info(f"+ 已重载插件：{plugin_name}")
                     return True, "成功"
 
@@ -209,6 +325,7 @@ class PluginManager:
                         logger.info(f"+ 已重载插件：{plugin_name}")
                     else:
                         logger.error(f"! 未重载插件：{plugin_name}，因为它不是PluginInterface的子类")
+        self.refresh_plugin_index()
         return True, "成功"
 
 
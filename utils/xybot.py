@@ -8,9 +8,11 @@ import re
 
 import yaml
 from loguru import logger
-from wcferry import client, wxmsg
+from wcferry import client, wcf_pb2
 
-from utils.database import BotDatabase
+from utils.database import AsyncBotDatabase, BotDatabase
+from utils.message_sender import message_sender
+from utils.nickname_directory import nickname_directory
 from utils.plugin_manager import plugin_manager
 from wcferry_helper import XYBotWxMsg, async_download_image
 
@@ -33,18 +35,16 @@ class XYBot:
         logger.debug(f"语音保存路径: {self.voice_save_path}")
         logger.debug(f"图片保存路径: {self.image_save_path}")
 
-        self.self_wxid = bot.get_self_wxid()
+        self.plugin_timeout = main_config.get("plugin_timeout", 120)  # 插件默认超时时间(秒)
+        self.plugin_timeouts = main_config.get("plugin_timeouts") or {}  # 单独设置的插件超时时间
 
-    async def message_handler(self, bot: client.Wcf, recv: wxmsg.WxMsg) -> None:
-        recv = XYBotWxMsg(recv)
+        self.self_wxid = bot.get_self_wxid()
 
-        # 尝试设置用户的昵称
-        db = BotDatabase()
+    async def message_handler(self, bot: client.Wcf, recv: wcf_pb2.WxMsg) -> None:
+        recv = XYBotWxMsg(recv)  # 包装protobuf消息，不复制字段
 
-        nickname_latest = False
-        if not db.get_nickname(recv.sender):  # 如果数据库中没有这个用户的昵称，需要先获取昵称再运行插件
-            await self.attempt_set_nickname(bot, recv, db)
-            nickname_latest = True
+        # 更新用户的昵称，缓存命中且昵称没有变化时不会请求微信或写数据库
+        await nickname_directory.update(bot, recv)
 
         message_type = recv.type
         if message_type == 1:  # 是文本消息
@@ -62,27 +62,6 @@ class XYBot:
         else:  # 其他消息，type不存在或者还未知干啥用的
             logger.info(f"[其他消息] {recv}")
 
-        if not nickname_latest:
-            await self.attempt_set_nickname(bot, recv, db)
-
-    async def attempt_set_nickname(self, bot: client.Wcf, recv: XYBotWxMsg, db: BotDatabase) -> None:
-        if recv.from_group():  # 如果是群聊
-            nickname = bot.get_alias_in_chatroom(recv.sender, recv.roomid)
-            db.set_nickname(recv.sender, nickname)
-        else:  # 如果是私聊
-            flag = True
-            for user in bot.contacts:
-                if user["wxid"] == recv.sender:
-                    db.set_nickname(recv.sender, user["name"])
-                    flag = False
-                    break
-
-            if flag:  # 如果没有找到，重新获取一次最新的联系人列表
-                for user in bot.get_contacts():
-                    if user["wxid"] == recv.sender:
-                        db.set_nickname(recv.sender, user["name"])
-                        break
-
     async def text_message_handler(self, bot: client.Wcf, recv: XYBotWxMsg) -> None:
         logger.info(f"[收到文本消息]:{recv}")
 
@@ -91,31 +70,29 @@ class XYBot:
 
         # @机器人处理
         if self.self_wxid in recv.ats:  # 机器人被@，调用所有mention插件
-            for plugin in plugin_manager.plugins["mention"].values():
-                await asyncio.create_task(plugin.run(bot, recv))
+            await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("mention", recv))
             return
 
         # 指令处理
         if recv.content.startswith(self.command_prefix) or self.command_prefix == "":
-            if self.command_prefix != "":  # 特殊处理，万一用户想要使用空前缀
-                recv.content = recv.content[1:]  # 去除命令前缀
-
-            recv_keyword = recv.content.split(" |\u2005")[0]  # 获取命令关键词
-            for keyword in plugin_manager.get_keywords().keys():  # 遍历所有关键词
-                if re.match(keyword, recv_keyword):  # 如果正则匹配到了，执行插件run函数
-                    plugin_func = plugin_manager.keywords[keyword]
-                    await asyncio.create_task(plugin_manager.plugins["command"][plugin_func].run(bot, recv))
-                    return
+            command = recv.parse_command(self.command_prefix)  # 去除命令前缀并拆分，所有插件共用
+            if self.command_prefix != "":  # 与以前一样去除content的前缀，仍读取content的插件不受影响
+                recv.content = recv.content[len(self.command_prefix):]
+
+            plugin_func = plugin_manager.match_command(command.keyword)  # 一次查找路由
+            plugin = plugin_manager.plugins["command"].get(plugin_func) if plugin_func else None
+            if plugin:  # 如果匹配到了，执行插件run函数
+                await self.run_plugin(bot, recv, plugin_func, plugin)
+                return
 
             if recv.from_group() and self.command_prefix != "":  # 不是指令但在群里 且设置了指令前缀
                 out_message = "该指令不存在！⚠️"
                 logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-                bot.send_text(out_message, recv.roomid)
+                await message_sender.send_text(bot, out_message, recv.roomid)
                 return  # 执行完后直接返回
 
         # 普通消息处理
-        for plugin in plugin_manager.plugins["text"].values():
-            await asyncio.create_task(plugin.run(bot, recv))
+        await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("text", recv))
 
     async def image_message_handler(self, bot: client.Wcf, recv: XYBotWxMsg) -> None:
         logger.info(f"[收到图片消息]{recv}")
@@ -128,8 +105,7 @@ class XYBot:
         recv.image = os.path.abspath(path)  # 确保图片为绝对路径
 
         # image插件调用
-        for plugin in plugin_manager.plugins["image"].values():
-            await asyncio.create_task(plugin.run(bot, recv))
+        await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("image", recv))
 
     async def voice_message_handler(self, bot: client.Wcf, recv: XYBotWxMsg) -> None:
         logger.info(f"[收到语音消息]{recv}")
@@ -141,8 +117,7 @@ class XYBot:
         recv.voice = os.path.abspath(path)  # 确保语音为绝对路径
 
         # voice插件调用
-        for plugin in plugin_manager.plugins["voice"].values():
-            await asyncio.create_task(plugin.run(bot, recv))
+        await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("voice", recv))
 
     async def system_message_handler(self, bot: client.Wcf, recv: XYBotWxMsg) -> None:
         logger.info(f"[收到系统消息]{recv}")
@@ -157,8 +132,7 @@ class XYBot:
             result = result[0] if result else None
             if result:
                 recv.join_group = result
-                for plugin in plugin_manager.plugins["join_group"].values():
-                    await asyncio.create_task(plugin.run(bot, recv))
+                await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("join_group", recv))
                 return
     async def link_message_handler(self, bot: client.Wcf, recv: XYBotWxMsg) -> None:
         logger.info(f"[收到链接消息]:{recv}")
@@ -167,12 +141,32 @@ class XYBot:
             return
 
         # 指令处理
-        for plugin in plugin_manager.plugins["link"].values():
-            await asyncio.create_task(plugin.run(bot, recv))
+        await self.run_plugins(bot, recv, plugin_manager.get_candidate_plugins("link", recv))
 
     async def emoji_message_handler(self, recv) -> None:
         logger.info(f"[收到表情消息]{recv}")
 
+    async def run_plugins(self, bot: client.Wcf, recv: XYBotWxMsg, plugins: dict) -> None:
+        """
+        并发运行多个插件，某个插件出错或超时不会影响其他插件。
+        Run several plugins concurrently; a plugin failing or timing out does not affect the others.
+        :param plugins: 插件名到插件的字典。A dict of plugin name to plugin.
+        """
+        await asyncio.gather(*(self.run_plugin(bot, recv, plugin_name, plugin)
+                               for plugin_name, plugin in list(plugins.items())))
+
+    async def run_plugin(self, bot: client.Wcf, recv: XYBotWxMsg, plugin_name: str, plugin) -> None:
+        """
+        在超时时间内运行单个插件，并记录错误。Run a single plugin within its timeout and log any error.
+        """
+        timeout = self.plugin_timeouts.get(plugin_name, self.plugin_timeout) or None  # 0或空代表不限制
+        try:
+            await asyncio.wait_for(plugin.run(bot, recv), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[插件超时]{plugin_name} 超过 {timeout} 秒未完成，已取消")
+        except Exception as error:
+            logger.exception(f"[插件出错]{plugin_name}: {error}")
+
     def ignorance_check(self, recv: XYBotWxMsg) -> bool:
         if self.ignorance_mode == 'none':  # 如果不设置屏蔽，则直接返回通过
             return True
@@ -193,16 +187,14 @@ class XYBot:
             logger.error("未知的屏蔽模式！请检查白名单/黑名单设置！")
 async def send_friend_or_group(db: BotDatabase, bot: client.Wcf, recv: XYBotWxMsg, out_message="null"):
     if recv.from_group():  # 判断是群还是私聊
-        out_message = f"@{db.get_nickname(recv.sender)}：{out_message}"
+        nickname = await AsyncBotDatabase().get_nickname(recv.sender)  # 不阻塞事件循环
+        out_message = f"@{nickname}：{out_message}"
         logger.info(f'[发送@信息]{out_message}| [发送到] {recv.roomid}')
-        # bot.send_text(out_message, recv.roomid, recv.sender)  # 发送@信息
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, bot.send_text, out_message, recv.roomid, recv.sender)
+        await message_sender.send_text(bot, out_message, recv.roomid, recv.sender)  # 发送@信息
     else:
         logger.info(f'[发送信息]{out_message}| [发送到] {recv.roomid}')
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, bot.send_text, out_message, recv.roomid)
+        await message_sender.send_text(bot, out_message, recv.roomid)
+
 
 async def send_friend_or_group_image(bot: client.Wcf, recv: XYBotWxMsg, image_path: str):
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, bot.send_image, image_path, recv.roomid)
\ No newline at end of file
+    await message_sender.send_image(bot, image_path, recv.roomid)
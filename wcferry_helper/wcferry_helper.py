@@ -3,13 +3,15 @@
 #  This program is licensed under the GNU General Public License v3.0.
 
 import asyncio
+import re
 import subprocess
 import time
 from os import path
 from platform import system
+from typing import NamedTuple
 
 import xmltodict
-from wcferry import wxmsg, client
+from wcferry import wxmsg, client, wcf_pb2
 
 
 def inject(port: int = 5555, debug: bool = False, local: bool = True):
@@ -70,33 +72,160 @@ def wxmsg_to_dict(message: wxmsg.WxMsg) -> dict:
     return dictionary
 
 
+_AT_USER_LIST_PATTERN = re.compile(r"<atuserlist>(?:<!\[CDATA\[)?(.*?)(?:]]>)?</atuserlist>", re.S)
+
+
+def extract_at_user_list(xml: str) -> list:
+    """
+    Extract the @ user list from the message xml without parsing the whole document.
+    :param xml: The raw message xml.
+    :return: The wxids that were @-ed.
+    """
+    if "<atuserlist>" not in xml:
+        return []
+
+    matched = _AT_USER_LIST_PATTERN.search(xml)
+    if not matched or not matched.group(1).strip():
+        return []
+
+    return matched.group(1).strip().split(",")
+
+
+_TOKEN_SEPARATOR_PATTERN = re.compile(" |\u2005")
+
+
+class XYBotCommand(NamedTuple):
+    """
+    拆分后的指令视图。The tokenised command view.
+    keyword: 指令关键词。The command keyword.
+    args: 关键词后的参数。The arguments after the keyword.
+    mentions: 以@开头的参数。The arguments starting with @.
+    tokens: 关键词与参数，和以前插件中 re.split(" |\u2005", recv.content) 的结果相同。The keyword and the arguments, the same as re.split(" |\u2005", recv.content) used to give in plugins.
+    """
+    keyword: str
+    args: list
+    mentions: list
+    tokens: list
+
+
+def parse_command(content: str, prefix: str = "") -> XYBotCommand:
+    """
+    Tokenise the message content into a command view.
+    :param content: The message content.
+    :param prefix: The command prefix to strip, if the content starts with it.
+    :return: The command view.
+    """
+    if prefix and content.startswith(prefix):
+        content = content[len(prefix):]
+
+    tokens = _TOKEN_SEPARATOR_PATTERN.split(content)
+    mentions = [token for token in tokens[1:] if token.startswith("@")]
+    return XYBotCommand(tokens[0], tokens[1:], mentions, tokens)
+
+
 class XYBotWxMsg:
-    def __init__(self, msg: wxmsg.WxMsg):
-        self._is_self = msg.from_self()
-        self._is_group = msg.from_group()
-        self.type = msg.type
-        self.id = msg.id
-        self.ts = msg.ts
-        self.sign = msg.sign
-        self.xml = msg.xml
-        self.sender = msg.sender
-        self.roomid = msg.roomid
-        self.content = msg.content
-        self.thumb = msg.thumb
-        self.extra = msg.extra
-        self.ats = []
+    """
+    XYBot的消息对象。直接包装wcferry收到的protobuf消息，不逐字段复制，@列表与拆分后的消息内容只计算一次。
+    The XYBot message object. Wraps the protobuf message received from wcferry without copying its fields; the @ list and the tokenised content are computed only once.
+    """
+
+    __slots__ = ("_msg", "_content", "_command", "_ats", "_xml", "image", "voice", "join_group")
+
+    def __init__(self, msg: wcf_pb2.WxMsg):
+        self._msg = msg
+        self._content = None  # 被插件修改后的消息内容
+        self._command = None  # 拆分后的指令
+        self._ats = None  # @ 列表
+        self._xml = None  # 解析后的xml，第一次访问时才解析
         self.image = ""
         self.voice = ""
         self.join_group = ""
 
-        # 处理xml
-        self.xml = xmltodict.parse(self.xml.replace('\\n|\\t| ', ''))  # 将xml转换为字典
+    @property
+    def type(self) -> int:
+        return self._msg.type
+
+    @property
+    def id(self) -> int:
+        return self._msg.id
+
+    @property
+    def ts(self) -> int:
+        return self._msg.ts
+
+    @property
+    def sign(self) -> str:
+        return self._msg.sign
+
+    @property
+    def sender(self) -> str:
+        return self._msg.sender
+
+    @property
+    def roomid(self) -> str:
+        return self._msg.roomid
+
+    @property
+    def thumb(self) -> str:
+        return self._msg.thumb
+
+    @property
+    def extra(self) -> str:
+        return self._msg.extra
+
+    @property
+    def raw_xml(self) -> str:
+        return self._msg.xml
+
+    @property
+    def content(self):
+        """消息内容。插件可以重新赋值，不会影响原始消息"""
+        if self._content is None:
+            return self._msg.content
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    @property
+    def command(self) -> XYBotCommand:
+        """拆分后的指令，只拆分一次。如果分发器没有设置过，则按没有指令前缀拆分原始消息内容"""
+        if self._command is None:
+            self._command = parse_command(self._msg.content)
+        return self._command
+
+    def parse_command(self, prefix: str = "") -> XYBotCommand:
+        """去除指令前缀后拆分原始消息内容，由分发器调用一次"""
+        self._command = parse_command(self._msg.content, prefix)
+        return self._command
+
+    @property
+    def tokens(self) -> list:
+        """拆分后的消息内容，等同于 command.tokens"""
+        return self.command.tokens
+
+    @property
+    def ats(self) -> list:
+        """被@的wxid列表，只有群聊消息才有，只提取一次"""
+        if self._ats is None:
+            self._ats = extract_at_user_list(self._msg.xml) if self.from_group() else []
+        return self._ats
+
+    @ats.setter
+    def ats(self, value: list):
+        self._ats = value
+
+    @property
+    def xml(self) -> dict:
+        """解析后的xml字典，第一次访问时才解析并缓存"""
+        if self._xml is None:
+            self._xml = xmltodict.parse(self.raw_xml.replace('\\n|\\t| ', ''))  # 将xml转换为字典
+        return self._xml
 
-        # @ 信息
-        if self.from_group():
-            at_user_list = self.xml.get('msgsource', {}).get('atuserlist', "")
-            if at_user_list:
-                self.ats = at_user_list.split(',')
+    @xml.setter
+    def xml(self, value: dict):
+        self._xml = value
 
     def __str__(self):
         _dict = {
@@ -111,7 +240,7 @@ class XYBotWxMsg:
             "from_self": self.from_self(),
             "is_text": self.is_text(),
             "is_at": self.is_at,
-            "xml": self.xml,
+            "xml": self.raw_xml,  # 打印日志时不解析xml
             "ats": self.ats,
             "join_group": self.join_group,
         }
@@ -119,11 +248,11 @@ class XYBotWxMsg:
 
     def from_self(self) -> bool:
         """是否自己发的消息"""
-        return self._is_self == 1
+        return self._msg.is_self == 1
 
     def from_group(self) -> bool:
         """是否群聊消息"""
-        return self._is_group
+        return self._msg.is_group
 
     def is_at(self, wxid) -> bool:
         """是否被 @：群消息，在 @ 名单里，并且不是 @ 所有人"""